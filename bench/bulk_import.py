@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+ייבוא מרוכז (shibutz/importer.py) של מחזור סינתטי מקובץ CSV או XLSX, בתיקיית נתונים זמנית.
+
+--bad — איזה חלק מהשורות לקלקל (דוא״ל לא תקין), כדי שגם מסלול הדחייה יימדד.
+
+    python bench/bulk_import.py --rows 20000
+    python bench/bulk_import.py --rows 5000 --xlsx
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from bench.load_suite import make_cohort
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=20_000)
+    ap.add_argument("--bad", type=float, default=0.02)
+    ap.add_argument("--xlsx", action="store_true")
+    args = ap.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="shibutz_bench_"))   # תיקיית data/ זמנית
+    from shibutz import importer, storage
+
+    df = make_cohort(args.rows)
+    df.loc[df["הכשרה_קודמת"] == "כן", ["הכשרה_קודמת_מקום_ותחום", "הכשרה_קודמת_מדריך_ומיקום", "הכשרה_קודמת_בן_זוג"]] = "—"
+    df.loc[df.sample(frac=args.bad, random_state=1).index, "אימייל"] = "no-at-sign"
+    path = Path("import.xlsx" if args.xlsx else "import.csv")
+    if args.xlsx:
+        df.to_excel(path, index=False)
+    else:
+        df.to_csv(path, index=False, encoding="utf-8-sig")
+
+    storage.ensure_dirs()
+    t0 = time.perf_counter()
+    result = importer.import_file(path, path.name)
+    sec = time.perf_counter() - t0
+    print(f"file={path.name} ({path.stat().st_size / 1e6:.1f} MB) | rows={result.total} | imported={result.imported} "
+          f"| rejected={len(result.rejected_rows())} | seconds={sec:.2f} | rows_per_sec={result.total / sec:,.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+זמן CPU לאינטראקציה בטופס: הרצה מלאה של הסקריפט מול הרצת ה-fragment בלבד.
+
+לכל אינטראקציה (הקלדה בסעיף 1, בחירה ברשת הדירוג, מתג התקציר בסעיף 6) נמדדים:
+  • ריצה מלאה — כמו שכל אינטראקציה עלתה לפני הפיצול ל-fragments;
+  • fragment  — זמן ה-CPU של ה-fragment שמכיל את הווידג'ט, שזה מה שהשרת מריץ היום.
+עם --baseline נמדדת גם גרסה קודמת של streamlit_app.py מתוך git (ריצה מלאה בכל אינטראקציה).
+עם --sites N הטופס נטען עם קטלוג סינתטי של N מוסדות (SITES_FILE זמני).
+
+    python bench/form_reruns.py --repeat 20 --baseline <git-rev>
+    python bench/form_reruns.py --sites 120 --rank-count 20
+"""
+import argparse
+import functools
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+FRAGMENT_CPU: dict[str, list[float]] = defaultdict(list)
+_real_fragment = st.fragment
+
+
+def _timed_fragment(func=None, **kw):
+    """st.fragment שמודד את זמן ה-CPU של כל הרצה של הפונקציה."""
+    if func is None:
+        return lambda f: _timed_fragment(f, **kw)
+
+    @functools.wraps(func)
+    def body(*args, **kwargs):
+        t0 = time.thread_time()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            FRAGMENT_CPU[func.__name__].append(time.thread_time() - t0)
+
+    return _real_fragment(body, **kw)
+
+
+def _by_label(widgets, prefix: str):
+    for w in widgets:
+        if w.label.startswith(prefix):
+            return w
+    raise KeyError(prefix)
+
+
+# (שם, פעולה על האפליקציה, ה-fragment שמכיל את הווידג'ט)
+INTERACTIONS = [
+    ("הקלדת שם פרטי", lambda at, n: _by_label(at.text_input, "שם פרטי").set_value(f"דנה{n}"), "section_personal"),
+    ("בחירה במדרגה 1", lambda at, n: _by_label(at.selectbox, "מדרגה 1 ").set_value(
+        _by_label(at.selectbox, "מדרגה 1 ").options[1 + n % 3]), "ranking_grid"),
+    ("אינטראקציה בסעיף 6", lambda at, n: (at.toggle[0].set_value(n % 2 == 0) if len(at.toggle)
+                                   else at.checkbox[0].set_value(n % 2 == 0)), "section_submit"),
+]
+
+
+def measure(script: Path, repeat: int) -> dict[str, dict[str, float]]:
+    FRAGMENT_CPU.clear()
+    at = AppTest.from_file(str(script), default_timeout=60)
+    at.secrets["ADMIN_PASSWORD"] = "bench"
+    at.run()
+    results = {}
+    for name, act, fragment in INTERACTIONS:
+        full = []
+        FRAGMENT_CPU[fragment].clear()
+        for n in range(repeat):
+            act(at, n)
+            t0 = time.process_time()
+            at.run()
+            full.append(time.process_time() - t0)
+        if at.exception:
+            raise RuntimeError(f"{script.name}: {at.exception[0].message}")
+        frag = FRAGMENT_CPU.get(fragment)
+        results[name] = {
+            "full_ms": statistics.median(full) * 1000,
+            "fragment_ms": statistics.median(frag) * 1000 if frag else None,
+        }
+    return results
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--baseline", help="git revision של streamlit_app.py להשוואה (למשל הקומיט שלפני ה-fragments)")
+    ap.add_argument("--sites", type=int, help="קטלוג סינתטי עם מספר מוסדות זה")
+    ap.add_argument("--rank-count", type=int, default=10)
+    args = ap.parse_args()
+
+    st.fragment = _timed_fragment
+    os.chdir(tempfile.mkdtemp(prefix="shibutz_bench_"))   # תיקיית data/ זמנית
+    if args.sites:
+        catalogue = {"rank_count": args.rank_count, "sites": [f"מוסד {n:03d}" for n in range(1, args.sites + 1)]}
+        Path("sites.json").write_text(json.dumps(catalogue, ensure_ascii=False), encoding="utf-8")
+        os.environ["SITES_FILE"] = str(Path("sites.json").resolve())
+
+    current = measure(ROOT / "streamlit_app.py", args.repeat)
+    baseline = None
+    if args.baseline:
+        old = subprocess.run(["git", "-C", str(ROOT), "show", f"{args.baseline}:streamlit_app.py"],
+                             check=True, capture_output=True).stdout
+        old_script = Path("baseline_app.py")
+        old_script.write_bytes(old)
+        baseline = measure(old_script, args.repeat)
+
+    print(f"{'אינטראקציה':<16} | {'לפני (ריצה מלאה)':>17} | {'ריצה מלאה':>10} | {'fragment':>9}")
+    for name, r in current.items():
+        before = f"{baseline[name]['full_ms']:.1f} ms" if baseline else "-"
+        frag = f"{r['fragment_ms']:.1f} ms" if r["fragment_ms"] is not None else "-"
+        print(f"{name:<16} | {before:>17} | {r['full_ms']:.1f} ms | {frag:>9}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+זיכרון הפריימים של מסך המנהל: פרסור רגיל (object לכל טקסט) מול הטיפוסים של shibutz/dtypes.py,
+ושיא הזיכרון בקריאה מלאה מול קריאה במקטעים (dtypes.read) של יומן של כמה מחזורים.
+
+--years — כמה מחזורים ביומן (כל אחד --rows שורות, בשנה אחרת; האחרון מתחיל ב-2025-09-01).
+כל תרחיש רץ בתהליך נפרד, כך ששיא ה-RSS שלו לא מושפע מהקודמים.
+
+    python bench/frame_memory.py --rows 50000 --years 3
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import pandas as pd
+
+from bench.load_suite import RssSampler, make_cohort
+
+LAST_CYCLE = pd.Timestamp("2025-09-01")
+
+SCENARIOS = {
+    "parse_csv (object)": lambda storage, dtypes: storage.parse_csv(storage.CSV_LOG_FILE),
+    "parse_csv + dtypes.apply": lambda storage, dtypes: dtypes.apply(storage.parse_csv(storage.CSV_LOG_FILE)),
+    "dtypes.read (chunks)": lambda storage, dtypes: dtypes.read(storage.CSV_LOG_FILE),
+    "dtypes.read (last cycle)": lambda storage, dtypes: dtypes.read(storage.CSV_LOG_FILE, since=LAST_CYCLE),
+}
+
+
+def run_scenario(name: str) -> None:
+    from shibutz import dtypes, storage
+
+    base = RssSampler.current()
+    with RssSampler() as rss:
+        t0 = time.perf_counter()
+        df = SCENARIOS[name](storage, dtypes)
+        sec = time.perf_counter() - t0
+    print(f"{name:<26} rows={len(df):>8,} | frame={dtypes.memory_mb(df):7.1f} MB "
+          f"| peak RSS +{(rss.peak - base) / 1e6:7.1f} MB | {sec:.2f}s")
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=50_000)
+    ap.add_argument("--years", type=int, default=3)
+    ap.add_argument("--scenario", help=argparse.SUPPRESS)   # תהליך-בן: תרחיש אחד בתיקייה הנוכחית
+    args = ap.parse_args()
+    if args.scenario:
+        run_scenario(args.scenario)
+        return 0
+
+    os.chdir(tempfile.mkdtemp(prefix="shibutz_bench_"))   # תיקיית data/ זמנית
+    from shibutz import dtypes, storage
+
+    storage.ensure_dirs()
+    for year in range(args.years):
+        cohort = make_cohort(args.rows, seed=year, id_base=200_000_000 + year * args.rows)
+        shift = pd.DateOffset(years=year - args.years + 1)
+        cohort["תאריך_שליחה"] = (pd.to_datetime(cohort["תאריך_שליחה"]) + shift).dt.strftime(dtypes.DATE_FORMAT)
+        storage._write_csv(cohort, storage.CSV_LOG_FILE, mode="a" if year else "w", header=not year)
+    print(f"log: {args.years} cycles, {storage.CSV_LOG_FILE.stat().st_size / 1e6:.1f} MB on disk")
+
+    for name in SCENARIOS:
+        subprocess.run([sys.executable, __file__, "--scenario", name], check=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
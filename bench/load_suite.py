@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+"""
+חבילת מדידות למסלול השליחה ולמסכי המנהל, על מחזורים סינתטיים בגודל אמיתי.
+
+לכל גודל מחזור (ברירת מחדל 1k / 10k / 100k שורות, לפי סכמת השורה של הטופס —
+עמודות בעברית + עמודות דירוג לפי sites.json) נמדדים:
+  • append_to_log           — הוספת שורה בודדת ליומן (המסלול של כל שליחה);
+  • save_master_dataframe   — כתיבה מלאה של המאסטר;
+  • load_csv_safely         — קריאת המאסטר;
+  • df_to_excel_bytes       — ייצוא Excel של המאסטר;
+  • concurrent_submit       — שליחות במקביל מכמה threads דרך הכותב המשותף.
+לכל תרחיש: p50/p99 (ms), תפוקה (פעולות בשנייה), שיא RSS (MB) וגידול בדיסק (בתים).
+כל מחזור רץ בתהליך נפרד בתיקייה זמנית, כך ששיא הזיכרון והמטמונים לא נגררים בין מחזורים.
+
+    python bench/load_suite.py --out results.json
+    python bench/load_suite.py --sizes 1000 10000 --compare results_before.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+
+FIRST_NAMES = ["דנה", "יוסף", "מרים", "אחמד", "נועה", "איתי", "לינא", "שירה", "מוחמד", "אלה"]
+LAST_NAMES = ["כהן", "לוי", "חורי", "מזרחי", "אבו סאלח", "פרץ", "ביטון", "עזאם", "דהן", "סלאמה"]
+YEARS = ["תואר ראשון - שנה א'", "תואר ראשון - שנה ב'", "תואר ראשון - שנה ג'", "הסבה א'", "הסבה ב'"]
+DOMAINS = ["קהילה", "מוגבלות", "זקנה", "ילדים ונוער", "בריאות הנפש", "שיקום", "משפחה", "נשים", "בריאות"]
+LIKERT = ["בכלל לא מסכים/ה", "1", "2", "3", "4", "מסכים/ה מאוד"]
+
+
+# =========================
+# מחזור סינתטי
+# =========================
+def make_cohort(n: int, seed: int = 0, id_base: int = 200_000_000) -> pd.DataFrame:
+    """n שורות בסכמת השורה של הטופס (כולל דירוג_מדרגה_i_מוסד ו-דירוג_<מוסד>)."""
+    from shibutz import sites
+
+    rng = np.random.default_rng(seed)
+    catalogue = sites.load()
+    site_arr = np.array(catalogue.sites, dtype=object)
+    n_sites, rank_count = len(site_arr), catalogue.rank_count
+    pick = lambda values: np.array(values, dtype=object)[rng.integers(0, len(values), n)]
+
+    submitted = pd.Timestamp("2025-09-01") + pd.to_timedelta(rng.integers(0, 30 * 86400, n), unit="s")
+    domains = [pick(DOMAINS) for _ in range(3)]
+    prev = pick(["כן", "לא"])
+    had_prev = prev == "כן"
+    df = pd.DataFrame({
+        "תאריך_שליחה": submitted.strftime("%Y-%m-%d %H:%M:%S"),
+        "שם_פרטי": pick(FIRST_NAMES),
+        "שם_משפחה": pick(LAST_NAMES),
+        "תעודת_זהות": (id_base + rng.permutation(n)).astype(str),
+        "מין": pick(["זכר", "נקבה"]),
+        "שיוך_חברתי": pick(["יהודי/ה", "מוסלמי/ת", "נוצרי/ה", "דרוזי/ת"]),
+        "שפת_אם": pick(["עברית", "ערבית", "רוסית"]),
+        "שפות_נוספות": pick(["אנגלית", "עברית; אנגלית", "ערבית", "רוסית; אנגלית"]),
+        "טלפון": ["05" + str(x) for x in rng.integers(10_000_000, 99_999_999, n)],
+        "כתובת": pick(["צפת", "כרמיאל", "עכו", "קריית שמונה", "נהריה", "חורפיש"]),
+        "אימייל": [f"student{i}@example.ac.il" for i in range(n)],
+        "שנת_לימודים": pick(YEARS),
+        "מסלול_לימודים": "עבודה סוציאלית",
+        "ניידות": pick(["אוכל להיעזר ברכב / ברשותי רכב", "אוכל להגיע בתחבורה ציבורית"]),
+        "הכשרה_קודמת": prev,
+        # פרטי ההכשרה הקודמת — חובה בטופס כשהייתה הכשרה
+        "הכשרה_קודמת_מקום_ותחום": np.where(had_prev, pick(["רווחה, צפת", "חינוך, כרמיאל", "בריאות, נהריה"]), ""),
+        "הכשרה_קודמת_מדריך_ומיקום": np.where(had_prev, pick(["רונית, צפת", "סמיר, עכו", "מיכל, כרמיאל"]), ""),
+        "הכשרה_קודמת_בן_זוג": np.where(had_prev, pick(FIRST_NAMES), ""),
+        "תחומים_מועדפים": pd.Series(domains[0]) + "; " + pd.Series(domains[1]),
+        "תחום_מוביל": domains[0],
+        "בקשה_מיוחדת": pick(["אין", "קרוב לבית", "לא בימי שישי, בגלל עבודה"]),
+        "ממוצע": np.round(rng.normal(85, 6, n).clip(60, 100), 1),
+        "התאמות": pick(["אין", "הריון", "נכות"]),
+        "התאמות_פרטים": "אין",
+        "מוטיבציה_1": pick(LIKERT),
+        "מוטיבציה_2": pick(LIKERT),
+        "מוטיבציה_3": pick(LIKERT),
+    })
+    # דירוג: סידור אקראי של המוסדות לכל סטודנט, rank_count הראשונים
+    order = np.argsort(rng.random((n, n_sites)), axis=1)[:, :rank_count]
+    for i in range(rank_count):
+        df[f"דירוג_מדרגה_{i + 1}_מוסד"] = site_arr[order[:, i]]
+    pos = np.full((n, n_sites), np.nan)
+    pos[np.arange(n)[:, None], order] = np.arange(1, rank_count + 1)
+    for j, site in enumerate(site_arr):
+        df[f"דירוג_{site}"] = pd.array(pos[:, j], dtype="Int64")
+    return df
+
+
+# =========================
+# מדידה
+# =========================
+class RssSampler:
+    """שיא ה-RSS בזמן תרחיש (דגימה מ-/proc; בלי /proc — שיא התהליך מ-getrusage)."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @staticmethod
+    def current() -> int:
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError):
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.current())
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> "RssSampler":
+        self.peak = self.current()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.current())
+
+
+def disk_usage(path: Path) -> int:
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file()) if path.exists() else 0
+
+
+def _report(result: dict) -> dict:
+    print(f"  {result['scenario']:<22} p50={result['p50_ms']:>10.2f} ms  p99={result['p99_ms']:>10.2f} ms  "
+          f"{result['throughput_per_s']:>9} ops/s  rss={result['peak_rss_mb']} MB  "
+          f"disk+={result['disk_growth_bytes']:,} B", flush=True)
+    return result
+
+
+def scenario(name: str, cohort: int, fn, reps: int, data_dir: Path, ops_per_rep: int = 1) -> dict:
+    """מריץ fn() reps פעמים ומחזיר את מדדי התרחיש."""
+    latencies = []
+    before = disk_usage(data_dir)
+    with RssSampler() as rss:
+        t_total = time.perf_counter()
+        for _ in range(reps):
+            t0 = time.perf_counter()
+            fn()
+            latencies.append(time.perf_counter() - t0)
+        t_total = time.perf_counter() - t_total
+    result = {
+        "cohort": cohort,
+        "scenario": name,
+        "reps": reps,
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 3),
+        "throughput_per_s": round(reps * ops_per_rep / t_total, 2) if t_total else None,
+        "peak_rss_mb": round(rss.peak / 2**20, 1),
+        "disk_growth_bytes": disk_usage(data_dir) - before,
+    }
+    return _report(result)
+
+
+def concurrent_submit(cohort: int, threads: int, per_thread: int, data_dir: Path) -> dict:
+    """threads סשנים ששולחים במקביל דרך SubmissionWriter; latency לכל שליחה עד האישור."""
+    from shibutz.backends import get_store
+    from shibutz.writer import SubmissionWriter
+
+    rows = make_cohort(threads * per_thread, seed=1, id_base=700_000_000).to_dict("records")
+    writer = SubmissionWriter(get_store("csv"))
+    latencies, lock = [], threading.Lock()
+    barrier = threading.Barrier(threads)
+
+    def worker(t: int) -> None:
+        barrier.wait()
+        for row in rows[t * per_thread:(t + 1) * per_thread]:
+            t0 = time.perf_counter()
+            writer.submit(row).result(timeout=120)
+            with lock:
+                latencies.append(time.perf_counter() - t0)
+
+    before = disk_usage(data_dir)
+    with RssSampler() as rss:
+        t0 = time.perf_counter()
+        pool = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+        for th in pool:
+            th.start()
+        for th in pool:
+            th.join()
+        elapsed = time.perf_counter() - t0
+    writer.close()
+    result = {
+        "cohort": cohort,
+        "scenario": "concurrent_submit",
+        "reps": len(latencies),
+        "threads": threads,
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 3),
+        "throughput_per_s": round(len(latencies) / elapsed, 2),
+        "peak_rss_mb": round(rss.peak / 2**20, 1),
+        "disk_growth_bytes": disk_usage(data_dir) - before,
+    }
+    return _report(result)
+
+
+def run_cohort(n: int, args) -> list[dict]:
+    """כל התרחישים על מחזור אחד, בתיקייה הנוכחית (זמנית)."""
+    from shibutz import backups, exports, id_index, storage
+
+    storage.ensure_dirs()
+    data_dir = storage.DATA_DIR
+    df = make_cohort(n)
+    singles = make_cohort(args.appends, seed=2, id_base=500_000_000)
+    print(f"cohort {n:,} rows × {df.shape[1]} columns", flush=True)
+
+    results = []
+    # מצב התחלתי: מאסטר + יומן בגודל המחזור
+    results.append(scenario("seed_master", n, lambda: storage.save_master_dataframe(df), 1, data_dir))
+    storage.CSV_LOG_FILE.write_bytes(storage.CSV_FILE.read_bytes())
+    storage.compact_master()
+    # מצב יציב כמו בהתקנה קיימת: אינדקס ת״ז ותמונת גיבוי מלאה כבר קיימים
+    id_index.rebuild(df)
+    backups.snapshot_full()
+
+    it = iter(range(args.appends))
+    results.append(scenario(
+        "append_to_log", n, lambda: storage.append_to_log(singles.iloc[[next(it)]]), args.appends, data_dir))
+    results.append(scenario(
+        "save_master_dataframe", n, lambda: storage.save_master_dataframe(df), args.reps, data_dir))
+    results.append(scenario(
+        "load_csv_safely", n, lambda: storage.load_csv_safely(storage.CSV_FILE), args.reps, data_dir))
+    if n <= args.excel_max_rows:
+        results.append(scenario(
+            "df_to_excel_bytes", n, lambda: exports.df_to_excel_bytes(df), max(1, args.reps // 2), data_dir))
+    results.append(concurrent_submit(n, args.threads, args.per_thread, data_dir))
+    return results
+
+
+def compare(current: list[dict], baseline_path: Path) -> None:
+    """יחס p50/p99 מול קובץ תוצאות קודם (>1 = איטי יותר עכשיו)."""
+    old = {(r["cohort"], r["scenario"]): r for r in json.loads(baseline_path.read_text(encoding="utf-8"))["results"]}
+    print(f"\ncompared with {baseline_path}:")
+    for r in current:
+        prev = old.get((r["cohort"], r["scenario"]))
+        if not prev or not prev["p50_ms"]:
+            continue
+        ratio50 = r["p50_ms"] / prev["p50_ms"]
+        ratio99 = r["p99_ms"] / prev["p99_ms"] if prev["p99_ms"] else float("nan")
+        flag = "  ← regression" if ratio50 > 1.2 else ""
+        print(f"  {r['cohort']:>7,} {r['scenario']:<22} p50 ×{ratio50:.2f}  p99 ×{ratio99:.2f}{flag}")
+
+
+def _git_rev() -> str | None:
+    try:
+        return subprocess.run(["git", "-C", str(ROOT), "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    ap.add_argument("--appends", type=int, default=200, help="כמה הוספות בודדות ליומן למדידת append_to_log")
+    ap.add_argument("--reps", type=int, default=5, help="חזרות לתרחישי כתיבה/קריאה מלאים")
+    ap.add_argument("--threads", type=int, default=16)
+    ap.add_argument("--per-thread", type=int, default=25)
+    ap.add_argument("--excel-max-rows", type=int, default=100_000, help="לדלג על ייצוא Excel במחזורים גדולים מזה")
+    ap.add_argument("--out", type=Path, help="קובץ JSON לתוצאות")
+    ap.add_argument("--compare", type=Path, help="קובץ JSON קודם להשוואה")
+    ap.add_argument("--cohort", type=int, help=argparse.SUPPRESS)   # ריצת מחזור בודד (בתהליך-בן)
+    args = ap.parse_args()
+
+    if args.cohort is not None:
+        os.chdir(tempfile.mkdtemp(prefix=f"shibutz_load_{args.cohort}_"))
+        results = run_cohort(args.cohort, args)
+        Path(os.environ["SHIBUTZ_BENCH_OUT"]).write_text(json.dumps(results), encoding="utf-8")
+        return 0
+
+    results = []
+    for n in args.sizes:
+        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as out:
+            result_file = Path(out.name)
+        child = [sys.executable, __file__, "--cohort", str(n), "--appends", str(args.appends),
+                 "--reps", str(args.reps), "--threads", str(args.threads), "--per-thread", str(args.per_thread),
+                 "--excel-max-rows", str(args.excel_max_rows)]
+        env = dict(os.environ, SHIBUTZ_BENCH_OUT=str(result_file))
+        subprocess.run(child, check=True, env=env)
+        results.extend(json.loads(result_file.read_text(encoding="utf-8")))
+        result_file.unlink()
+
+    report = {
+        "meta": {
+            "git_rev": _git_rev(),
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+        },
+        "results": results,
+    }
+    if args.out:
+        args.out.write_text(json.dumps(report, ensure_ascii=False, indent=1), encoding="utf-8")
+        print(f"\nresults → {args.out}")
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
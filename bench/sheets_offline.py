@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+בדיקה בלי רשת לסנכרון ל-Google Sheets (SheetsSync.sync_once מול MemorySheetClient).
+
+בתיקייה זמנית נכתבות שליחות ליומן, ונבדק שהגיליון מכיל בדיוק את שורות היומן, בסדר ובלי כפילויות:
+  • כישלון באמצע (קבוצה ראשונה נשלחה, השנייה נכשלה) — chunk_sent וההיסט נשמרים בקובץ המצב;
+  • "הפעלה מחדש" (SheetsSync חדש, אותו קובץ מצב) — ממשיכים מהקבוצה שנכשלה, בלי לשלוח שוב;
+  • שורות חדשות אחרי סנכרון — נשלחות רק הן;
+  • הרחבת כותרת היומן (כתיבה מחדש) — הכותרת בגיליון מתעדכנת, וממשיכים לפי מספר השורות;
+  • רשומה מרובת שורות (שדה במרכאות) שנכתבה רק בחלקה — לא נשלחת עד שהיא שלמה;
+  • ה-thread הרקע עם ניסיונות חוזרים (fail_next) — מגיע לאותה תוצאה.
+
+    python bench/sheets_offline.py
+"""
+import io
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from shibutz import sheets_sync, storage
+
+
+class FlakySheet(sheets_sync.MemorySheetClient):
+    """נכשל בקריאת append_rows מספר fail_on_call (1 = הראשונה), ורק בה."""
+
+    def __init__(self, fail_on_call: int):
+        super().__init__()
+        self.fail_on_call = fail_on_call
+
+    def append_rows(self, rows: list[list[str]]) -> None:
+        if self.calls + 1 == self.fail_on_call:
+            self.calls += 1
+            raise ConnectionError("simulated failure in the middle of a sync")
+        super().append_rows(rows)
+
+
+def make_rows(start: int, n: int, extra: dict | None = None) -> list[dict]:
+    return [{"תאריך_שליחה": "2025-09-01 10:00:00", "שם_פרטי": f"סטודנט_{i}",
+             "תעודת_זהות": f"{i:09d}", "טלפון": "0501234567", **(extra or {})} for i in range(start, start + n)]
+
+
+def log_rows() -> list[list[str]]:
+    df = storage.read_text_frame(storage.CSV_LOG_FILE)
+    return [list(df.columns)] + df.to_numpy(dtype=str).tolist()
+
+
+def matches_log(sheet: sheets_sync.MemorySheetClient) -> bool:
+    """הגיליון = היומן. שורות שנשלחו לפני הרחבת הכותרת קצרות יותר — משווים אחרי השלמה בריקים."""
+    expected = log_rows()
+    width = len(expected[0])
+    return [(r + [""] * width)[:width] for r in sheet.rows] == expected
+
+
+def main() -> int:
+    failures = []
+
+    def check(name: str, ok: bool, detail: str = "") -> None:
+        print(f"{'✅' if ok else '❌'} {name}" + (f" — {detail}" if detail and not ok else ""))
+        if not ok:
+            failures.append(name)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        storage.ensure_dirs()
+        storage.append_rows(make_rows(1, 7))
+
+        # כישלון בקבוצה השנייה (3 שורות לקבוצה): נשלחו 3, ההיסט לא זז
+        sheet = FlakySheet(fail_on_call=2)
+        try:
+            sheets_sync.SheetsSync(sheet, batch_rows=3).sync_once()
+            raised = False
+        except ConnectionError:
+            raised = True
+        check("partial failure raises", raised, "sync_once did not raise")
+        state = sheets_sync._read_state()
+        check("chunk_sent persisted after a partial batch", state["chunk_sent"] == 3 and state["rows"] == 3,
+              str(state))
+        check("offset not advanced past unsent rows", state["offset"] == storage.header_end(storage.CSV_LOG_FILE),
+              str(state))
+
+        # "הפעלה מחדש": SheetsSync חדש — ממשיך מהשורה הרביעית
+        sent = sheets_sync.SheetsSync(sheet, batch_rows=3).sync_once()
+        check("resume sends only the rest", sent == 4, f"sent={sent}")
+        check("sheet matches the log after resume", matches_log(sheet))
+
+        # שורות חדשות — רק הן
+        storage.append_rows(make_rows(8, 2))
+        sent = sheets_sync.SheetsSync(sheet, batch_rows=3).sync_once()
+        check("only new rows after a sync", sent == 2 and matches_log(sheet), f"sent={sent}")
+        check("nothing to send when up to date", sheets_sync.SheetsSync(sheet).sync_once() == 0)
+
+        # עמודה חדשה: היומן נכתב מחדש, הכותרת בגיליון מתעדכנת
+        storage.append_rows(make_rows(10, 2, {"הערה": "חדש"}))
+        sent = sheets_sync.SheetsSync(sheet, batch_rows=3).sync_once()
+        check("header widening: header updated", sheet.rows[0] == log_rows()[0], str(sheet.rows[0]))
+        check("header widening: no duplicates", sent == 2 and matches_log(sheet),
+              f"sent={sent} sheet={len(sheet.rows)} log={len(log_rows())}")
+
+        # רשומה מרובת שורות שנכתבה רק עד ירידת השורה שבתוך השדה (כותב מתהליך אחר, באמצע כתיבה)
+        buf = io.StringIO()
+        pd.DataFrame(make_rows(12, 1, {"הערה": "שורה ראשונה\nשורה שנייה"})).reindex(columns=log_rows()[0]).to_csv(
+            buf, header=False, **storage.CSV_WRITE_KW)
+        record = buf.getvalue().encode("utf-8")
+        cut = record.index(b"\n") + 1
+        with storage.CSV_LOG_FILE.open("ab") as f:
+            f.write(record[:cut])
+        before, offset = len(sheet.rows), sheets_sync._read_state()["offset"]
+        sent = sheets_sync.SheetsSync(sheet).sync_once()
+        check("half-written multi-line record is not sent",
+              sent == 0 and len(sheet.rows) == before and sheets_sync._read_state()["offset"] == offset,
+              f"sent={sent} last={sheet.rows[-1]}")
+        with storage.CSV_LOG_FILE.open("ab") as f:
+            f.write(record[cut:])
+        sent = sheets_sync.SheetsSync(sheet).sync_once()
+        check("multi-line record sent whole once complete", sent == 1 and matches_log(sheet),
+              f"sent={sent} last={sheet.rows[-1]}")
+
+        # ה-thread הרקע עם ניסיונות חוזרים
+        storage.append_rows(make_rows(13, 5))
+        sync = sheets_sync.SheetsSync(sheet, batch_rows=2, poll=0.01, max_backoff=0.05)
+        sheet.fail_next = 2
+        sync.start()
+        deadline = time.time() + 10
+        while sync.pending_bytes() and time.time() < deadline:
+            time.sleep(0.02)
+        sync.stop(timeout=5)
+        check("background sync retries to completion", matches_log(sheet),
+              f"sheet={len(sheet.rows)} log={len(log_rows())} last_error={sync.last_error}")
+        os.chdir(Path(tmp).parent)
+
+    print("OK" if not failures else f"{len(failures)} failed")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
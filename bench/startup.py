@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+עלייה קרה ועלות לסשן: כמה זמן לוקחת ההצגה הראשונה של הטופס בתהליך חדש, וכמה עולה כל סשן נוסף.
+
+כל גרסה נמדדת בתהליך נפרד (streamlit כבר טעון — כמו בשרת שרץ ומחכה לקישור הראשון):
+  • first render — הריצה הראשונה של הסקריפט (קומפילציה, ייבוא המודולים, הכנה חד-פעמית);
+  • ready        — מתחילת הריצה הראשונה עד שמודולי האחסון והכותב טעונים (גם אם זה קורה ברקע);
+  • session      — חציון זמן הריצה הראשונה של כל סשן נוסף (AppTest חדש);
+  • RSS/session  — גידול הזיכרון הממוצע לסשן, על פני --sessions סשנים פתוחים.
+עם --baseline נמדד גם כל העץ בגרסה קודמת (git archive לתיקייה זמנית).
+
+    python bench/startup.py --sessions 30
+    python bench/startup.py --baseline HEAD~1
+"""
+import argparse
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def rss_bytes() -> int:
+    """RSS נוכחי מ-/proc (לא דרך bench/load_suite.py — הוא טוען pandas, וזה בדיוק מה שנמדד כאן)."""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def child(root: Path, sessions: int) -> dict:
+    """רץ בתהליך-בן, בתיקיית נתונים זמנית; root — העץ שממנו נטענים streamlit_app.py ו-shibutz."""
+    from streamlit.testing.v1 import AppTest
+
+    def new_session() -> tuple[AppTest, float, float]:
+        at = AppTest.from_file(str(root / "streamlit_app.py"), default_timeout=60)
+        at.secrets["ADMIN_PASSWORD"] = "bench"
+        t0 = time.perf_counter()
+        at.run()
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+        return at, t0, time.perf_counter() - t0
+
+    first, start, first_sec = new_session()
+    while "shibutz.writer" not in sys.modules and time.perf_counter() - start < 30:
+        time.sleep(0.005)
+    ready_sec = time.perf_counter() - start
+    time.sleep(0.5)     # שההכנה ברקע (אם יש) תסתיים — שלא תיספר כזיכרון של סשנים
+    base = rss_bytes()
+    alive, times = [first], []
+    for _ in range(sessions):
+        at, _, sec = new_session()
+        alive.append(at)
+        times.append(sec)
+    return {
+        "first_render_ms": first_sec * 1000,
+        "ready_ms": ready_sec * 1000,
+        "session_ms": statistics.median(times) * 1000,
+        "rss_per_session_kb": (rss_bytes() - base) / sessions / 1024,
+    }
+
+
+def run_tree(root: Path, sessions: int) -> dict:
+    out = subprocess.run(
+        [sys.executable, __file__, "--child", str(root), "--sessions", str(sessions)],
+        check=True, capture_output=True, text=True, cwd=tempfile.mkdtemp(prefix="shibutz_bench_"),
+        env={**os.environ, "PYTHONPATH": str(root)},
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sessions", type=int, default=30)
+    ap.add_argument("--baseline", help="git revision להשוואה (כל העץ)")
+    ap.add_argument("--child", type=Path, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        sys.path.insert(0, str(args.child))
+        print(json.dumps(child(args.child, args.sessions)))
+        return 0
+
+    results = {"current": run_tree(ROOT, args.sessions)}
+    if args.baseline:
+        archive = subprocess.run(["git", "-C", str(ROOT), "archive", args.baseline],
+                                 check=True, capture_output=True).stdout
+        old_root = Path(tempfile.mkdtemp(prefix="shibutz_baseline_"))
+        with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+            tar.extractall(old_root)
+        results[args.baseline] = run_tree(old_root, args.sessions)
+
+    print(f"{'גרסה':<10} | {'first render':>12} | {'ready':>8} | {'session':>9} | {'RSS/session':>11}")
+    for name, r in results.items():
+        print(f"{name:<10} | {r['first_render_ms']:9.0f} ms | {r['ready_ms']:5.0f} ms "
+              f"| {r['session_ms']:6.1f} ms | {r['rss_per_session_kb']:8.0f} KB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+מבחן עומס לכותב השליחות: הרבה סשנים ששולחים באותה שנייה.
+
+משווה בין המסלול הישן (קריאה+צירוף+כתיבה מחדש של המאסטר מכל thread, ללא נעילה)
+לבין הכותב המשותף (תור + Group Commit), ובודק שלא אבדה אף שורה.
+
+    python bench/stress_writer.py --threads 32 --per-thread 20
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import pandas as pd
+
+from shibutz import storage
+from shibutz.writer import SubmissionWriter
+
+
+def make_row(t: int, i: int) -> dict:
+    return {
+        "תאריך_שליחה": "2025-09-01 10:00:00",
+        "שם_פרטי": f"סטודנט_{t}",
+        "שם_משפחה": f"שליחה_{i}",
+        "תעודת_זהות": f"{t:04d}{i:05d}",
+        "בקשה_מיוחדת": "אין, תודה",
+        **{f"דירוג_מדרגה_{k}_מוסד": f"מוסד {k}" for k in range(1, 11)},
+    }
+
+
+def legacy_submit(row: dict) -> None:
+    """המסלול הישן: Load+Concat+Rewrite + גיבוי + יומן, בלי שום נעילה."""
+    df = storage.load_csv_safely(storage.CSV_FILE)
+    df = pd.concat([df, pd.DataFrame([row])], ignore_index=True)
+    tmp = storage.CSV_FILE.with_suffix(".tmp.csv")
+    df.to_csv(tmp, index=False, encoding="utf-8-sig")
+    tmp.replace(storage.CSV_FILE)
+    pd.DataFrame([row]).to_csv(
+        storage.CSV_LOG_FILE, mode="a", header=not storage.CSV_LOG_FILE.exists(),
+        index=False, encoding="utf-8-sig",
+    )
+
+
+def run(label: str, submit, threads: int, per_thread: int) -> dict:
+    errors = []
+    barrier = threading.Barrier(threads)
+
+    def worker(t: int) -> None:
+        barrier.wait()
+        for i in range(per_thread):
+            try:
+                submit(make_row(t, i))
+            except Exception as e:  # במסלול הישן קובץ ‎.tmp יכול להיעלם באמצע
+                errors.append(repr(e))
+
+    ts = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+    start = time.perf_counter()
+    for th in ts:
+        th.start()
+    for th in ts:
+        th.join()
+    elapsed = time.perf_counter() - start
+
+    storage.compact_master()
+    expected = threads * per_thread
+    got = len(storage.load_csv_safely(storage.CSV_FILE))
+    return {
+        "mode": label,
+        "expected": expected,
+        "master_rows": got,
+        "lost": expected - got,
+        "errors": len(errors),
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(expected / elapsed, 1),
+    }
+
+
+def fresh_dir(root: Path, name: str) -> None:
+    work = root / name
+    work.mkdir()
+    os.chdir(work)
+    storage.ensure_dirs()
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--threads", type=int, default=32)
+    ap.add_argument("--per-thread", type=int, default=20)
+    ap.add_argument("--skip-legacy", action="store_true")
+    args = ap.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        if not args.skip_legacy:
+            fresh_dir(root, "legacy")
+            results.append(run("legacy", legacy_submit, args.threads, args.per_thread))
+
+        fresh_dir(root, "writer")
+        writer = SubmissionWriter()
+        results.append(run("writer", lambda r: writer.submit(r).result(timeout=60), args.threads, args.per_thread))
+        writer.close()
+        os.chdir(root.parent)
+
+    for r in results:
+        print(" | ".join(f"{k}={v}" for k, v in r.items()))
+    return 1 if results[-1]["lost"] or results[-1]["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+בדיקת תקינות של מחזור שלם: validate_frame (מעבר וקטורי אחד) מול validate_row בלולאה.
+
+המחזור הסינתטי (bench/load_suite.py) נכתב ל-CSV ונקרא חזרה דרך storage.parse_csv,
+כך שהטיפוסים הם כמו במאסטר אמיתי (ת״ז וטלפון שנקראו כמספרים וכו').
+--corrupt — איזה חלק מהשורות לקלקל (ת״ז קצרה, דוא״ל בלי @, כפילות בדירוג).
+בסוף — בדיקה שבדיוק השורות שקולקלו נפסלות על הת״ז (ת״ז קצרה שנקראה כמספר לא "מתוקנת" באפסים),
+ושת״ז של 8 ספרות שנקראה כמספר (9 ספרות עם אפס מוביל) עוברת.
+
+    python bench/validation.py --rows 50000
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import numpy as np
+
+from bench.load_suite import make_cohort
+from shibutz import sites, storage, validation
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=50_000)
+    ap.add_argument("--corrupt", type=float, default=0.05)
+    ap.add_argument("--row-sample", type=int, default=5_000, help="כמה שורות להריץ בלולאת validate_row")
+    args = ap.parse_args()
+
+    df = make_cohort(args.rows)
+    rng = np.random.default_rng(1)
+    bad = rng.random(len(df)) < args.corrupt
+    df.loc[bad, "תעודת_זהות"] = "12"
+    df.loc[bad, "אימייל"] = "no-at-sign"
+    df.loc[bad, "דירוג_מדרגה_2_מוסד"] = df.loc[bad, "דירוג_מדרגה_1_מוסד"]
+
+    path = Path(tempfile.mkdtemp(prefix="shibutz_bench_")) / "master.csv"
+    storage._write_csv(df, path)
+    df = storage.parse_csv(path)
+    schema = validation.form_schema(sites.load().rank_count)
+
+    t0 = time.perf_counter()
+    report = validation.validate_frame(df, schema)
+    frame_sec = time.perf_counter() - t0
+
+    sample = df.head(args.row_sample).to_dict("records")
+    t0 = time.perf_counter()
+    row_bad = sum(1 for row in sample if validation.validate_row(row, schema))
+    row_sec = (time.perf_counter() - t0) * len(df) / len(sample)
+
+    frame_bad_sample = int((report["שורה"] <= len(sample)).sum())
+    print(f"rows={len(df)} | invalid={len(report)} | validate_frame={frame_sec:.2f}s "
+          f"| validate_row loop (extrapolated)={row_sec:.2f}s | speedup={row_sec / frame_sec:.1f}x")
+    print(f"sample agreement: frame={frame_bad_sample} row={row_bad}")
+
+    id_message = next(r.message for r in schema if r.column == "תעודת_זהות" and isinstance(r, validation.Pattern))
+    id_bad = report[validation.ERRORS_COL].str.contains(id_message, regex=False).sum()
+    row_errors = {v: id_message in validation.validate_row({"תעודת_זהות": v}, schema) for v in (123, 12345678, "123")}
+    ok = id_bad == bad.sum() and row_errors == {123: True, 12345678: False, "123": True}
+    print(f"{'✅' if ok else '❌'} short IDs rejected: frame={id_bad}/{bad.sum()} row={row_errors}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
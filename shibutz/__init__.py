@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+"""
+shibutz — לוגיקת הליבה של שאלון השיבוץ (אחסון, דחיסה וכלי ניהול),
+מופרדת מ-streamlit_app.py כך שניתן להריץ אותה גם מכלי שורת פקודה.
+"""
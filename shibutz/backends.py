@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""
+ממשק אחסון אחיד (store) עם שני מימושים:
+  • csv    — ההתנהגות הקיימת: יומן Append-Only + מאסטר דחוס (shibutz/storage.py) + גיבויים מצטברים;
+  • sqlite — קובץ SQLite מוטמע עם אינדקס על תעודת_זהות ועל תאריך_שליחה,
+             כך שחיפוש לפי ת״ז, ספירה וטווחי תאריכים לא מפרסרים את כל הקובץ.
+בשני המקרים CSV ו-Excel הם פורמטי ייצוא בלבד, שנבנים לפי דרישה.
+
+הבחירה בין המימושים — לפי STORAGE_BACKEND (ב-secrets או במשתנה סביבה),
+ומדיניות השליחות החוזרות (reject / replace / keep_latest) — לפי DUPLICATE_POLICY
+(ראו shibutz/id_index.py). תצוגת המאסטר מציגה שורה אחת לכל ת״ז.
+"""
+import json
+import os
+import sqlite3
+import threading
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from shibutz import backups, cache, dtypes, id_index, storage
+
+ID_COL = "תעודת_זהות"
+DATE_COL = "תאריך_שליחה"
+
+SQLITE_FILE = storage.DATA_DIR / "שאלון_שיבוץ.sqlite3"
+
+
+class SubmissionStore:
+    """הממשק שכל מימוש אחסון מספק."""
+
+    name = ""
+    duplicate_policy = id_index.DEFAULT_POLICY
+
+    def append(self, rows: list[dict]) -> None:
+        raise NotImplementedError
+
+    def has_id(self, nat_id: str) -> bool:
+        """האם כבר נשמרה שליחה עם ת״ז זו."""
+        return not self.find_by_id(nat_id).empty
+
+    def latest_row(self, nat_id: str) -> dict | None:
+        """השליחה האחרונה של ת״ז זו (למשל כדי לעדכן סטטיסטיקה כשהיא מוחלפת)."""
+        found = self.find_by_id(nat_id)
+        return None if found.empty else found.iloc[-1].to_dict()
+
+    def after_commit(self) -> None:
+        """נקרא מהכותב אחרי כל Group Commit (למשל לגיבויים). ברירת מחדל: כלום."""
+
+    def load_master(self) -> pd.DataFrame:
+        raise NotImplementedError
+
+    def _latest_view(self, df: pd.DataFrame) -> pd.DataFrame:
+        """שורה אחת לכל ת״ז — מחושב פעם אחת לכל פריים (הפריימים משותפים וממוטמנים)."""
+        memo = getattr(self, "_view_memo", None)
+        if memo is not None and memo[0] is df and memo[1] == len(df):
+            return memo[2]
+        view = id_index.latest_only(df)
+        self._view_memo = (df, len(df), view)
+        return view
+
+    def load_log(self) -> pd.DataFrame:
+        raise NotImplementedError
+
+    def generation(self) -> tuple:
+        """אסימון שמשתנה בכל פעם שהנתונים משתנים (למפתחות של מטמונים נגזרים)."""
+        raise NotImplementedError
+
+    def count(self) -> int:
+        return len(self.load_master())
+
+    def quarantined(self) -> dict[str, pd.DataFrame]:
+        """שורות פגומות שדולגו בקריאה, לפי קובץ (ריק אם אין)."""
+        return {}
+
+    def find_by_id(self, nat_id: str) -> pd.DataFrame:
+        df = self.load_master()
+        if df.empty or ID_COL not in df.columns:
+            return df.iloc[0:0]
+        return df[df[ID_COL].map(id_index.key) == id_index.key(nat_id)]
+
+    def between(self, start: datetime, end: datetime) -> pd.DataFrame:
+        """שליחות שתאריך_שליחה שלהן בטווח [start, end]."""
+        df = self.load_master()
+        if df.empty or DATE_COL not in df.columns:
+            return df.iloc[0:0]
+        ts = pd.to_datetime(df[DATE_COL], errors="coerce")
+        return df[(ts >= start) & (ts <= end)]
+
+    def export_csv_bytes(self) -> bytes:
+        return self.load_master().to_csv(**storage.CSV_WRITE_KW).encode("utf-8-sig")
+
+
+# =========================
+# CSV — ההתנהגות הקיימת
+# =========================
+class CsvStore(SubmissionStore):
+    name = "csv"
+
+    def append(self, rows: list[dict]) -> None:
+        storage.append_rows(rows, dedupe=self.duplicate_policy == "replace")
+
+    def after_commit(self) -> None:
+        backups.maybe_backup(dedupe=self.duplicate_policy == "replace")
+
+    def has_id(self, nat_id: str) -> bool:
+        return id_index.contains(nat_id)
+
+    def latest_row(self, nat_id: str) -> dict | None:
+        row_no = id_index.latest_row_no(nat_id)
+        if row_no is None:
+            return None
+        df_log = self.load_log()
+        # מספר הרשומה מהאינדקס; אם שורות פגומות הוסגרו והמספור זז — חיפוש לפי ת״ז
+        if row_no < len(df_log) and id_index.key(df_log[ID_COL].iat[row_no]) == id_index.key(nat_id):
+            return df_log.iloc[row_no].to_dict()
+        return super().latest_row(nat_id)
+
+    def load_master(self) -> pd.DataFrame:
+        storage.compact_master(dedupe=self.duplicate_policy == "replace")
+        return self._latest_view(cache.load_frame(storage.CSV_FILE))
+
+    def find_by_id(self, nat_id: str) -> pd.DataFrame:
+        df = self.load_log()
+        if not id_index.contains(nat_id) or df.empty or ID_COL not in df.columns:
+            return df.iloc[0:0]
+        return df[df[ID_COL].map(id_index.key) == id_index.key(nat_id)]
+
+    def load_log(self) -> pd.DataFrame:
+        return cache.load_frame(storage.CSV_LOG_FILE)
+
+    def generation(self) -> tuple:
+        return (cache.file_signature(storage.CSV_FILE), cache.file_signature(storage.CSV_LOG_FILE))
+
+    def quarantined(self) -> dict[str, pd.DataFrame]:
+        found = {}
+        for path in (storage.CSV_FILE, storage.CSV_LOG_FILE):
+            bad = storage.quarantined_rows(path)
+            if not bad.empty:
+                found[path.name] = bad
+        return found
+
+    def export_csv_bytes(self) -> bytes:
+        storage.compact_master(dedupe=self.duplicate_policy == "replace")
+        return storage.CSV_FILE.read_bytes() if storage.CSV_FILE.exists() else b""
+
+
+# =========================
+# SQLite — אחסון מוטמע עם אינדקסים
+# =========================
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS submissions (
+    seq          INTEGER PRIMARY KEY AUTOINCREMENT,
+    submitted_at TEXT,
+    nat_id       TEXT,
+    row_json     TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_submissions_nat_id ON submissions(nat_id);
+CREATE INDEX IF NOT EXISTS ix_submissions_submitted_at ON submissions(submitted_at);
+"""
+
+
+def _json_default(v):
+    # ערכי numpy/pandas שאינם ניתנים ל-JSON ישירות
+    if hasattr(v, "item"):
+        return v.item()
+    return str(v)
+
+
+class SqliteStore(SubmissionStore):
+    """
+    טבלה אחת (append-only) — היא גם המאסטר וגם היומן.
+    השורה המלאה נשמרת כ-JSON (סט העמודות משתנה עם רשימת המוסדות),
+    ושני השדות שמחפשים לפיהם מוצאים לעמודות מאונדקסות.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: Path = SQLITE_FILE):
+        self.path = Path(path)
+        with closing(self._connect()) as con:
+            con.executescript(_SCHEMA)
+        # מטמון אינקרמנטלי של הטבלה: הפריים + ה-seq האחרון שנטען
+        self._cache_lock = threading.Lock()
+        self._cached = pd.DataFrame()
+        self._cached_seq = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        con = sqlite3.connect(self.path, timeout=30)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=FULL")
+        return con
+
+    def append(self, rows: list[dict]) -> None:
+        records = [
+            (
+                None if r.get(DATE_COL) is None else str(r.get(DATE_COL)),
+                None if r.get(ID_COL) is None else id_index.key(r.get(ID_COL)),
+                json.dumps(r, ensure_ascii=False, default=_json_default),
+            )
+            for r in rows
+        ]
+        with storage.DATA_LOCK, closing(self._connect()) as con, con:
+            con.executemany(
+                "INSERT INTO submissions (submitted_at, nat_id, row_json) VALUES (?, ?, ?)", records
+            )
+
+    def clear(self) -> None:
+        """מחיקת כל הרשומות — לשימוש כלי ההעברה (migrate --replace) בלבד."""
+        with storage.DATA_LOCK, closing(self._connect()) as con, con:
+            con.execute("DELETE FROM submissions")
+        with self._cache_lock:
+            self._cached, self._cached_seq = pd.DataFrame(), 0
+
+    def _frame(self, sql: str, params: tuple = ()) -> pd.DataFrame:
+        with closing(self._connect()) as con:
+            rows = [json.loads(r[0]) for r in con.execute(sql, params)]
+        return pd.DataFrame(rows)
+
+    def has_id(self, nat_id: str) -> bool:
+        with closing(self._connect()) as con:
+            return con.execute(
+                "SELECT 1 FROM submissions WHERE nat_id = ? LIMIT 1", (id_index.key(nat_id),)
+            ).fetchone() is not None
+
+    def load_master(self) -> pd.DataFrame:
+        """תצוגת המאסטר — שורה אחת לכל ת״ז (הטבלה עצמה שומרת את כל השליחות)."""
+        return self._latest_view(self.load_log())
+
+    def load_log(self) -> pd.DataFrame:
+        """כל הטבלה; בקריאות חוזרות נשלפות רק השורות שנוספו מאז (seq גדול מהאחרון)."""
+        with self._cache_lock, closing(self._connect()) as con:
+            new = con.execute(
+                "SELECT seq, row_json FROM submissions WHERE seq > ? ORDER BY seq", (self._cached_seq,)
+            ).fetchall()
+            if new:
+                added = dtypes.apply(pd.DataFrame([json.loads(r[1]) for r in new]))
+                self._cached = added if self._cached.empty else dtypes.concat([self._cached, added])
+                self._cached_seq = new[-1][0]
+            return self._cached
+
+    def generation(self) -> tuple:
+        with closing(self._connect()) as con:
+            return con.execute("SELECT COUNT(*), COALESCE(MAX(seq), 0) FROM submissions").fetchone()
+
+    def count(self) -> int:
+        with closing(self._connect()) as con:
+            return con.execute(
+                "SELECT COUNT(DISTINCT nat_id) + SUM(nat_id IS NULL) FROM submissions"
+            ).fetchone()[0] or 0
+
+    def find_by_id(self, nat_id: str) -> pd.DataFrame:
+        return self._frame(
+            "SELECT row_json FROM submissions WHERE nat_id = ? ORDER BY seq", (id_index.key(nat_id),)
+        )
+
+    def between(self, start: datetime, end: datetime) -> pd.DataFrame:
+        # תאריך_שליחה נשמר כ-"YYYY-MM-DD HH:MM:SS", ולכן השוואת מחרוזות = השוואת זמנים
+        return self._frame(
+            "SELECT row_json FROM submissions WHERE submitted_at BETWEEN ? AND ? ORDER BY seq",
+            (start.strftime("%Y-%m-%d %H:%M:%S"), end.strftime("%Y-%m-%d %H:%M:%S")),
+        )
+
+
+# =========================
+# בחירת מימוש
+# =========================
+BACKENDS = {"csv": CsvStore, "sqlite": SqliteStore}
+
+_stores: dict[str, SubmissionStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(backend: str | None = None, duplicate_policy: str | None = None) -> SubmissionStore:
+    """
+    מחזיר את ה-store של התהליך עבור backend (נוצר פעם אחת).
+    duplicate_policy — ברירת מחדל: DUPLICATE_POLICY מהסביבה, ואחריו keep_latest.
+    """
+    backend = (backend or os.environ.get("STORAGE_BACKEND") or "csv").lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"STORAGE_BACKEND לא מוכר: {backend!r} (אפשרויות: {', '.join(BACKENDS)})")
+    policy = id_index.check_policy(duplicate_policy or os.environ.get("DUPLICATE_POLICY"))
+    with _stores_lock:
+        if backend not in _stores:
+            _stores[backend] = BACKENDS[backend]()
+        _stores[backend].duplicate_policy = policy
+        return _stores[backend]
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+גיבויים מצטברים ודחוסים.
+
+במקום עותק מלא של המאסטר בכל שליחה:
+  • תמונת מצב מלאה (full) — המאסטר אחרי דחיסה, ב-gzip, אחת ל-FULL_EVERY גיבויים;
+  • מקטעי דלתא (delta) — רק הבתים שנוספו ליומן מאז הגיבוי הקודם, ב-gzip.
+כל נקודות השחזור רשומות בקובץ אינדקס קטן (index.json), כך שאין צורך לסרוק את התיקייה.
+שחזור לנקודת זמן = התמונה המלאה האחרונה שלפניה + כל הדלתות שאחריה עד אותה נקודה.
+במדיניות replace (dedupe) התמונה המלאה נרשמת כך, והשחזור משאיר רק את השליחה האחרונה לכל ת״ז.
+
+שורת פקודה:
+    python -m shibutz.backups list
+    python -m shibutz.backups backup [--full] [--policy replace]
+    python -m shibutz.backups restore --at "2025-09-01 12:00" --out restored.csv
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+from io import BytesIO
+from pathlib import Path
+
+import pandas as pd
+
+from shibutz import id_index, metrics, storage
+
+INDEX_FILE = storage.BACKUP_DIR / "index.json"
+
+DELTA_MIN_BYTES = 64 * 1024                 # דלתא נכתבת כשהצטבר לפחות כך ביומן...
+DELTA_MAX_AGE = timedelta(minutes=10)       # ...או כשעבר זמן זה מהגיבוי הקודם
+FULL_EVERY = 24                             # תמונה מלאה אחרי כל כך הרבה דלתות
+KEEP_FULL = 7                               # מדיניות שמירה: כמה תמונות מלאות (והדלתות שלהן) נשמרות
+
+TS_FMT = "%Y-%m-%d %H:%M:%S"
+
+# =========================
+# אינדקס
+# =========================
+def load_index() -> list[dict]:
+    """רשימת נקודות השחזור, מהישנה לחדשה."""
+    try:
+        return json.loads(INDEX_FILE.read_text(encoding="utf-8"))["points"]
+    except (FileNotFoundError, KeyError, ValueError):
+        return []
+
+
+def _save_index(points: list[dict]) -> None:
+    tmp = INDEX_FILE.with_suffix(".tmp.json")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"points": points}, f, ensure_ascii=False, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+    tmp.replace(INDEX_FILE)
+
+
+def _new_point(points: list[dict], kind: str, data: bytes, **extra) -> dict:
+    """
+    כותב את הארכיון (קובץ זמני, fsync, ואז החלפה) ומוסיף אותו לרשימה.
+    האינדקס נשמר רק אחר כך — הוא לעולם לא מצביע על ארכיון חלקי.
+    """
+    seq = points[-1]["seq"] + 1 if points else 1
+    now = datetime.now()
+    # מספר רץ בשם הקובץ — אין התנגשות גם בשני גיבויים באותה שנייה
+    name = f"{seq:06d}_{kind}_{now:%Y%m%d_%H%M%S}.csv.gz"
+    tmp = storage.BACKUP_DIR / f"{name}.tmp"
+    with open(tmp, "wb") as raw:
+        with gzip.GzipFile(name, mode="wb", compresslevel=6, fileobj=raw) as f:
+            f.write(data)
+        raw.flush()
+        os.fsync(raw.fileno())
+    tmp.replace(storage.BACKUP_DIR / name)
+    point = {"seq": seq, "kind": kind, "file": name, "created": now.strftime(TS_FMT), **extra}
+    points.append(point)
+    return point
+
+
+# =========================
+# יצירת גיבויים
+# =========================
+def snapshot_full(dedupe: bool = False) -> dict:
+    """
+    תמונת מצב מלאה: דוחסים את היומן למאסטר ושומרים את המאסטר ב-gzip.
+    dedupe — מדיניות replace: הדחיסה מוחקת שליחות קודמות, והשחזור מהנקודה (כולל הדלתות) גם.
+    """
+    with storage.DATA_LOCK:
+        storage.compact_master(dedupe)
+        points = load_index()
+        data = storage.CSV_FILE.read_bytes() if storage.CSV_FILE.exists() else b""
+        log_end = storage.CSV_LOG_FILE.stat().st_size if storage.CSV_LOG_FILE.exists() else 0
+        point = _new_point(
+            points, "full", data,
+            log_end=log_end, log_header=storage.read_header(storage.CSV_LOG_FILE), dedupe=dedupe,
+        )
+        pruned = _apply_retention(points)
+        _save_index(points)
+        # קבצים ישנים נמחקים רק אחרי שהאינדקס החדש (עם התמונה המלאה החדשה) בדיסק
+        for name in pruned:
+            (storage.BACKUP_DIR / name).unlink(missing_ok=True)
+        return point
+
+
+@metrics.timed("backups.maybe_backup")
+def maybe_backup(force_full: bool = False, dedupe: bool = False) -> dict | None:
+    """
+    נקרא אחרי כל כתיבה ליומן. זול כשאין מה לגבות (stat אחד + קריאת אינדקס).
+    dedupe — לפי מדיניות הכפילויות של ה-store (ראו snapshot_full).
+    מחזיר את נקודת השחזור שנוצרה, או None.
+    """
+    with storage.DATA_LOCK:
+        points = load_index()
+        last_full = next((p for p in reversed(points) if p["kind"] == "full"), None)
+        log_file = storage.CSV_LOG_FILE
+        if not force_full and not log_file.exists():
+            return None
+        if force_full or last_full is None or last_full.get("dedupe", False) != dedupe:
+            return snapshot_full(dedupe)
+
+        last = points[-1]
+        start = last["log_end"]
+        size = log_file.stat().st_size
+        # היומן נכתב מחדש (הרחבת עמודות) — ההיסטים הישנים לא תקפים, מתחילים תמונה מלאה
+        if size < start or storage.read_header(log_file) != last_full["log_header"]:
+            return snapshot_full(dedupe)
+
+        age = datetime.now() - datetime.strptime(last["created"], TS_FMT)
+        if size - start < DELTA_MIN_BYTES and not (size > start and age >= DELTA_MAX_AGE):
+            return None
+        deltas_since_full = sum(1 for p in points if p["kind"] == "delta" and p["base"] == last_full["seq"])
+        if deltas_since_full >= FULL_EVERY:
+            return snapshot_full(dedupe)
+
+        with log_file.open("rb") as f:
+            f.seek(start)
+            data = f.read(size - start)
+        data = storage.complete_records(data)
+        if not data:
+            return None
+        point = _new_point(points, "delta", data, log_start=start, log_end=start + len(data), base=last_full["seq"])
+        _save_index(points)
+        return point
+
+
+def _apply_retention(points: list[dict]) -> list[str]:
+    """
+    משאירים KEEP_FULL תמונות מלאות אחרונות ואת הדלתות שנשענות עליהן.
+    מוציא מ-points את הישנות ומחזיר את שמות הקבצים שלהן (למחיקה אחרי שמירת האינדקס).
+    """
+    fulls = [p["seq"] for p in points if p["kind"] == "full"]
+    if len(fulls) <= KEEP_FULL:
+        return []
+    oldest_kept = fulls[-KEEP_FULL]
+    pruned = [p for p in points if p["seq"] < oldest_kept]
+    for p in pruned:
+        points.remove(p)
+    return [p["file"] for p in pruned]
+
+
+# =========================
+# שחזור
+# =========================
+def restore_points() -> list[dict]:
+    return list(reversed(load_index()))
+
+
+def _read_gz(point: dict) -> bytes:
+    with gzip.open(storage.BACKUP_DIR / point["file"], "rb") as f:
+        return f.read()
+
+
+def rebuild_at(at: datetime | None = None) -> pd.DataFrame:
+    """המאסטר כפי שהיה בנקודת הגיבוי האחרונה שאינה מאוחרת מ-at (ברירת מחדל: העדכנית)."""
+    points = [p for p in load_index() if at is None or datetime.strptime(p["created"], TS_FMT) <= at]
+    base = next((p for p in reversed(points) if p["kind"] == "full"), None)
+    if base is None:
+        raise LookupError("אין גיבוי מלא לפני נקודת הזמן המבוקשת.")
+    full = _read_gz(base)
+    frames = [pd.read_csv(BytesIO(full), dtype=str, keep_default_na=False, encoding="utf-8-sig")] if full else []
+    deltas = [p for p in points if p["kind"] == "delta" and p["base"] == base["seq"]]
+    if deltas:
+        rows = b"".join(_read_gz(p) for p in deltas)
+        frames.append(pd.read_csv(
+            BytesIO(rows), header=None, names=base["log_header"],
+            dtype=str, keep_default_na=False, encoding="utf-8",
+        ))
+    if not frames:
+        return pd.DataFrame()
+    df = pd.concat(frames, ignore_index=True)
+    df.columns = [c.replace("\ufeff", "").strip() for c in df.columns]
+    # הדלתות הן בתים גולמיים מהיומן — שליחות חוזרות נמחקות כאן, כמו בדחיסה
+    return id_index.latest_only(df) if base.get("dedupe") else df
+
+
+def restore(at: datetime | None, out: Path) -> int:
+    """כותב לקובץ out את המאסטר לנקודת הזמן at. מחזיר את מספר הרשומות."""
+    df = rebuild_at(at)
+    df.to_csv(out, encoding="utf-8-sig", **storage.CSV_WRITE_KW)
+    return len(df)
+
+
+def _main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m shibutz.backups", description="גיבויים ושחזור של שאלון השיבוץ")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("list", help="הצגת נקודות השחזור")
+    b = sub.add_parser("backup", help="גיבוי עכשיו")
+    b.add_argument("--full", action="store_true", help="תמונת מצב מלאה במקום דלתא")
+    b.add_argument("--policy", help="מדיניות כפילויות (ברירת מחדל: DUPLICATE_POLICY מהסביבה)")
+    r = sub.add_parser("restore", help="בניית המאסטר לנקודת זמן")
+    r.add_argument("--at", help='"YYYY-MM-DD HH:MM[:SS]" — ברירת מחדל: הנקודה האחרונה')
+    r.add_argument("--out", required=True, type=Path, help="קובץ היעד (לא דורסים את המאסטר אוטומטית)")
+    args = ap.parse_args(argv)
+
+    storage.ensure_dirs()
+    if args.cmd == "list":
+        for p in restore_points():
+            print(f'{p["seq"]:>6}  {p["created"]}  {p["kind"]:<5}  {p["file"]}')
+    elif args.cmd == "backup":
+        dedupe = id_index.check_policy(args.policy or os.environ.get("DUPLICATE_POLICY")) == "replace"
+        p = maybe_backup(force_full=args.full, dedupe=dedupe)
+        print(f'{p["kind"]} -> {p["file"]}' if p else "אין שינויים חדשים לגיבוי.")
+    else:
+        at = datetime.fromisoformat(args.at) if args.at else None
+        n = restore(at, args.out)
+        print(f"שוחזרו {n} רשומות אל {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(_main())
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+מטמון פריימים לכל התהליך, מודע לשינויים בקבצים.
+
+מסך המנהל רץ מחדש בכל אינטראקציה; בלי מטמון, כל ריצה מפרסרת מחדש את המאסטר ואת היומן.
+כאן כל קובץ נשמר יחד עם החתימה שלו (inode, גודל, mtime):
+  • החתימה לא השתנתה — מחזירים את הפריים מהזיכרון;
+  • הקובץ רק גדל (אותו inode, אותה כותרת, ואותם בתים לפני הנקודה שעד אליה פורסר) — מפרסרים
+    רק את הבתים שנוספו ומצרפים;
+  • כל שינוי אחר (כתיבה אטומית מחדש — גם כשה-inode ממוחזר והקובץ החדש גדול יותר, כותרת חדשה)
+    — קריאה מלאה.
+(mtime לא מספיק כאן: כל הוספה משנה אותו, כך שהוא לא מבדיל בין הוספה לכתיבה מחדש.)
+הפריימים נשמרים בטיפוסים הקומפקטיים של shibutz/dtypes.py (category / Int8 / datetime).
+לכל קובץ יש גם מספר דור (generation) שעולה בכל שינוי — לשימוש מטמונים נגזרים (ייצוא וכו').
+"""
+import threading
+from pathlib import Path
+
+import pandas as pd
+
+from shibutz import dtypes, metrics, storage
+
+
+TAIL_CHECK_BYTES = 64 * 1024
+
+
+class _Entry:
+    __slots__ = ("signature", "offset", "records", "header", "frame", "generation", "mark")
+
+    def __init__(self, signature, offset, records, header, frame, generation, mark=b""):
+        self.signature = signature
+        self.offset = offset        # עד איזה בית הקובץ פורסר
+        self.records = records      # כמה רשומות CSV (כולל הכותרת ושורות שהוסגרו) יש בבתים האלה
+        self.header = header
+        self.frame = frame
+        self.generation = generation
+        self.mark = mark            # TAIL_CHECK_BYTES הבתים שלפני offset — לזיהוי כתיבה מחדש
+
+
+_entries: dict[Path, _Entry] = {}
+_lock = threading.Lock()
+
+
+def file_signature(path: Path) -> tuple | None:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def _mark(path: Path, offset: int) -> bytes:
+    """הבתים שלפני offset (עד TAIL_CHECK_BYTES) — כמו שהם עכשיו בקובץ."""
+    start = max(0, offset - TAIL_CHECK_BYTES)
+    with path.open("rb") as f:
+        f.seek(start)
+        return f.read(offset - start)
+
+
+def _read_complete(path: Path, start: int, size: int) -> bytes:
+    """הבתים [start, size) — רק עד סוף הרשומה השלמה האחרונה."""
+    with path.open("rb") as f:
+        f.seek(start)
+        data = f.read(size - start)
+    return storage.complete_records(data)
+
+
+def _snapshot(path: Path, entry: _Entry | None) -> tuple:
+    """
+    (חתימה, האם רק נוספו בתים, הבתים לפרסור) — נקרא תחת DATA_LOCK, שהכותב מחזיק לכל אורך
+    ההוספה, כך שלא נקרא רשומה שנכתבה רק בחלקה. הפרסור עצמו — אחרי שהנעילה שוחררה.
+    """
+    signature = file_signature(path)
+    if signature is None or (entry is not None and entry.signature == signature):
+        return signature, False, b""
+    grew = (
+        entry is not None
+        and entry.offset is not None
+        and entry.signature[0] == signature[0]      # אותו inode — לא נכתב מחדש
+        and signature[1] >= entry.offset
+        and storage.read_header(path) == entry.header
+        and _mark(path, entry.offset) == entry.mark   # הבתים שכבר פורסרו לא הוחלפו
+    )
+    if grew:
+        return signature, True, _read_complete(path, entry.offset, signature[1])
+    return signature, False, _read_complete(path, 0, signature[1])
+
+
+def _full_load(path: Path, signature: tuple, data: bytes, generation: int) -> _Entry:
+    try:
+        df = storage.parse_csv(path, data=data, dtype=dtypes.READ_DTYPE)
+    except Exception:
+        # קובץ שתוכנית הפרסור לא מתאימה לו — המסלול החסין הרגיל (ללא המשך אינקרמנטלי)
+        return _Entry(signature, None, 0, None, dtypes.apply(storage.load_csv_safely(path, dtypes.READ_DTYPE)), generation)
+    records = 1 + len(df) + df.attrs["bad_lines"]
+    return _Entry(signature, len(data), records, list(df.columns), dtypes.apply(df), generation,
+                  data[-TAIL_CHECK_BYTES:])
+
+
+@metrics.timed("cache.load_frame")
+def load_frame(path: Path) -> pd.DataFrame:
+    """
+    הפריים של path, מהמטמון או מעודכן אינקרמנטלית.
+    הפריים המוחזר משותף לכל הסשנים — לקריאה בלבד.
+    """
+    path = Path(path)
+    while True:
+        entry = _entries.get(path)
+        # סדר הנעילות: DATA_LOCK ואז _lock (כמו אצל מי שקורא ל-load_frame כשהוא מחזיק את DATA_LOCK)
+        with storage.DATA_LOCK:
+            signature, grew, data = _snapshot(path, entry)
+        with _lock:
+            if _entries.get(path) is not entry:
+                continue        # thread אחר עדכן את הרשומה בינתיים — תמונת מצב חדשה
+            if signature is None:
+                _entries.pop(path, None)
+                return pd.DataFrame()
+            if entry is not None and entry.signature == signature:
+                return entry.frame
+
+            generation = entry.generation + 1 if entry else 1
+            if grew and not data:
+                entry = _Entry(signature, entry.offset, entry.records, entry.header, entry.frame, entry.generation,
+                               entry.mark)
+            elif grew:
+                try:
+                    new_rows = storage.parse_csv(path, data=data, names=entry.header, first_line=entry.records + 1,
+                                                 dtype=dtypes.READ_DTYPE)
+                except Exception:
+                    # הזנב לא מתפרסר — קריאה מלאה בסיבוב הבא (רשומה בלי offset; הדור נשמר)
+                    _entries[path] = _Entry(None, None, 0, None, entry.frame, entry.generation)
+                    continue
+                else:
+                    frame = dtypes.concat([entry.frame, dtypes.apply(new_rows)])
+                    entry = _Entry(signature, entry.offset + len(data),
+                                   entry.records + len(new_rows) + new_rows.attrs["bad_lines"],
+                                   entry.header, frame, generation, (entry.mark + data)[-TAIL_CHECK_BYTES:])
+            else:
+                entry = _full_load(path, signature, data, generation)
+            _entries[path] = entry
+            return entry.frame
+
+
+def generation(path: Path) -> int:
+    """מספר הדור של path כפי שנטען לאחרונה (0 — לא נטען)."""
+    entry = _entries.get(Path(path))
+    return entry.generation if entry else 0
+
+
+def invalidate(path: Path | None = None) -> None:
+    with _lock:
+        if path is None:
+            _entries.clear()
+        else:
+            _entries.pop(Path(path), None)
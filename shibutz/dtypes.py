@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+טיפוסים חסכוניים לפריימים בזיכרון — מסך המנהל מחזיק את המאסטר ואת היומן לכל התהליך.
+
+בקריאה רגילה כל עמודת טקסט היא object (מחרוזת פייתון לכל תא) גם כשיש בה קומץ ערכים
+אפשריים, ועמודות דירוג_<מוסד> הן float64 בגלל תאים ריקים. כאן, מיד אחרי הקריאה:
+  • שדות בחירה (מין, שנת לימודים, מוטיבציה, המוסד בכל מדרגה…) — category;
+  • דירוג_<מוסד> — Int8, עם NA למוסד שלא דורג;
+  • תאריך_שליחה — datetime64;
+  • ת״ז וטלפון — מחרוזות (READ_DTYPE לקריאה; עמודה שכבר נקראה כמספר — עם האפסים המובילים בחזרה).
+שאר העמודות (שמות, טקסט חופשי) נשארות כמו שנקראו. עמודה שההמרה הייתה
+מאבדת בה ערכים (טקסט בעמודת דירוג, תאריך בפורמט לא מוכר) נשארת כמו שהיא.
+
+read_chunks — יומן של כמה מחזורים במקטעים, עם סינון לפי עמודות וטווח תאריכים:
+כל מקטע מומר מיד, כך שהקובץ כולו לא מוחזק אף פעם כמחרוזות.
+"""
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from shibutz import storage
+
+DATE_COL = "תאריך_שליחה"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+RANK_PREFIX = "דירוג_"
+CATEGORY_COLS = frozenset({"מין", "שיוך_חברתי", "שפת_אם", "שנת_לימודים", "ניידות", "הכשרה_קודמת", "תחום_מוביל"})
+CATEGORY_PREFIXES = ("מוטיבציה_", "דירוג_מדרגה_")
+ID_COL, PHONE_COL = "תעודת_זהות", "טלפון"
+ID_WIDTH = 9
+
+# ל-read_csv: בלי הסקת טיפוסים לת״ז ולטלפון — "000000018" לא הופך ל-18
+READ_DTYPE = {ID_COL: str, PHONE_COL: str}
+
+CHUNK_ROWS = 20_000
+
+
+def column_kind(col: str) -> str | None:
+    """"category" / "rank" / "date" / "id" / "phone" — או None לעמודה שנשארת כמו שהיא."""
+    if col == ID_COL:
+        return "id"
+    if col == PHONE_COL:
+        return "phone"
+    if col in CATEGORY_COLS or col.startswith(CATEGORY_PREFIXES):
+        return "category"
+    if col.startswith(RANK_PREFIX):
+        return "rank"
+    if col == DATE_COL:
+        return "date"
+    return None
+
+
+def _blank(s: pd.Series) -> pd.Series:
+    return s.isna() | (s.astype(str).str.strip() == "")
+
+
+def _to_category(s: pd.Series) -> pd.Series:
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return s
+    if s.dtype != object and not s.isna().all():
+        return s      # עמודה מספרית (למשל סולם שכולו ספרות) — כבר קומפקטית
+    cat = s.astype("category")
+    # ריק כמו חסר — הבדיקה על הקטגוריות בלבד, לא על כל התאים
+    blank = [c for c in cat.cat.categories if not str(c).strip()]
+    return cat.cat.remove_categories(blank) if blank else cat
+
+
+def _to_rank(s: pd.Series) -> pd.Series:
+    if s.dtype == "Int8":
+        return s
+    num = pd.to_numeric(s, errors="coerce")
+    if s.dtype == object:
+        missing = num.isna() & s.notna()
+        if missing.any() and not _blank(s[missing]).all():
+            return s      # טקסט בעמודת דירוג — לא מאבדים אותו
+    known = num.dropna()
+    if not (known.between(-128, 127) & (known % 1 == 0)).all():
+        return s
+    return num.astype("Int8")
+
+
+def _to_date(s: pd.Series) -> pd.Series:
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return s
+    ts = pd.to_datetime(s, format=DATE_FORMAT, errors="coerce")
+    lost = s.index[(ts.isna() & s.notna()).to_numpy()]
+    lost = lost[~_blank(s[lost]).to_numpy()]
+    if len(lost):
+        ts[lost] = pd.to_datetime(s[lost].astype(str), format="mixed", errors="coerce")
+        if ts[lost].isna().any():
+            return s
+    return ts
+
+
+def _to_text(s: pd.Series, prefix: str = "", width: int = 0) -> pd.Series:
+    """
+    מחרוזות (ריק לחסר). עמודה שנקראה כמספר — בלי ".0", ועם מה שהסקת הטיפוסים מחקה:
+    האפס המוביל כשחסרה בדיוק ספרה אחת עד width (ת״ז), או הקידומת (טלפון).
+    ערך קצר יותר נשאר כמו שנקרא — לא "מתקנים" ת״ז פגומה לכזו שנראית תקינה.
+    """
+    if s.dtype == object and not s.isna().any():
+        return s
+    if pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s):
+        text = s.astype("Float64").astype("string").str.replace(r"\.0$", "", regex=True)
+        if width:
+            text = text.mask(text.str.len() == width - 1, "0" + text)
+        return (prefix + text).fillna("").astype(object)
+    return s.astype("string").fillna("").astype(object)
+
+
+_CONVERT = {
+    "category": _to_category, "rank": _to_rank, "date": _to_date,
+    "id": lambda s: _to_text(s, width=ID_WIDTH),
+    "phone": lambda s: _to_text(s, prefix="0"),
+}
+
+
+def apply(df: pd.DataFrame) -> pd.DataFrame:
+    """df עם הטיפוסים הקומפקטיים (העמודות האחרות — אותם מערכים, בלי העתקה)."""
+    out = df.copy(deep=False)
+    for col in df.columns:
+        kind = column_kind(str(col))
+        if kind is not None:
+            out[col] = _CONVERT[kind](df[col])
+    return out
+
+
+def concat(frames: list[pd.DataFrame]) -> pd.DataFrame:
+    """
+    pd.concat ששומר על category: קטגוריות של אותה עמודה מאוחדות (union_categoricals),
+    אחרת pandas מחזיר object לכל עמודה שבה הקטגוריות שונות בין החלקים.
+    """
+    frames = [f for f in frames if len(f.columns)]
+    if len(frames) <= 1:
+        return frames[0] if frames else pd.DataFrame()
+    columns = list(dict.fromkeys(c for f in frames for c in f.columns))
+    out = {}
+    for col in columns:
+        parts = [f[col] if col in f.columns else pd.Series(None, index=f.index, dtype=object) for f in frames]
+        if any(isinstance(p.dtype, pd.CategoricalDtype) for p in parts):
+            parts = [p if isinstance(p.dtype, pd.CategoricalDtype) else p.astype("category") for p in parts]
+            out[col] = pd.Series(union_categoricals(parts, ignore_order=True))
+        else:
+            out[col] = pd.concat(parts, ignore_index=True)
+    return pd.DataFrame(out)
+
+
+def read_chunks(path: Path, chunk_rows: int = CHUNK_ROWS, columns: list[str] | None = None,
+                since: datetime | None = None, until: datetime | None = None) -> Iterator[pd.DataFrame]:
+    """
+    הקובץ במקטעים טיפוסיים (storage.read_csv_chunks + apply): הערכים כמו שנכתבו —
+    ת״ז וטלפון כמחרוזות, עם האפסים המובילים. since/until — רק שליחות בטווח (כולל).
+    """
+    for chunk in storage.read_csv_chunks(path, chunk_rows):
+        if columns is not None:
+            chunk = chunk[[c for c in columns if c in chunk.columns]]
+        chunk = apply(chunk)
+        if (since or until) and DATE_COL in chunk.columns:
+            ts = chunk[DATE_COL]
+            keep = ts.notna()
+            if since is not None:
+                keep &= ts >= since
+            if until is not None:
+                keep &= ts <= until
+            chunk = chunk[keep]
+        yield chunk
+
+
+def read(path: Path, **kw) -> pd.DataFrame:
+    """read_chunks מחוברים לפריים אחד (שיא הזיכרון — מקטע אחד כמחרוזות + התוצאה הקומפקטית)."""
+    return concat(list(read_chunks(path, **kw)))
+
+
+def memory_mb(df: pd.DataFrame) -> float:
+    return df.memory_usage(deep=True).sum() / 1e6
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+ייצוא ל-Excel — רק לפי בקשה, בכתיבה זורמת, עם מטמון לפי דור הנתונים.
+
+  • הכתיבה ב-xlsxwriter במצב constant_memory: שורה אחרי שורה, בחלקים,
+    כך שייצוא של 100 אלף שורות לא מחזיק את כל הגיליון בזיכרון;
+  • רוחב העמודות מוערך בפעולה וקטורית (.str.len) על מדגם שורות, לא תא-תא;
+  • הקובץ נשמר ב-data/exports עם מפתח לפי store.generation() — הורדה חוזרת
+    של אותם נתונים לא בונה את הקובץ שוב.
+"""
+import hashlib
+import threading
+from io import BytesIO
+from pathlib import Path
+
+import pandas as pd
+
+from shibutz import metrics, storage
+
+EXPORT_DIR = storage.DATA_DIR / "exports"
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+CHUNK_ROWS = 5000
+WIDTH_SAMPLE_ROWS = 5000
+MIN_WIDTH, MAX_WIDTH = 12, 60
+
+_build_lock = threading.Lock()
+
+
+def column_widths(df: pd.DataFrame) -> list[int]:
+    """רוחב לכל עמודה לפי האורך המקסימלי במדגם (ראש הטבלה + סופה) ובכותרת."""
+    if df.empty:
+        return [max(MIN_WIDTH, min(MAX_WIDTH, len(str(c)) + 4)) for c in df.columns]
+    half = WIDTH_SAMPLE_ROWS // 2
+    sample = df if len(df) <= WIDTH_SAMPLE_ROWS else pd.concat([df.head(half), df.tail(half)])
+    lengths = sample.astype(str).apply(lambda s: s.str.len().max())
+    header = pd.Series([len(str(c)) for c in df.columns], index=lengths.index)
+    return [int(w) for w in (pd.concat([lengths, header], axis=1).max(axis=1) + 4).clip(MIN_WIDTH, MAX_WIDTH)]
+
+
+@metrics.timed("exports.write_excel")
+def write_excel(df: pd.DataFrame, target, sheet: str = "Sheet1") -> None:
+    """כתיבת df לקובץ/זרם target בגיליון אחד, במצב זיכרון קבוע."""
+    import xlsxwriter  # נטען רק כשבאמת מייצאים
+
+    # תאריך_שליחה נטען כ-datetime (shibutz/dtypes.py) — בלי פורמט Excel מציג מספר סידורי
+    wb = xlsxwriter.Workbook(target, {"constant_memory": True, "default_date_format": "yyyy-mm-dd hh:mm:ss"})
+    try:
+        ws = wb.add_worksheet(sheet)
+        for i, width in enumerate(column_widths(df)):
+            ws.set_column(i, i, width)
+        ws.write_row(0, 0, [str(c) for c in df.columns])
+        r = 1
+        for start in range(0, len(df), CHUNK_ROWS):
+            chunk = df.iloc[start:start + CHUNK_ROWS]
+            # NaN/NaT -> תא ריק (xlsxwriter לא כותב NaN)
+            values = chunk.astype(object).where(chunk.notna(), None).values.tolist()
+            for row in values:
+                ws.write_row(r, 0, row)
+                r += 1
+    finally:
+        wb.close()
+
+
+def df_to_excel_bytes(df: pd.DataFrame, sheet: str = "Sheet1") -> bytes:
+    """המרת DataFrame ל-Excel בזיכרון עם התאמת רוחב עמודות."""
+    bio = BytesIO()
+    write_excel(df, bio, sheet)
+    return bio.getvalue()
+
+
+# =========================
+# ייצוא לפי דרישה + מטמון לפי דור
+# =========================
+def _artifact_path(store, which: str) -> Path:
+    key = hashlib.sha1(repr((store.name, which, store.generation())).encode()).hexdigest()[:12]
+    return EXPORT_DIR / f"{store.name}_{which}_{key}.xlsx"
+
+
+def cached_export(store, which: str) -> Path | None:
+    """הקובץ המוכן לנתונים הנוכחיים, אם כבר נבנה — אחרת None."""
+    path = _artifact_path(store, which)
+    return path if path.exists() else None
+
+
+def build_export(store, which: str) -> Path:
+    """
+    בונה (או מחזיר מהמטמון) את קובץ ה-Excel של which ∈ {"master", "log"}.
+    גרסאות ישנות של אותו ייצוא נמחקות.
+    """
+    with _build_lock:
+        # טעינה לפני חישוב המפתח — ב-CSV הטעינה כוללת דחיסה שמשנה את הדור
+        df = store.load_master() if which == "master" else store.load_log()
+        path = _artifact_path(store, which)
+        if path.exists():
+            return path
+        EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp.xlsx")
+        write_excel(df, str(tmp), sheet="Master" if which == "master" else "Log")
+        tmp.replace(path)
+        for old in EXPORT_DIR.glob(f"{store.name}_{which}_*.xlsx"):
+            if old != path:
+                old.unlink(missing_ok=True)
+        return path
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+אינדקס תעודות זהות של היומן — "האם כבר שלח?" ב-O(1), בלי לסרוק את ה-CSV.
+
+האינדקס נשמר כקובץ Append-Only ליד היומן: שורה "ת״ז<TAB>מספר_שורה" לכל שורה שנוספה
+ליומן (מספר השורה הוא מספר הרשומה ביומן, מ-0). בזיכרון הוא מילון ת״ז -> [מופעים, שורה אחרונה].
+העדכון נעשה בתוך append_to_log, תחת DATA_LOCK, מיד אחרי הכתיבה ליומן; בשורה האחרונה של כל
+עדכון נרשם גם גודל היומן שהאינדקס מכסה ("<TAB>סוף_היומן").
+בטעינה: אם הקובץ חסר (התקנה קיימת), או שהגודל הרשום לא תואם ליומן (קריסה בין הכתיבה ליומן
+לכתיבה לאינדקס) — האינדקס נבנה מחדש מהיומן, כדי ש-reject לא יפספס ת״ז שכבר ביומן.
+
+מדיניות כפילויות (DUPLICATE_POLICY):
+  • reject      — שליחה חוזרת עם אותה ת״ז נדחית;
+  • replace     — השליחה החדשה מחליפה את הקודמת: הדחיסה מוחקת מהמאסטר את השורה הישנה;
+  • keep_latest — כל השליחות נשמרות במאסטר (היסטוריה), ותצוגת המאסטר מציגה רק את האחרונה.
+היומן עצמו תמיד שומר את כל השליחות.
+"""
+import threading
+
+import pandas as pd
+
+from shibutz import storage
+
+ID_COL = "תעודת_זהות"
+INDEX_FILE = storage.DATA_DIR / "שאלון_שיבוץ_ids.tsv"
+
+POLICIES = ("reject", "replace", "keep_latest")
+DEFAULT_POLICY = "keep_latest"
+
+_ids: dict[str, list[int]] | None = None
+_rows = 0
+_lock = threading.RLock()
+
+
+class DuplicateSubmission(ValueError):
+    """שליחה חוזרת עם ת״ז שכבר קיימת, כשהמדיניות היא reject."""
+
+
+def check_policy(policy: str | None) -> str:
+    policy = (policy or DEFAULT_POLICY).lower()
+    if policy not in POLICIES:
+        raise ValueError(f"DUPLICATE_POLICY לא מוכר: {policy!r} (אפשרויות: {', '.join(POLICIES)})")
+    return policy
+
+
+def key(nat_id) -> str:
+    """צורה אחידה לת״ז: ספרות בלבד בלי אפסים מובילים (ביומן הערך עשוי להיקרא כמספר)."""
+    s = str(nat_id).strip()
+    if s.endswith(".0"):
+        s = s[:-2]
+    return (s.lstrip("0") or "0") if s.isdigit() else s
+
+
+def _add_locked(ids: list[str]) -> None:
+    global _rows
+    for nat_id in ids:
+        entry = _ids.setdefault(nat_id, [0, _rows])
+        entry[0] += 1
+        entry[1] = _rows
+        _rows += 1
+
+
+def _log_end() -> int:
+    return storage.CSV_LOG_FILE.stat().st_size if storage.CSV_LOG_FILE.exists() else 0
+
+
+def _lines(ids: list[str], start: int) -> str:
+    """שורות האינדקס; בשורה האחרונה גם גודל היומן הנוכחי."""
+    lines = [f"{nat_id}\t{start + n}" for n, nat_id in enumerate(ids)]
+    if lines:
+        lines[-1] += f"\t{_log_end()}"
+    return "".join(line + "\n" for line in lines)
+
+
+def _load() -> None:
+    # DATA_LOCK לפני _lock (כמו ב-append_to_log) — היומן לא משתנה בזמן ההשוואה או הבנייה מחדש
+    if _ids is None:
+        with storage.DATA_LOCK, _lock:
+            _load_locked()
+
+
+def _load_locked() -> bool:
+    """טוען את האינדקס אם עוד לא נטען. מחזיר True אם הוא נבנה עכשיו מחדש מהיומן."""
+    global _ids, _rows
+    if _ids is not None:
+        return False
+    _ids, _rows = {}, 0
+    if INDEX_FILE.exists():
+        lines = INDEX_FILE.read_text(encoding="utf-8").splitlines()
+        last = lines[-1].split("\t") if lines else []
+        if len(last) == 3 and last[2] == str(_log_end()):
+            _add_locked([line.partition("\t")[0] for line in lines if line])
+            return False
+    if not storage.CSV_LOG_FILE.exists():
+        return False
+    # רק עמודת הת״ז, במקטעים — בלי לטעון את כל היומן לזיכרון
+    ids = [chunk[ID_COL] if ID_COL in chunk.columns else pd.Series("", index=chunk.index)
+           for chunk in storage.read_csv_chunks(storage.CSV_LOG_FILE)]
+    rebuild(pd.DataFrame({ID_COL: pd.concat(ids, ignore_index=True) if ids else []}))
+    return True
+
+
+def rebuild(df_log: pd.DataFrame) -> None:
+    """בנייה מחדש מהיומן כולו (כשהקובץ חסר או לא תואם ליומן, או אחרי שחזור)."""
+    global _ids, _rows
+    ids = [key(v) for v in df_log[ID_COL]] if ID_COL in df_log.columns else [""] * len(df_log)
+    with _lock:
+        _ids, _rows = {}, 0
+        _add_locked(ids)
+        tmp = INDEX_FILE.with_suffix(".tmp.tsv")
+        tmp.write_text(_lines(ids, 0), encoding="utf-8")
+        tmp.replace(INDEX_FILE)
+
+
+def add(nat_ids: list) -> None:
+    """רישום שורות שנוספו הרגע לסוף היומן (לפי הסדר; נקרא תחת DATA_LOCK)."""
+    ids = [key(v) for v in nat_ids]
+    with _lock:
+        if _load_locked():
+            return      # נבנה עכשיו מהיומן, שכבר כולל את השורות האלה
+        start = _rows
+        _add_locked(ids)
+        with INDEX_FILE.open("a", encoding="utf-8") as f:
+            f.write(_lines(ids, start))
+
+
+def reset() -> None:
+    """יומן חדש (נוצר מאפס) — מתחילים אינדקס ריק."""
+    global _ids, _rows
+    with _lock:
+        _ids, _rows = {}, 0
+        INDEX_FILE.unlink(missing_ok=True)
+
+
+def occurrences(nat_id) -> int:
+    """כמה פעמים הופיעה ת״ז ביומן."""
+    _load()
+    with _lock:
+        entry = _ids.get(key(nat_id))
+        return entry[0] if entry else 0
+
+
+def contains(nat_id) -> bool:
+    return occurrences(nat_id) > 0
+
+
+def latest_row_no(nat_id) -> int | None:
+    """מספר הרשומה ביומן של השליחה האחרונה עם ת״ז זו."""
+    _load()
+    with _lock:
+        entry = _ids.get(key(nat_id))
+        return entry[1] if entry else None
+
+
+def latest_only(df: pd.DataFrame) -> pd.DataFrame:
+    """רק השורה האחרונה לכל ת״ז (שורות בלי ת״ז נשארות כמו שהן)."""
+    if df.empty or ID_COL not in df.columns:
+        return df
+    # אותו נרמול כמו key(), בפעולות וקטוריות
+    keys = df[ID_COL].astype(str).str.strip().str.replace(r"\.0$", "", regex=True)
+    digits = keys.str.isdigit()
+    keys[digits] = keys[digits].str.lstrip("0").replace("", "0")
+    dup = keys.duplicated(keep="last") & (keys != "") & df[ID_COL].notna()
+    return df[~dup] if dup.any() else df
@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""
+ייבוא שליחות מקובץ (CSV / Excel) — טפסי נייר ושליחות מאוחרות שרכזים אספו בגיליון.
+
+הקובץ נקרא במקטעים (CHUNK_ROWS שורות) ולא בבת אחת. לכל מקטע:
+  1. העמודות ממופות לעמודות השורה של הטופס (שם זהה, רווחים במקום קו תחתון, כינויים נפוצים,
+     "מדרגה 3" -> דירוג_מדרגה_3_מוסד, שם מוסד -> דירוג_<מוסד>);
+  2. עמודות הדירוג משלימות זו את זו (מדרגה -> מוסד, ומוסד -> מדרגה) כמו בטופס;
+  3. בדיקת תקינות וקטורית (shibutz/validation.py) — שורות פסולות נכנסות לדוח ולא נשמרות;
+  4. השורות התקינות נשלחות יחד דרך הכותב המשותף (Group Commit, מדיניות הכפילויות, סטטיסטיקה).
+המאסטר לא נטען במהלך הייבוא.
+
+    python -m shibutz.importer paper_forms.xlsx
+"""
+import argparse
+import io
+import re
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Iterator
+
+import numpy as np
+import pandas as pd
+
+from shibutz import metrics, sites, storage, validation, writer
+
+CHUNK_ROWS = 5000
+
+# עמודות השורה, באותו סדר כמו השורה שנבנית בטופס (validate_and_save); אחריהן הדירוגים
+BASE_COLUMNS = [
+    "תאריך_שליחה", "שם_פרטי", "שם_משפחה", "תעודת_זהות", "מין", "שיוך_חברתי", "שפת_אם", "שפות_נוספות",
+    "טלפון", "כתובת", "אימייל", "שנת_לימודים", "מסלול_לימודים", "ניידות", "הכשרה_קודמת",
+    "הכשרה_קודמת_מקום_ותחום", "הכשרה_קודמת_מדריך_ומיקום", "הכשרה_קודמת_בן_זוג",
+    "תחומים_מועדפים", "תחום_מוביל", "בקשה_מיוחדת", "ממוצע", "התאמות", "התאמות_פרטים",
+    "מוטיבציה_1", "מוטיבציה_2", "מוטיבציה_3",
+]
+NUMERIC_COLUMNS = ["ממוצע"]
+DATE_COL = "תאריך_שליחה"
+ID_COL = "תעודת_זהות"
+PHONE_COL = "טלפון"
+
+ALIASES = {
+    "ת״ז": "תעודת_זהות", 'ת"ז': "תעודת_זהות", "תז": "תעודת_זהות", "מספר_תעודת_זהות": "תעודת_זהות",
+    "דוא״ל": "אימייל", 'דוא"ל': "אימייל", "דואל": "אימייל", "email": "אימייל",
+    "מספר_טלפון": "טלפון", "טלפון_נייד": "טלפון",
+    "ממוצע_ציונים": "ממוצע", "שנה": "שנת_לימודים", "תאריך": "תאריך_שליחה",
+}
+_RANK_HEADER_RE = re.compile(r"(?:דירוג_)?מדרגה_?(\d+)(?:_מוסד)?")
+_LOST_ZERO_RE = r"[1-9]\d{7,8}"     # טלפון שנשמר כמספר ב-Excel ואיבד את האפס המוביל
+
+
+def _norm(header) -> str:
+    return re.sub(r"[\s\-]+", "_", str(header).replace("\ufeff", "").strip())
+
+
+def row_columns(catalogue: sites.Catalogue) -> list[str]:
+    return (BASE_COLUMNS + [validation.RANK_COL.format(i) for i in range(1, catalogue.rank_count + 1)]
+            + [f"דירוג_{s}" for s in catalogue.sites])
+
+
+def map_columns(header: list, catalogue: sites.Catalogue) -> tuple[dict[str, str], list[str]]:
+    """{עמודה בקובץ: עמודה בשורה}, ורשימת העמודות שלא זוהו (עמודת יעד ממופה פעם אחת)."""
+    targets = {_norm(c): c for c in row_columns(catalogue)}
+    targets.update({_norm(k): v for k, v in ALIASES.items()})
+    targets.update({_norm(s): f"דירוג_{s}" for s in catalogue.sites})
+    mapping, unmapped = {}, []
+    for col in header:
+        key = _norm(col)
+        target = targets.get(key)
+        m = _RANK_HEADER_RE.fullmatch(key)
+        if target is None and m and 1 <= int(m.group(1)) <= catalogue.rank_count:
+            target = validation.RANK_COL.format(int(m.group(1)))
+        if target is None or target in mapping.values():
+            unmapped.append(str(col))
+        else:
+            mapping[col] = target
+    return mapping, unmapped
+
+
+# =========================
+# קריאה במקטעים
+# =========================
+def _csv_chunks(source, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    plan = storage.sniff_sample(source.read(storage.SNIFF_BYTES))
+    source.seek(0)
+    yield from pd.read_csv(source, dtype=str, keep_default_na=False, encoding=plan["encoding"],
+                           sep=plan["sep"], chunksize=chunk_rows)
+
+
+def _cell(v) -> str:
+    if v is None:
+        return ""
+    if isinstance(v, datetime):
+        return v.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v))
+    return str(v)
+
+
+def _xlsx_chunks(source, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    from openpyxl import load_workbook   # תלות רק לייבוא Excel
+
+    wb = load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = [_cell(v) for v in next(rows, ())]
+        while header and not header[-1]:
+            header.pop()
+        buf = []
+        for values in rows:
+            if not any(v is not None and v != "" for v in values):
+                continue
+            buf.append([_cell(v) for v in values[: len(header)]] + [""] * (len(header) - len(values)))
+            if len(buf) >= chunk_rows:
+                yield pd.DataFrame(buf, columns=header)
+                buf = []
+        if buf:
+            yield pd.DataFrame(buf, columns=header)
+    finally:
+        wb.close()
+
+
+def read_chunks(source, name: str, chunk_rows: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """מקטעי הקובץ כמחרוזות. source — נתיב או אובייקט קובץ בינארי (למשל UploadedFile)."""
+    if isinstance(source, (str, Path)):
+        source = io.BytesIO(Path(source).read_bytes())
+    suffix = Path(name).suffix.lower()
+    if suffix in (".xlsx", ".xlsm"):
+        return _xlsx_chunks(source, chunk_rows)
+    if suffix in (".csv", ".txt"):
+        return _csv_chunks(source, chunk_rows)
+    raise ValueError(f"סוג קובץ לא נתמך: {suffix or name} (CSV או XLSX)")
+
+
+# =========================
+# מקטע -> שורות
+# =========================
+def _fill_ranks(df: pd.DataFrame, catalogue: sites.Catalogue) -> None:
+    rank_cols = [validation.RANK_COL.format(i) for i in range(1, catalogue.rank_count + 1)]
+    site_cols = [f"דירוג_{s}" for s in catalogue.sites]
+    site_arr = np.array(catalogue.sites, dtype=object)
+
+    ranks = df[rank_cols].to_numpy(dtype=object)
+    if not (ranks != "").any():
+        # בקובץ רק "דירוג_<מוסד>" = מדרגה: בונים ממנו את המדרגות
+        pos = df[site_cols].apply(pd.to_numeric, errors="coerce").to_numpy()
+        for i, col in enumerate(rank_cols, start=1):
+            hit = pos == i
+            df[col] = np.where(hit.any(axis=1), site_arr[hit.argmax(axis=1)], "")
+        ranks = df[rank_cols].to_numpy(dtype=object)
+    # ומוסד -> מדרגה תמיד לפי המדרגות, כמו בטופס (None למוסד שלא דורג)
+    for site, col in zip(catalogue.sites, site_cols):
+        hit = ranks == site
+        df[col] = np.where(hit.any(axis=1), hit.argmax(axis=1) + 1, None)
+
+
+def prepare_chunk(chunk: pd.DataFrame, mapping: dict[str, str], catalogue: sites.Catalogue,
+                  now: str | None = None) -> pd.DataFrame:
+    """מקטע מהקובץ -> פריים בעמודות השורה של הטופס."""
+    df = chunk[list(mapping)].rename(columns=mapping).reindex(columns=row_columns(catalogue), fill_value="")
+    df = df.fillna("").astype(str).apply(lambda s: s.str.strip())
+    df[DATE_COL] = df[DATE_COL].mask(df[DATE_COL] == "", now or datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    lost_zero = df[PHONE_COL].str.fullmatch(_LOST_ZERO_RE)
+    df[PHONE_COL] = df[PHONE_COL].mask(lost_zero, "0" + df[PHONE_COL])
+    for col in NUMERIC_COLUMNS:
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+    _fill_ranks(df, catalogue)
+    return df
+
+
+class ImportResult:
+    __slots__ = ("imported", "rejected", "unmapped", "total")
+
+    def __init__(self):
+        self.imported = 0
+        self.total = 0
+        self.rejected: list[pd.DataFrame] = []
+        self.unmapped: list[str] = []
+
+    def rejected_rows(self) -> pd.DataFrame:
+        """השורות שלא יובאו: מספר השורה בקובץ (1 = אחרי הכותרת), ת״ז, השגיאות."""
+        if not self.rejected:
+            return pd.DataFrame(columns=["שורה", ID_COL, "מספר שגיאות", validation.ERRORS_COL])
+        return pd.concat(self.rejected, ignore_index=True).sort_values("שורה", ignore_index=True)
+
+
+class ImportTimeout(TimeoutError):
+    """
+    הכותב לא אישר מקטע בזמן. result — מה שיובא ואושר לפני המקטע הזה;
+    pending — שורות המקטע שנשארו בתור (הן עוד עשויות להישמר).
+    """
+
+    def __init__(self, result: ImportResult, pending: int):
+        super().__init__(f"הכותב לא אישר את השמירה בזמן: נשמרו {result.imported} שורות, {pending} ממתינות בתור")
+        self.result = result
+        self.pending = pending
+
+
+@metrics.timed("import.file")
+def import_file(source, name: str, store=None, chunk_rows: int = CHUNK_ROWS,
+                progress: Callable[[int], None] | None = None) -> ImportResult:
+    """
+    מייבא את הקובץ במקטעים. progress(שורות שעובדו עד כה) נקרא אחרי כל מקטע.
+    שורות פסולות וכפילויות שנדחו (מדיניות reject) מופיעות ב-result.rejected_rows().
+    """
+    catalogue = sites.load()
+    schema = validation.form_schema(catalogue.rank_count, tuple(catalogue.sites))
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    result = ImportResult()
+    mapping = None
+    for chunk in read_chunks(source, name, chunk_rows):
+        if mapping is None:
+            mapping, result.unmapped = map_columns(list(chunk.columns), catalogue)
+        with metrics.timed("import.chunk", rows=len(chunk)):
+            df = prepare_chunk(chunk, mapping, catalogue, now)
+            report = validation.validate_frame(df, schema)
+            report["שורה"] += result.total
+            bad = np.zeros(len(df), dtype=bool)
+            bad[report["שורה"].to_numpy() - result.total - 1] = True
+
+            rows = df[~bad].astype(object).where(df[~bad].notna(), None).to_dict("records")
+            try:
+                outcome = writer.submit_many(rows, store)
+            except TimeoutError as e:
+                raise ImportTimeout(result, len(rows)) from e
+            failed = [(n, e) for n, e in zip(np.flatnonzero(~bad), outcome) if e is not None]
+            if failed:
+                report = pd.concat([report, pd.DataFrame({
+                    "שורה": [result.total + n + 1 for n, _ in failed],
+                    ID_COL: [df[ID_COL].iat[n] for n, _ in failed],
+                    "מספר שגיאות": 1,
+                    validation.ERRORS_COL: [str(e) for _, e in failed],
+                })], ignore_index=True)
+            result.imported += len(rows) - len(failed)
+            result.rejected.append(report)
+            result.total += len(df)
+        if progress:
+            progress(result.total)
+    return result
+
+
+def _main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m shibutz.importer", description="ייבוא שליחות מקובץ CSV / XLSX")
+    ap.add_argument("file", type=Path)
+    ap.add_argument("--rejected-out", type=Path, help="לשמור את השורות שנדחו ל-CSV")
+    args = ap.parse_args(argv)
+
+    storage.ensure_dirs()
+    try:
+        result = import_file(args.file, args.file.name)
+    except ImportTimeout as e:
+        print(f"{e}. בדקו את הקובץ הראשי לפני ייבוא חוזר.")
+        return 1
+    rejected = result.rejected_rows()
+    print(f"יובאו {result.imported} מתוך {result.total} שורות; נדחו {len(rejected)}")
+    if result.unmapped:
+        print(f"עמודות שלא זוהו (לא יובאו): {', '.join(result.unmapped)}")
+    if args.rejected_out is not None and not rejected.empty:
+        rejected.to_csv(args.rejected_out, index=False, encoding="utf-8-sig")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(_main())
@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""
+בדיקת שלמות של אחסון ה-CSV: המאסטר מול היומן, ובנייה מחדש של המאסטר מהיומן.
+
+המאסטר אמור להכיל בדיוק את שורות היומן עד היסט הדחיסה, באותו סדר
+(במדיניות replace — רק השורה האחרונה לכל ת״ז). שני הקבצים נקראים במקטעים
+(storage.read_csv_chunks), ובזיכרון נשמרים רק שני גיבובים של 8 בתים לכל שורה:
+של השורה כולה (על העמודות המשותפות) ושל הת״ז המנורמלת.
+
+תיקון (repair): שורות שקיימות רק במאסטר ות״ז שלהן לא מופיעה ביומן (למשל קריסה בין
+כתיבת המאסטר לכתיבת היומן בגרסאות קודמות) נוספות קודם ליומן, כדי שלא יאבדו; אחר כך
+המאסטר נבנה מחדש מהיומן, במקטעים, ונלקחת תמונת גיבוי מלאה. הסטטיסטיקה המצטברת
+(shibutz/stats.py) נגזרת מהמאסטר, ולכן נבנית גם היא מחדש מהמאסטר החדש.
+
+    python -m shibutz.integrity check
+    python -m shibutz.integrity repair
+"""
+import argparse
+import os
+import sys
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+from shibutz import backups, dtypes, id_index, metrics, stats, storage
+
+CHUNK_ROWS = 20_000
+SAMPLE_ROWS = 20
+
+
+class Report:
+    __slots__ = ("log_rows", "pending_rows", "expected_rows", "master_rows", "missing", "extra",
+                 "orphans", "same_order", "bad_lines", "dedupe")
+
+    def __init__(self, dedupe: bool):
+        self.dedupe = dedupe
+        self.log_rows = self.pending_rows = self.expected_rows = self.master_rows = 0
+        self.missing: list[int] = []     # מספרי שורות ביומן (מ-1) שאין להן שורה זהה במאסטר
+        self.extra: list[int] = []       # מספרי שורות במאסטר (מ-1) שאין להן שורה זהה ביומן
+        self.orphans = 0                 # מתוכן: ת״ז שלא מופיעה ביומן בכלל
+        self.same_order = True
+        self.bad_lines: dict[str, list[int]] = {}
+
+    @property
+    def ok(self) -> bool:
+        return not self.missing and not self.extra and not self.bad_lines
+
+    def lines(self) -> list[str]:
+        out = [
+            f"יומן: {self.log_rows:,} שורות ממוזגות" + (f" (+{self.pending_rows:,} ממתינות לדחיסה)" if self.pending_rows else ""),
+            f"מאסטר: {self.master_rows:,} שורות (צפוי {self.expected_rows:,}"
+            + (", אחרונה לכל ת״ז" if self.dedupe else "") + ")",
+        ]
+        if self.missing:
+            out.append(f"⚠ {len(self.missing):,} שורות יומן חסרות במאסטר (למשל שורות {_sample(self.missing)})")
+        if self.extra:
+            out.append(f"⚠ {len(self.extra):,} שורות מאסטר בלי שורה זהה ביומן (למשל שורות {_sample(self.extra)}); "
+                       f"{self.orphans:,} מהן עם ת״ז שלא מופיעה ביומן")
+        for name, bad in self.bad_lines.items():
+            out.append(f"⚠ {len(bad):,} שורות פגומות ב-{name} (למשל שורות {_sample(bad)})")
+        if self.ok:
+            out.append("✅ המאסטר תואם ליומן" + ("" if self.same_order else " (בסדר שורות שונה)"))
+        return out
+
+
+def _sample(rows: list[int]) -> str:
+    return ", ".join(map(str, rows[:SAMPLE_ROWS])) + ("…" if len(rows) > SAMPLE_ROWS else "")
+
+
+def _id_hash(ids: pd.Series) -> np.ndarray:
+    """גיבוב של הת״ז המנורמלת (כמו id_index.key) — 0 לשורה בלי ת״ז."""
+    keys = ids.str.strip().str.replace(r"\.0$", "", regex=True)
+    digits = keys.str.isdigit()
+    keys[digits] = keys[digits].str.lstrip("0").replace("", "0")
+    return np.where(keys != "", pd.util.hash_array(keys.to_numpy(dtype=object)), 0).astype(np.uint64)
+
+
+def _hash_file(path, columns: list[str], end: int | None = None) -> tuple[np.ndarray, np.ndarray, list[int]]:
+    """(גיבוב שורה, גיבוב ת״ז, שורות פגומות) לכל רשומה בקובץ, במקטעים."""
+    rows, ids, bad = [], [], []
+    for chunk in storage.read_csv_chunks(path, CHUNK_ROWS, end=end):
+        rows.append(pd.util.hash_pandas_object(chunk.reindex(columns=columns, fill_value=""), index=False).to_numpy())
+        ids.append(_id_hash(chunk[id_index.ID_COL]) if id_index.ID_COL in chunk.columns
+                   else np.zeros(len(chunk), dtype=np.uint64))
+        bad.extend(chunk.attrs["bad_lines"])
+    if not rows:
+        return np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.uint64), bad
+    return np.concatenate(rows), np.concatenate(ids), bad
+
+
+def _pending_rows(offset: int, header: list[str]) -> int:
+    """כמה שורות שלמות ביומן אחרי היסט הדחיסה (הזנב קטן — עד סף הדחיסה)."""
+    if not storage.pending_log_bytes():
+        return 0
+    with storage.CSV_LOG_FILE.open("rb") as f:
+        f.seek(offset)
+        tail = f.read()
+    tail = tail[: tail.rfind(b"\n") + 1]
+    if not tail:
+        return 0
+    return len(pd.read_csv(BytesIO(tail), header=None, names=header, dtype=str, keep_default_na=False,
+                           encoding="utf-8", escapechar=storage.CSV_WRITE_KW["escapechar"], on_bad_lines="skip"))
+
+
+def _latest_mask(ids: np.ndarray) -> np.ndarray:
+    """True לשורה האחרונה של כל ת״ז (ולכל שורה בלי ת״ז)."""
+    keep = ~pd.Series(ids).duplicated(keep="last").to_numpy()
+    return keep | (ids == 0)
+
+
+def _unmatched(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """אינדקסים ב-a של שורות שאין להן שורה זהה ב-b (כהפרש מולטי-סטים — גם שורות זהות נספרות)."""
+    values, inverse = np.unique(np.concatenate([a, b]), return_inverse=True)
+    count_a = np.bincount(inverse[: len(a)], minlength=len(values))
+    count_b = np.bincount(inverse[len(a):], minlength=len(values))
+    surplus = np.maximum(count_a - count_b, 0)
+    # מכל ערך עודף מסמנים את המופעים האחרונים שלו ב-a
+    inv_a = inverse[: len(a)]
+    seen_from_end = pd.Series(inv_a[::-1]).groupby(inv_a[::-1]).cumcount().to_numpy()[::-1]
+    return np.flatnonzero(seen_from_end < surplus[inv_a])
+
+
+def _compare(dedupe: bool) -> tuple[Report, np.ndarray]:
+    """הבדיקה עצמה (תחת DATA_LOCK). מחזיר גם את מיקומי שורות המאסטר היתומות, לתיקון."""
+    report = Report(dedupe)
+    log_header = storage.read_header(storage.CSV_LOG_FILE) or []
+    master_header = storage.read_header(storage.CSV_FILE) or []
+    columns = [c for c in log_header if c in master_header]
+    offset = storage.read_compaction_offset() if storage.CSV_LOG_FILE.exists() else 0
+
+    log_rows, log_ids, bad_log = _hash_file(storage.CSV_LOG_FILE, columns, end=offset)
+    master_rows, master_ids, bad_master = _hash_file(storage.CSV_FILE, columns)
+    report.log_rows, report.master_rows = len(log_rows), len(master_rows)
+    report.pending_rows = _pending_rows(offset, log_header)
+    if bad_log:
+        report.bad_lines[storage.CSV_LOG_FILE.name] = bad_log
+    if bad_master:
+        report.bad_lines[storage.CSV_FILE.name] = bad_master
+
+    positions = np.flatnonzero(_latest_mask(log_ids)) if dedupe else np.arange(len(log_rows))
+    expected = log_rows[positions]
+    report.expected_rows = len(expected)
+    report.same_order = bool(np.array_equal(expected, master_rows))
+    if report.same_order:
+        return report, np.zeros(0, dtype=np.int64)
+
+    missing = _unmatched(expected, master_rows)
+    extra = _unmatched(master_rows, expected)
+    orphans = extra[~np.isin(master_ids[extra], log_ids) | (master_ids[extra] == 0)]
+    report.missing = (positions[missing] + 1).tolist()
+    report.extra = (extra + 1).tolist()
+    report.orphans = len(orphans)
+    return report, orphans
+
+
+@metrics.timed("integrity.check")
+def check(dedupe: bool = False) -> Report:
+    """משווה מאסטר ויומן. רץ תחת DATA_LOCK — שליחות ממתינות לסיום הבדיקה."""
+    with storage.DATA_LOCK:
+        return _compare(dedupe)[0]
+
+
+def _complete_end(path) -> int:
+    """סוף השורה השלמה האחרונה בקובץ (בלי זנב של כתיבה שנקטעה)."""
+    size = path.stat().st_size
+    with path.open("rb") as f:
+        f.seek(max(0, size - 64 * 1024))
+        tail = f.read()
+    return size - len(tail) + tail.rfind(b"\n") + 1
+
+
+@metrics.timed("integrity.rebuild")
+def rebuild_master(dedupe: bool = False) -> int:
+    """
+    בונה את המאסטר מחדש מכל היומן, במקטעים (כתיבה לקובץ זמני והחלפה אטומית),
+    ומעדכן את היסט הדחיסה לסוף היומן. מחזיר את מספר השורות במאסטר החדש.
+    """
+    with storage.DATA_LOCK:
+        if not storage.CSV_LOG_FILE.exists():
+            return 0
+        storage.ensure_dirs()
+        end = _complete_end(storage.CSV_LOG_FILE)
+        keep = None
+        if dedupe:
+            ids = [_id_hash(c[id_index.ID_COL]) for c in storage.read_csv_chunks(storage.CSV_LOG_FILE, CHUNK_ROWS, end=end)
+                   if id_index.ID_COL in c.columns]
+            keep = _latest_mask(np.concatenate(ids)) if ids else None
+        tmp = storage.CSV_FILE.with_name(f"{storage.CSV_FILE.stem}.rebuild.tmp.csv")
+        written, start, header = 0, 0, True
+        with open(tmp, "w", encoding="utf-8-sig", newline="") as out:
+            for chunk in storage.read_csv_chunks(storage.CSV_LOG_FILE, CHUNK_ROWS, end=end):
+                n = len(chunk)
+                if keep is not None:
+                    chunk = chunk[keep[start:start + n]]
+                chunk.to_csv(out, header=header, **storage.CSV_WRITE_KW)
+                written, start, header = written + len(chunk), start + n, False
+            if header:
+                pd.DataFrame(columns=storage.read_header(storage.CSV_LOG_FILE)).to_csv(out, **storage.CSV_WRITE_KW)
+            out.flush()
+            os.fsync(out.fileno())
+        tmp.replace(storage.CSV_FILE)
+        storage.write_compaction_offset(end)
+        _rebuild_stats()
+        backups.snapshot_full(dedupe)
+        return written
+
+
+def _rebuild_stats() -> None:
+    """הסטטיסטיקה מהמאסטר החדש — רק העמודות שהיא סופרת, במקטעים; שורה אחת לכל ת״ז כמו בתצוגת המאסטר."""
+    header = storage.read_header(storage.CSV_FILE) or []
+    columns = [c for c in header if c == id_index.ID_COL or stats.counts_column(c)]
+    stats.rebuild(lambda: id_index.latest_only(dtypes.read(storage.CSV_FILE, columns=columns)))
+
+
+@metrics.timed("integrity.repair")
+def repair(dedupe: bool = False) -> tuple[Report, int, int]:
+    """
+    תיקון: שורות מאסטר יתומות (ת״ז שלא ביומן) נוספות ליומן, ואז המאסטר נבנה מחדש.
+    מחזיר (הדוח שלפני התיקון, כמה שורות נוספו ליומן, כמה שורות במאסטר החדש).
+    """
+    with storage.DATA_LOCK:
+        report, orphans = _compare(dedupe)
+        if report.ok and report.same_order:
+            return report, 0, report.master_rows
+        storage.ensure_dirs()
+        backups.snapshot_full(dedupe)    # המאסטר כמו שהוא, לפני התיקון
+        if len(orphans):
+            found, start = [], 0
+            for chunk in storage.read_csv_chunks(storage.CSV_FILE, CHUNK_ROWS):
+                idx = orphans[(orphans >= start) & (orphans < start + len(chunk))] - start
+                if len(idx):
+                    found.append(chunk.iloc[idx])
+                start += len(chunk)
+            storage.append_to_log(pd.concat(found, ignore_index=True), dedupe)
+        return report, len(orphans), rebuild_master(dedupe)
+
+
+def _main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m shibutz.integrity", description="בדיקת שלמות: מאסטר מול יומן")
+    ap.add_argument("cmd", choices=["check", "repair", "rebuild"],
+                    help="check — בדיקה בלבד; repair — תיקון אם צריך; rebuild — בנייה מחדש מהיומן בכל מקרה")
+    ap.add_argument("--policy", help="מדיניות כפילויות (ברירת מחדל: DUPLICATE_POLICY מהסביבה)")
+    args = ap.parse_args(argv)
+
+    dedupe = id_index.check_policy(args.policy or os.environ.get("DUPLICATE_POLICY")) == "replace"
+    if args.cmd == "check":
+        report = check(dedupe)
+        print("\n".join(report.lines()))
+        return 0 if report.ok else 1
+    if args.cmd == "rebuild":
+        print(f"המאסטר נבנה מחדש: {rebuild_master(dedupe):,} שורות")
+        return 0
+    report, appended, rows = repair(dedupe)
+    print("\n".join(report.lines()))
+    if report.ok and report.same_order:
+        print("אין מה לתקן.")
+    else:
+        print(f"נוספו ליומן {appended:,} שורות יתומות; המאסטר נבנה מחדש: {rows:,} שורות")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(_main())
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+מדידת זמנים לכל שלב במסלול השליחה ובטעינות של מסך המנהל.
+
+    with metrics.timed("storage.append_to_log"):
+        ...
+
+כל דגימה (זמן, שלב, משך) נכנסת למאגר טבעתי בזיכרון התהליך (לפאנל הביצועים במסך המנהל)
+ולקובץ JSON Lines מתגלגל ב-data/metrics (לניתוח אחר כך). כיבוי: SHIBUTZ_METRICS=0.
+הכתיבה לקובץ לא נעשית ב-thread הנמדד (מסלול השליחה, לפעמים בתוך DATA_LOCK): הדגימה נכנסת
+לתור, ו-thread רקע אחד (QueueListener) מסדר אותה כ-JSON וכותב לקובץ.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from logging.handlers import QueueListener, RotatingFileHandler
+from pathlib import Path
+
+# כמו storage.DATA_DIR — המודול לא מייבא את storage כדי ש-storage עצמו יוכל להשתמש בו
+METRICS_DIR = Path("data") / "metrics"
+METRICS_FILE = METRICS_DIR / "metrics.jsonl"
+RING_SIZE = 5000
+FILE_MAX_BYTES = 1024 * 1024
+FILE_BACKUPS = 5
+
+ENABLED = os.environ.get("SHIBUTZ_METRICS", "1") != "0"
+
+_ring: deque = deque(maxlen=RING_SIZE)
+_samples: queue.SimpleQueue | None = None
+_listener: QueueListener | None = None
+_lock = threading.Lock()
+
+
+class _JsonLine(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps(record.msg, ensure_ascii=False)
+
+
+def _file_queue() -> queue.SimpleQueue:
+    """התור של הכתיבה לקובץ (ה-thread שמרוקן אותו מופעל בפעם הראשונה)."""
+    global _samples, _listener
+    with _lock:
+        if _samples is None:
+            METRICS_DIR.mkdir(parents=True, exist_ok=True)
+            handler = RotatingFileHandler(METRICS_FILE, maxBytes=FILE_MAX_BYTES,
+                                          backupCount=FILE_BACKUPS, encoding="utf-8")
+            handler.setFormatter(_JsonLine())
+            _samples = queue.SimpleQueue()
+            _listener = QueueListener(_samples, handler)
+            _listener.start()
+            atexit.register(flush)
+        return _samples
+
+
+def flush() -> None:
+    """כותב לקובץ את כל הדגימות שבתור (ביציאה מהתהליך, או לפני קריאת הקובץ)."""
+    global _samples, _listener
+    with _lock:
+        if _listener is None:
+            return
+        _listener.stop()        # מרוקן את התור ועוצר את ה-thread
+        _listener.handlers[0].close()
+        _samples = _listener = None
+
+
+def record(stage: str, seconds: float, **extra) -> None:
+    if not ENABLED:
+        return
+    now = time.time()
+    _ring.append((now, stage, seconds))
+    try:
+        # רק הכנסה לתור — הסידור כ-JSON והכתיבה לדיסק ב-thread של ה-QueueListener
+        _file_queue().put(logging.makeLogRecord(
+            {"msg": {"ts": round(now, 3), "stage": stage, "ms": round(seconds * 1000, 3), **extra}}))
+    except OSError:
+        pass   # מדדים לא מפילים את המסלול שהם מודדים
+
+
+@contextmanager
+def timed(stage: str, **extra):
+    """מודד את משך הבלוק ורושם אותו תחת stage (גם כשהבלוק נכשל)."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - t0, **extra)
+
+
+# pandas/numpy נטענים רק בתצוגה — metrics מיובא גם במסלול הטופס, שלא צריך אותם
+def summary(since: float | None = None) -> "pd.DataFrame":
+    """אחוזוני משך לכל שלב, מתוך המאגר בזיכרון (since — רק דגימות מאז זמן זה)."""
+    import numpy as np
+    import pandas as pd
+
+    samples = [s for s in list(_ring) if since is None or s[0] >= since]
+    cols = ["שלב", "דגימות", "p50 (ms)", "p90 (ms)", "p99 (ms)", "מקסימום (ms)"]
+    if not samples:
+        return pd.DataFrame(columns=cols)
+    df = pd.DataFrame(samples, columns=["ts", "stage", "sec"])
+    rows = []
+    for stage, sec in df.groupby("stage")["sec"]:
+        ms = sec.to_numpy() * 1000
+        p50, p90, p99 = np.percentile(ms, [50, 90, 99])
+        rows.append([stage, len(ms), round(p50, 2), round(p90, 2), round(p99, 2), round(ms.max(), 2)])
+    return pd.DataFrame(rows, columns=cols).sort_values("p99 (ms)", ascending=False, ignore_index=True)
+
+
+def file_sizes(data_dir: Path) -> "pd.DataFrame":
+    """גודל הקבצים בתיקיית הנתונים (בלי תיקיות המשנה)."""
+    import pandas as pd
+
+    files = sorted(p for p in Path(data_dir).glob("*") if p.is_file())
+    return pd.DataFrame({"קובץ": [p.name for p in files],
+                         "גודל (KB)": [round(p.stat().st_size / 1024, 1) for p in files]})
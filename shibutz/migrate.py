@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+ייבוא קבצי ה-CSV הקיימים (data/*.csv) ל-store אחר — כרגע SQLite.
+
+המאסטר מכיל את כל השורות (כולל אלו שעברו דחיסה מהיומן), ולכן ברירת המחדל
+היא לדחוס ואז לייבא אותו בלבד; היומן מיובא רק אם אין מאסטר.
+
+    python -m shibutz.migrate --to sqlite
+    python -m shibutz.migrate --to sqlite --source data/ישן.csv --replace
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+from shibutz import id_index, storage
+from shibutz.backends import BACKENDS, SqliteStore
+
+CHUNK_ROWS = 5000
+
+
+class BadLinesError(ValueError):
+    """בקובץ המקור יש שורות פגומות — ההעברה לא מתחילה (lines — מספרי השורות)."""
+
+    def __init__(self, source: Path, lines: list[int]):
+        self.source = source
+        self.lines = lines
+        shown = ", ".join(map(str, lines[:20])) + (" ..." if len(lines) > 20 else "")
+        super().__init__(f"ב-{source} יש {len(lines)} שורות פגומות (שורות {shown}); "
+                         f"הן הועברו ל-{storage.quarantine_path(source)}. יש לתקן את הקובץ — לא יובא דבר.")
+
+
+def _records(df: pd.DataFrame) -> list[dict]:
+    # ריק (כך read_csv_chunks מחזיר ערך חסר) נשמר כ-null, כמו ב-JSON של שליחה
+    return [{k: (v if v != "" else None) for k, v in r.items()} for r in df.to_dict("records")]
+
+
+def _bad_lines(source: Path) -> list[int]:
+    return [n for chunk in storage.read_csv_chunks(source, CHUNK_ROWS) for n in chunk.attrs["bad_lines"]]
+
+
+def migrate_csv_to_sqlite(source: Path, store: SqliteStore, replace: bool = False) -> int:
+    """
+    מעתיק את source לטבלת ה-SQLite בחלקים. מחזיר את מספר השורות שיובאו.
+    הקריאה דרך storage.read_csv_chunks — קידוד ומפריד לפי תוכנית הפרסור, וכל ערך כמו שנכתב
+    (ת״ז וטלפון בלי לאבד אפסים מובילים). ההעברה חד-כיוונית, ולכן שורות פגומות לא מדולגות:
+    לפני שנוגעים ביעד בודקים את כל הקובץ, ואם יש כאלה — הן מוסגרות ונזרקת BadLinesError.
+    """
+    existing = store.count()
+    if existing and not replace:
+        raise SystemExit(f"ב-{store.path} כבר יש {existing} רשומות. השתמשו ב---replace כדי לייבא מחדש.")
+    bad = _bad_lines(source)
+    if bad:
+        storage.parse_csv(source)       # כותב את השורות הפגומות לקובץ ההסגר
+        raise BadLinesError(source, bad)
+    if existing:
+        store.clear()
+
+    total = 0
+    for chunk in storage.read_csv_chunks(source, CHUNK_ROWS):
+        store.append(_records(chunk))
+        total += len(chunk)
+    return total
+
+
+def _main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m shibutz.migrate", description="ייבוא קבצי CSV קיימים ל-store אחר")
+    ap.add_argument("--to", choices=[b for b in BACKENDS if b != "csv"], default="sqlite")
+    ap.add_argument("--source", type=Path, help="ברירת מחדל: המאסטר (אחרי דחיסה), או היומן אם אין מאסטר")
+    ap.add_argument("--replace", action="store_true", help="מחיקת התוכן הקיים ביעד לפני הייבוא")
+    ap.add_argument("--policy", help="מדיניות כפילויות לדחיסה (ברירת מחדל: DUPLICATE_POLICY מהסביבה)")
+    args = ap.parse_args(argv)
+
+    storage.ensure_dirs()
+    source = args.source
+    if source is None:
+        storage.compact_master(id_index.check_policy(args.policy or os.environ.get("DUPLICATE_POLICY")) == "replace")
+        source = storage.CSV_FILE if storage.CSV_FILE.exists() else storage.CSV_LOG_FILE
+    if not source.exists():
+        print(f"לא נמצא קובץ מקור: {source}")
+        return 1
+    try:
+        n = migrate_csv_to_sqlite(source, SqliteStore(), replace=args.replace)
+    except BadLinesError as e:
+        print(e)
+        return 1
+    print(f"יובאו {n} רשומות מ-{source} אל {args.to}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(_main())
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+שיבוץ אוטומטי של סטודנטים למוסדות לפי הדירוגים שנאספו בשאלון.
+
+האלגוריתם: Deferred Acceptance (Gale–Shapley, הצעות מצד הסטודנטים) עם קיבולת לכל מוסד —
+התוצאה יציבה: אין סטודנט ומוסד שמעדיפים זה את זה על פני מה שקיבלו.
+סדר העדיפות של המוסדות בין הסטודנטים: ממוצע גבוה קודם (ובשוויון — מי ששלח קודם),
+או לפי סדר השליחה בלבד כשמכבים את שבירת השוויון לפי ממוצע.
+אילוצים: סטודנט עם "רגישות למרחב רפואי" לא ישובץ למוסד שמסומן כסביבה רפואית,
+וסטודנט שמגיע בתחבורה ציבורית לא ישובץ למוסד שמסומן כדורש רכב.
+
+כל סבב מחושב במטריצות NumPy (מיון אחד לכל הסבב). בכל סבב (חוץ מהאחרון) לפחות סטודנט
+אחד נדחה ומתקדם במדרגה, כך שמספר הסבבים חסום במספר ההעדפות הכולל (סטודנטים × מדרגות) —
+זה המקרה הגרוע; בדירוגים אמיתיים יש בדרך כלל עשרות סבבים, ו-10 אלף סטודנטים משובצים בתוך שניות.
+
+    python -m shibutz.placement --capacity capacity.csv --out placement.csv
+"""
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from shibutz.backends import get_store
+
+RANK_PREFIX = "דירוג_"
+RANK_SLOT_PREFIX = "דירוג_מדרגה_"
+
+SITE_COL = "מוסד"
+CAPACITY_COL = "קיבולת"
+MEDICAL_COL = "סביבה_רפואית"
+CAR_COL = "נדרש_רכב"
+
+AVG_COL = "ממוצע"
+ADJ_COL = "התאמות"
+MOBILITY_COL = "ניידות"
+
+MEDICAL_SENSITIVE = "רגישות למרחב רפואי"
+PUBLIC_TRANSPORT = "תחבורה ציבורית"
+
+ASSIGNED_COL = "מוסד_משובץ"
+ASSIGNED_RANK_COL = "דירוג_המוסד_המשובץ"
+
+DEFAULT_CAPACITY = 10
+OUTPUT_COLS = ["תעודת_זהות", "שם_פרטי", "שם_משפחה", AVG_COL]
+
+
+def sites_in(df: pd.DataFrame) -> list[str]:
+    """המוסדות שמופיעים בעמודות דירוג_<מוסד> של המאסטר."""
+    return [c[len(RANK_PREFIX):] for c in df.columns
+            if c.startswith(RANK_PREFIX) and not c.startswith(RANK_SLOT_PREFIX)]
+
+
+def default_capacity_table(sites: list[str], capacity: int = DEFAULT_CAPACITY,
+                           catalogue: pd.DataFrame | None = None) -> pd.DataFrame:
+    """
+    טבלת קיבולות התחלתית. catalogue — טבלת קטלוג המוסדות (shibutz/sites.py):
+    למוסדות שמופיעים בה הסימונים והקיבולת נלקחים ממנה, ולשאר — לפי שם המוסד.
+    """
+    table = pd.DataFrame({
+        SITE_COL: sites,
+        CAPACITY_COL: capacity,
+        MEDICAL_COL: [("בית חולים" in s or "מרפאת" in s) for s in sites],
+        CAR_COL: False,
+    })
+    if catalogue is not None:
+        info = catalogue.set_index("name").reindex(sites)
+        listed = info.index.isin(catalogue["name"])
+        table.loc[listed, MEDICAL_COL] = info.loc[listed, "medical"].astype(bool).to_numpy()
+        table.loc[listed, CAR_COL] = info.loc[listed, "needs_car"].astype(bool).to_numpy()
+        table[CAPACITY_COL] = pd.to_numeric(info["capacity"], errors="coerce").fillna(capacity).astype(int).to_numpy()
+    return table
+
+
+def _bool_col(table: pd.DataFrame, col: str) -> np.ndarray:
+    if col not in table.columns:
+        return np.zeros(len(table), dtype=bool)
+    return table[col].astype(str).str.strip().str.lower().isin(["1", "true", "כן", "v", "✓"]).to_numpy()
+
+
+def preference_matrix(df: pd.DataFrame, sites: list[str], table: pd.DataFrame) -> np.ndarray:
+    """
+    מטריצת דירוג (סטודנטים × מוסדות): המדרגה שהסטודנט נתן למוסד,
+    ו-inf למוסד שלא דורג או שאסור לו לפי האילוצים.
+    """
+    ranks = np.full((len(df), len(sites)), np.inf)
+    for j, site in enumerate(sites):
+        col = RANK_PREFIX + site
+        if col in df.columns:
+            ranks[:, j] = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=float)
+    ranks[np.isnan(ranks)] = np.inf
+
+    by_site = table.set_index(SITE_COL).reindex(sites)
+    medical = _bool_col(by_site.reset_index(), MEDICAL_COL)
+    needs_car = _bool_col(by_site.reset_index(), CAR_COL)
+    if ADJ_COL in df.columns and medical.any():
+        sensitive = df[ADJ_COL].astype(str).str.contains(MEDICAL_SENSITIVE, regex=False).to_numpy()
+        ranks[np.ix_(sensitive, medical)] = np.inf
+    if MOBILITY_COL in df.columns and needs_car.any():
+        no_car = df[MOBILITY_COL].astype(str).str.contains(PUBLIC_TRANSPORT, regex=False).to_numpy()
+        ranks[np.ix_(no_car, needs_car)] = np.inf
+    return ranks
+
+
+def student_priority(df: pd.DataFrame, by_average: bool = True) -> np.ndarray:
+    """מקום בתור של כל סטודנט (0 = העדיפות הגבוהה ביותר): ממוצע יורד, ואז סדר השליחה."""
+    if by_average and AVG_COL in df.columns:
+        avg = pd.to_numeric(df[AVG_COL], errors="coerce").fillna(-1).to_numpy()
+    else:
+        avg = np.zeros(len(df))
+    order = np.lexsort((np.arange(len(df)), -avg))
+    prio = np.empty(len(df), dtype=np.int64)
+    prio[order] = np.arange(len(df))
+    return prio
+
+
+def deferred_acceptance(ranks: np.ndarray, capacity: np.ndarray, priority: np.ndarray) -> np.ndarray:
+    """
+    מחזיר לכל סטודנט את אינדקס המוסד שלו, או -1.
+    ranks — (n × m) מדרגות (inf = לא קביל); capacity — (m,); priority — (n,) קטן = עדיף.
+    לכל היותר (מספר ההעדפות הקבילות + 1) סבבים: כל סבב שאינו האחרון מקדם מצביע אחד לפחות.
+    """
+    n, m = ranks.shape
+    prefs = np.argsort(ranks, axis=1, kind="stable")                 # מוסדות לפי סדר העדפה
+    n_valid = np.isfinite(ranks).sum(axis=1)                          # כמה מוסדות קבילים לכל סטודנט
+    pointer = np.zeros(n, dtype=np.int64)
+    assigned = np.full(n, -1, dtype=np.int64)
+    cap = np.asarray(capacity, dtype=np.int64)
+
+    while True:
+        proposing = np.flatnonzero((assigned < 0) & (pointer < n_valid))
+        if proposing.size == 0:
+            break
+        target = prefs[proposing, pointer[proposing]]
+        held = np.flatnonzero(assigned >= 0)
+        cand = np.concatenate([held, proposing])
+        site = np.concatenate([assigned[held], target])
+        # מיון לפי (מוסד, עדיפות) ושמירת cap[site] הראשונים בכל מוסד
+        order = np.lexsort((priority[cand], site))
+        cand, site = cand[order], site[order]
+        starts = np.searchsorted(site, np.arange(m))
+        pos = np.arange(cand.size) - starts[site]
+        keep = pos < cap[site]
+        assigned[cand[keep]] = site[keep]
+        rejected = cand[~keep]
+        assigned[rejected] = -1
+        pointer[rejected] += 1
+    return assigned
+
+
+def run_placement(df: pd.DataFrame, table: pd.DataFrame | None = None,
+                  by_average: bool = True) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    שיבוץ על המאסטר df לפי טבלת הקיבולות table (ברירת מחדל: DEFAULT_CAPACITY לכל מוסד).
+    מחזיר (שיבוץ לכל סטודנט, סיכום לכל מוסד).
+    """
+    sites = sites_in(df)
+    if table is None:
+        table = default_capacity_table(sites)
+    table = table[table[SITE_COL].isin(sites)]
+    sites = [s for s in sites if s in set(table[SITE_COL])]
+    capacity = table.set_index(SITE_COL).reindex(sites)[CAPACITY_COL].fillna(0).astype(int).to_numpy()
+
+    ranks = preference_matrix(df, sites, table)
+    assigned = deferred_acceptance(ranks, capacity, student_priority(df, by_average))
+
+    out = df[[c for c in OUTPUT_COLS if c in df.columns]].copy()
+    site_arr = np.array(sites + [""], dtype=object)
+    out[ASSIGNED_COL] = site_arr[assigned]                            # -1 -> ""
+    got_rank = np.where(assigned >= 0, ranks[np.arange(len(df)), np.maximum(assigned, 0)], np.nan)
+    out[ASSIGNED_RANK_COL] = pd.Series(got_rank, index=out.index).astype("Int64")
+
+    counts = pd.Series(assigned[assigned >= 0]).map(dict(enumerate(sites))).value_counts()
+    summary = pd.DataFrame({SITE_COL: sites, CAPACITY_COL: capacity})
+    summary["שובצו"] = summary[SITE_COL].map(counts).fillna(0).astype(int)
+    summary["מקומות_פנויים"] = summary[CAPACITY_COL] - summary["שובצו"]
+    return out, summary
+
+
+def _main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m shibutz.placement", description="שיבוץ אוטומטי לפי הדירוגים")
+    ap.add_argument("--capacity", type=Path, help=f"CSV עם העמודות {SITE_COL}, {CAPACITY_COL} "
+                                                  f"[, {MEDICAL_COL}, {CAR_COL}]")
+    ap.add_argument("--backend", help="csv / sqlite (ברירת מחדל: STORAGE_BACKEND)")
+    ap.add_argument("--no-average", action="store_true", help="בלי עדיפות לפי ממוצע — לפי סדר השליחה בלבד")
+    ap.add_argument("--out", type=Path, required=True)
+    args = ap.parse_args(argv)
+
+    df = get_store(args.backend).load_master()
+    if args.capacity:
+        table = pd.read_csv(args.capacity, encoding="utf-8-sig")
+    else:
+        from shibutz.sites import load as load_catalogue
+        table = default_capacity_table(sites_in(df), catalogue=load_catalogue().table)
+    result, summary = run_placement(df, table, by_average=not args.no_average)
+    result.to_csv(args.out, index=False, encoding="utf-8-sig")
+    print(summary.to_string(index=False))
+    print(f"שובצו {int((result[ASSIGNED_COL] != '').sum())} מתוך {len(result)} → {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(_main())
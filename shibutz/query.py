@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+שכבת שאילתות לטבלת המנהל: סינון, חיפוש, בחירת עמודות ודפדוף בצד השרת,
+כך שלדפדפן נשלח רק עמוד אחד ולא כל המאסטר (כ-50 עמודות לשורה).
+
+אפשרויות הסינון ומוני הסיכום מגיעים מהסטטיסטיקה המצטברת (shibutz/stats.py),
+ולא מסריקה של הטבלה.
+"""
+import threading
+
+import pandas as pd
+
+ID_COL = "תעודת_זהות"
+YEAR_COL = "שנת_לימודים"
+DOMAIN_COL = "תחום_מוביל"
+FIRST_SITE_COL = "דירוג_מדרגה_1_מוסד"
+SEARCH_COLS = ["שם_פרטי", "שם_משפחה", ID_COL, "טלפון", "אימייל", "כתובת"]
+
+FILTER_COLS = {"שנת לימודים": YEAR_COL, "תחום מוביל": DOMAIN_COL, "מוסד בעדיפות ראשונה": FIRST_SITE_COL}
+
+DEFAULT_COLUMNS = [
+    "תאריך_שליחה", "שם_פרטי", "שם_משפחה", ID_COL, "טלפון", "אימייל",
+    YEAR_COL, DOMAIN_COL, "ממוצע",
+    "דירוג_מדרגה_1_מוסד", "דירוג_מדרגה_2_מוסד", "דירוג_מדרגה_3_מוסד",
+]
+
+
+# =========================
+# חיפוש וסינון
+# =========================
+_search_memo: tuple[pd.DataFrame, int, pd.Series] | None = None
+_memo_lock = threading.Lock()
+
+
+def _search_blob(df: pd.DataFrame) -> pd.Series:
+    """מחרוזת חיפוש אחת לכל שורה (באותיות קטנות), מחושבת פעם אחת לכל פריים."""
+    global _search_memo
+    with _memo_lock:
+        # הפריים עצמו נשמר ומושווה ב-is (כמו CsvStore._latest_view): id() של פריים שכבר
+        # שוחרר עלול לחזור אצל פריים חדש באותו אורך
+        memo = _search_memo
+        if memo is not None and memo[0] is df and memo[1] == len(df):
+            return memo[2]
+        cols = [c for c in SEARCH_COLS if c in df.columns]
+        blob = df[cols].astype(str).agg(" ".join, axis=1).str.lower() if cols else pd.Series("", index=df.index)
+        _search_memo = (df, len(df), blob)   # הפריימים מתחלפים בכל עדכון — שומרים רק את האחרון
+        return blob
+
+
+def filter_frame(df: pd.DataFrame, search: str = "", filters: dict[str, list] | None = None) -> pd.DataFrame:
+    """
+    search — טקסט חופשי (שם/טלפון/דוא״ל/כתובת) או ספרות בלבד = תחילית של ת״ז.
+    filters — {עמודה: [ערכים מותרים]}; רשימה ריקה = ללא סינון.
+    """
+    mask = pd.Series(True, index=df.index)
+    for col, values in (filters or {}).items():
+        if values and col in df.columns:
+            mask &= df[col].isin(values)
+    search = search.strip()
+    if search:
+        if search.isdigit() and ID_COL in df.columns:
+            mask &= df[ID_COL].astype(str).str.startswith(search)
+        else:
+            mask &= _search_blob(df).str.contains(search.lower(), regex=False)
+    return df[mask] if not mask.all() else df
+
+
+def page(df: pd.DataFrame, page_no: int = 1, page_size: int = 50,
+         columns: list[str] | None = None) -> pd.DataFrame:
+    """עמוד אחד (ממוספר מ-1) עם העמודות המבוקשות בלבד."""
+    start = max(0, (page_no - 1) * page_size)
+    out = df.iloc[start:start + page_size]
+    if columns:
+        out = out[[c for c in columns if c in out.columns]]
+    return out
+
+
+def page_count(n_rows: int, page_size: int) -> int:
+    return max(1, -(-n_rows // page_size))
+
+
+def filter_options(pref: dict) -> dict[str, list[str]]:
+    """אפשרויות לכל מסנן, מתוך הסטטיסטיקה המצטברת (stats.load())."""
+    return {
+        YEAR_COL: sorted(pref["years"]),
+        DOMAIN_COL: sorted(pref["top_domains"]),
+        FIRST_SITE_COL: sorted(site for site, s in pref["sites"].items() if s["hist"].get("1")),
+    }
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+סנכרון רקע של היומן ל-Google Sheets.
+
+thread רקע אחד עוקב אחרי קובץ היומן (Append-Only) מההיסט השמור האחרון,
+ושולח את השורות החדשות בקריאות append_rows מקובצות (עד BATCH_ROWS בקריאה).
+כישלון (מכסת API, רשת) — ניסיון חוזר עם המתנה אקספוננציאלית; מסלול השליחה
+לא מחכה לסנכרון ולא מושפע ממנו.
+
+ההיסט נשמר אחרי כל קבוצה שנשלחה בהצלחה (at-least-once: קריסה בין השליחה לשמירה
+עלולה לשכפל קבוצה אחת בגיליון). כשהיומן נכתב מחדש (כותרת שהורחבה) — ממשיכים לפי מספר
+השורות שכבר נשלחו, ושורת הכותרת בגיליון מתעדכנת.
+
+הגישה לגיליון מאחורי ממשק SheetClient: GspreadClient לעבודה אמיתית,
+ו-MemorySheetClient (בזיכרון) לבדיקות ולהרצה בלי רשת.
+
+    python -m shibutz.sheets_sync --credentials service_account.json --key <spreadsheet-key>
+"""
+import argparse
+import csv
+import io
+import json
+import logging
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+
+from shibutz import storage
+
+STATE_FILE = storage.DATA_DIR / "שאלון_שיבוץ_sheets.json"
+
+BATCH_ROWS = 500            # שורות לכל קריאת append_rows
+POLL_SEC = 2.0              # כל כמה זמן לבדוק אם היומן גדל
+MAX_BACKOFF_SEC = 300.0
+
+log = logging.getLogger(__name__)
+
+
+# =========================
+# לקוחות גיליון
+# =========================
+class SheetClient:
+    """הממשק שהסנכרון צריך מגיליון."""
+
+    def header(self) -> list[str]:
+        raise NotImplementedError
+
+    def set_header(self, header: list[str]) -> None:
+        raise NotImplementedError
+
+    def append_rows(self, rows: list[list[str]]) -> None:
+        raise NotImplementedError
+
+
+class MemorySheetClient(SheetClient):
+    """גיליון בזיכרון. fail_next — כמה קריאות append_rows הבאות ייכשלו (לבדיקת ניסיונות חוזרים)."""
+
+    def __init__(self, fail_next: int = 0):
+        self.rows: list[list[str]] = []
+        self.calls = 0
+        self.fail_next = fail_next
+
+    def header(self) -> list[str]:
+        return list(self.rows[0]) if self.rows else []
+
+    def set_header(self, header: list[str]) -> None:
+        if self.rows:
+            self.rows[0] = list(header)
+        else:
+            self.rows.append(list(header))
+
+    def append_rows(self, rows: list[list[str]]) -> None:
+        self.calls += 1
+        if self.fail_next > 0:
+            self.fail_next -= 1
+            raise ConnectionError("simulated Sheets API failure")
+        self.rows.extend(list(r) for r in rows)
+
+
+class GspreadClient(SheetClient):
+    """גיליון אמיתי דרך gspread + חשבון שירות; החיבור נפתח רק בשימוש הראשון."""
+
+    def __init__(self, spreadsheet_key: str, worksheet: str = "Sheet1", credentials: dict | None = None,
+                 credentials_file: Path | None = None):
+        self.spreadsheet_key = spreadsheet_key
+        self.worksheet = worksheet
+        self.credentials = credentials
+        self.credentials_file = credentials_file
+        self._ws = None
+
+    def _sheet(self):
+        if self._ws is None:
+            import gspread  # נטען רק כשהסנכרון באמת פעיל
+
+            if self.credentials is not None:
+                gc = gspread.service_account_from_dict(self.credentials)
+            else:
+                gc = gspread.service_account(filename=str(self.credentials_file))
+            self._ws = gc.open_by_key(self.spreadsheet_key).worksheet(self.worksheet)
+        return self._ws
+
+    def header(self) -> list[str]:
+        return self._sheet().row_values(1)
+
+    def set_header(self, header: list[str]) -> None:
+        self._sheet().update([header], "A1", value_input_option="RAW")
+
+    def append_rows(self, rows: list[list[str]]) -> None:
+        self._sheet().append_rows(rows, value_input_option="RAW")
+
+
+# =========================
+# מצב הסנכרון
+# =========================
+def _read_state() -> dict:
+    try:
+        return json.loads(STATE_FILE.read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return {"offset": 0, "rows": 0, "chunk_sent": 0, "inode": None, "header": None}
+
+
+def _write_state(state: dict) -> None:
+    tmp = STATE_FILE.with_suffix(".tmp.json")
+    tmp.write_text(json.dumps(state, ensure_ascii=False), encoding="utf-8")
+    tmp.replace(STATE_FILE)
+
+
+def _records(data: bytes, plan: dict) -> list[list[str]]:
+    # הערכים כמו שהם ביומן (מחרוזות) — בלי הסקת טיפוסים, כדי לא לאבד אפסים מובילים בת״ז
+    text = data.decode(plan["encoding"], errors="replace").lstrip("\ufeff")
+    return [r for r in csv.reader(io.StringIO(text), delimiter=plan["sep"]) if r]
+
+
+# =========================
+# הסנכרון
+# =========================
+class SheetsSync:
+    def __init__(self, client: SheetClient, log_path: Path | None = None,
+                 batch_rows: int = BATCH_ROWS, poll: float = POLL_SEC, max_backoff: float = MAX_BACKOFF_SEC):
+        self.client = client
+        self.log_path = Path(log_path or storage.CSV_LOG_FILE)
+        self.batch_rows = batch_rows
+        self.poll = poll
+        self.max_backoff = max_backoff
+        self.last_sync: float | None = None
+        self.last_error: str | None = None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def pending_bytes(self) -> int:
+        if not self.log_path.exists():
+            return 0
+        return max(0, self.log_path.stat().st_size - _read_state()["offset"])
+
+    def sync_once(self) -> int:
+        """שולח את כל מה שנוסף ליומן מאז הפעם הקודמת. מחזיר כמה שורות נשלחו."""
+        # תמונת מצב של היומן תחת DATA_LOCK — הכותב מחזיק אותה לכל אורך ההוספה,
+        # כך שלא נקרא רשומה שנכתבה רק בחלקה
+        with storage.DATA_LOCK:
+            header = storage.read_header(self.log_path)
+            if header is None:
+                return 0
+            state = _read_state()
+            st = self.log_path.stat()
+            rewritten = state["inode"] != st.st_ino or state["header"] != header or st.st_size < state["offset"]
+            offset = storage.header_end(self.log_path) if rewritten else state["offset"]
+            with self.log_path.open("rb") as f:
+                f.seek(offset)
+                data = f.read(st.st_size - offset)
+
+        if rewritten:
+            # יומן חדש או שנכתב מחדש: קוראים מההתחלה ומדלגים על כל מה שכבר נשלח
+            if state["header"] != header:
+                self.client.set_header(header)
+            sent = state["rows"] if state["inode"] is not None else 0
+            state = {"offset": offset, "rows": sent, "chunk_sent": sent, "inode": st.st_ino, "header": header}
+
+        # רק רשומות שלמות (גם כשכותב מתהליך אחר עוד באמצע רשומה מרובת שורות)
+        data = storage.complete_records(data)
+        if not data:
+            _write_state(state)
+            return 0
+
+        # chunk_sent — רשומות אחרי offset שכבר נשלחו (קבוצות שהצליחו לפני כישלון באמצע)
+        rows = [(r + [""] * len(header))[: len(header)] for r in _records(data, storage.get_plan(self.log_path))[state["chunk_sent"]:]]
+        for start in range(0, len(rows), self.batch_rows):
+            batch = rows[start:start + self.batch_rows]
+            self.client.append_rows(batch)
+            state["rows"] += len(batch)
+            state["chunk_sent"] += len(batch)
+            _write_state(state)
+        state["offset"] += len(data)
+        state["chunk_sent"] = 0
+        _write_state(state)
+        self.last_sync = time.time()
+        return len(rows)
+
+    def _run(self) -> None:
+        failures = 0
+        while not self._stop.is_set():
+            try:
+                self.sync_once()
+                failures, self.last_error = 0, None
+                wait = self.poll
+            except Exception as e:
+                failures += 1
+                self.last_error = repr(e)
+                wait = min(self.max_backoff, self.poll * 2 ** failures) * random.uniform(0.5, 1.0)
+                log.warning("sheets sync failed (attempt %d), retrying in %.1fs: %r", failures, wait, e)
+            self._stop.wait(wait)
+
+    def start(self) -> "SheetsSync":
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="shibutz-sheets-sync", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: float | None = None) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+_worker: SheetsSync | None = None
+_worker_lock = threading.Lock()
+
+
+def start(client: SheetClient) -> SheetsSync:
+    """מפעיל את הסנכרון של התהליך (פעם אחת; קריאות נוספות מחזירות את הקיים)."""
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = SheetsSync(client).start()
+        return _worker
+
+
+def worker() -> SheetsSync | None:
+    return _worker
+
+
+def _main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m shibutz.sheets_sync", description="סנכרון היומן ל-Google Sheets")
+    ap.add_argument("--credentials", type=Path, required=True, help="קובץ JSON של חשבון השירות")
+    ap.add_argument("--key", required=True, help="מזהה הגיליון (מתוך ה-URL)")
+    ap.add_argument("--worksheet", default="Sheet1")
+    args = ap.parse_args(argv)
+
+    sync = SheetsSync(GspreadClient(args.key, args.worksheet, credentials_file=args.credentials))
+    print(f"נשלחו {sync.sync_once()} שורות")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(_main())
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+קטלוג המוסדות לדירוג — נטען מקובץ הגדרות (sites.json בשורש הפרויקט, או SITES_FILE).
+
+    {
+      "rank_count": 10,
+      "sites": [
+        "שם מוסד",
+        {"name": "שם מוסד", "medical": true, "needs_car": false, "capacity": 4}
+      ]
+    }
+
+הקובץ נקרא פעם אחת לכל תהליך ונשמר בזיכרון; נקרא מחדש רק אם השתנה (mtime).
+השדות medical / needs_car / capacity משמשים כברירת מחדל לטבלת הקיבולות של השיבוץ.
+"""
+import json
+import os
+import threading
+from pathlib import Path
+
+SITES_FILE = Path(__file__).resolve().parents[1] / "sites.json"
+DEFAULT_RANK_COUNT = 10
+
+
+class Catalogue:
+    __slots__ = ("sites", "rank_count", "_rows", "_table")
+
+    def __init__(self, sites: list[str], rank_count: int, rows: list[dict]):
+        self.sites = sites              # שמות המוסדות, לפי סדר ההצגה
+        self.rank_count = rank_count    # כמה מדרגות בטופס (לכל היותר מספר המוסדות)
+        self._rows = rows
+        self._table = None
+
+    @property
+    def table(self) -> "pd.DataFrame":
+        """name, medical, needs_car, capacity — נבנית בפעם הראשונה (הטופס לא צריך pandas)."""
+        if self._table is None:
+            import pandas as pd
+
+            self._table = pd.DataFrame(self._rows)
+        return self._table
+
+
+_cached: tuple[tuple, Catalogue] | None = None
+_lock = threading.Lock()
+
+
+def _path() -> Path:
+    return Path(os.environ.get("SITES_FILE") or SITES_FILE)
+
+
+_TRUE = frozenset({"true", "yes", "1", "כן"})
+_FALSE = frozenset({"false", "no", "0", "לא", ""})
+
+
+def _flag(entry: dict, field: str) -> bool:
+    """דגל בוליאני: true/false של JSON, או אחת מהמחרוזות הקבועות ("false" / "0" אינם אמת)."""
+    value = entry.get(field, False)
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().lower() in _TRUE | _FALSE:
+        return value.strip().lower() in _TRUE
+    raise ValueError(f"ערך לא תקין ל-{field} במוסד {entry.get('name')!r}: {value!r} (true / false)")
+
+
+def _parse(data: dict) -> Catalogue:
+    rows, seen = [], set()
+    for entry in data.get("sites", []):
+        entry = {"name": entry} if isinstance(entry, str) else dict(entry)
+        name = str(entry.get("name", "")).strip()
+        if not name:
+            raise ValueError(f"מוסד בלי שם בקטלוג: {entry!r}")
+        if name in seen:
+            raise ValueError(f"מוסד כפול בקטלוג: {name}")
+        seen.add(name)
+        rows.append({
+            "name": name,
+            "medical": _flag(entry, "medical"),
+            "needs_car": _flag(entry, "needs_car"),
+            "capacity": entry.get("capacity"),
+        })
+    if not rows:
+        raise ValueError("קטלוג המוסדות ריק")
+    sites = [r["name"] for r in rows]
+    rank_count = min(int(data.get("rank_count", DEFAULT_RANK_COUNT)), len(sites))
+    return Catalogue(sites, rank_count, rows)
+
+
+def load() -> Catalogue:
+    """הקטלוג הנוכחי (מהזיכרון, או מהקובץ אם הוא חדש יותר)."""
+    global _cached
+    path = _path()
+    st = path.stat()
+    signature = (str(path), st.st_mtime_ns, st.st_size)
+    with _lock:
+        if _cached is None or _cached[0] != signature:
+            _cached = (signature, _parse(json.loads(path.read_text(encoding="utf-8"))))
+        return _cached[1]
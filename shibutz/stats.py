@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+סטטיסטיקת העדפות מצטברת — מתעדכנת בכל שליחה ב-O(1), בלי לסרוק שורות.
+
+לכל מוסד: היסטוגרמת מדרגות (כמה דירגו אותו 1, 2, ...), סכום ומספר המדרגות (לממוצע);
+ובנוסף ספירות לפי תחום מועדף, תחום מוביל ושנת לימודים.
+הסטטיסטיקה משקפת את תצוגת המאסטר (שורה אחת לכל ת״ז): שליחה חוזרת מחסירה את הקודמת.
+הכול נשמר בקובץ JSON קטן ליד קבצי הנתונים, ואפשר לבנות אותו מחדש מהמאסטר לפי דרישה.
+"""
+import json
+import threading
+from collections import Counter
+from typing import Callable
+
+import pandas as pd
+
+from shibutz import storage
+
+STATS_FILE = storage.DATA_DIR / "שאלון_שיבוץ_stats.json"
+
+RANK_PREFIX = "דירוג_"
+RANK_SLOT_PREFIX = "דירוג_מדרגה_"
+DOMAINS_COL = "תחומים_מועדפים"
+TOP_DOMAIN_COL = "תחום_מוביל"
+YEAR_COL = "שנת_לימודים"
+
+_lock = threading.Lock()
+
+
+def _empty() -> dict:
+    return {"rows": 0, "sites": {}, "domains": {}, "top_domains": {}, "years": {}}
+
+
+def load() -> dict:
+    try:
+        return json.loads(STATS_FILE.read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return _empty()
+
+
+def _save(stats: dict) -> dict:
+    tmp = STATS_FILE.with_suffix(".tmp.json")
+    tmp.write_text(json.dumps(stats, ensure_ascii=False), encoding="utf-8")
+    tmp.replace(STATS_FILE)
+    return stats
+
+
+def _is_site_col(col: str) -> bool:
+    return col.startswith(RANK_PREFIX) and not col.startswith(RANK_SLOT_PREFIX)
+
+
+def counts_column(col: str) -> bool:
+    """האם העמודה נספרת בסטטיסטיקה (למשל כדי לקרוא רק אותן לבנייה מחדש)."""
+    return _is_site_col(col) or col in (DOMAINS_COL, TOP_DOMAIN_COL, YEAR_COL)
+
+
+def _apply(stats: dict, row: dict, sign: int = 1) -> None:
+    """מוסיף (sign=1) או מחסיר (sign=-1) את תרומת שורה אחת."""
+    stats["rows"] += sign
+    for col, value in row.items():
+        if not _is_site_col(col):
+            continue
+        site = stats["sites"].setdefault(col[len(RANK_PREFIX):], {"hist": {}, "rank_sum": 0, "rank_n": 0})
+        try:
+            rank = int(float(value))
+        except (TypeError, ValueError):
+            continue   # מוסד שלא דורג
+        key = str(rank)
+        site["hist"][key] = site["hist"].get(key, 0) + sign
+        site["rank_sum"] += sign * rank
+        site["rank_n"] += sign
+    for part in str(row.get(DOMAINS_COL) or "").split(";"):
+        part = part.strip()
+        if part and part.lower() != "nan":
+            stats["domains"][part] = stats["domains"].get(part, 0) + sign
+    for col, bucket in ((TOP_DOMAIN_COL, "top_domains"), (YEAR_COL, "years")):
+        value = row.get(col)
+        if value is not None and str(value).strip() and str(value) != "nan":
+            stats[bucket][str(value)] = stats[bucket].get(str(value), 0) + sign
+
+
+def record(rows: list[dict], removed: list[dict] | None = None) -> None:
+    """עדכון אחרי כתיבה: מוסיף את rows (ומחסיר את removed, אם שורות ישנות הוחלפו)."""
+    with _lock:
+        stats = load()
+        for row in removed or []:
+            _apply(stats, row, -1)
+        for row in rows:
+            _apply(stats, row, 1)
+        _save(stats)
+
+
+def rebuild(read: Callable[[], pd.DataFrame]) -> dict:
+    """
+    בנייה מחדש מטבלה שלמה (היומן / המאסטר) — בפעולות וקטוריות.
+    read — מחזירה את הטבלה. הקריאה, החישוב והשמירה תחת DATA_LOCK, שהכותב מחזיק מהכתיבה
+    ועד record — כך ששליחה שנכתבת בזמן הבנייה לא נדרסת ולא נספרת פעמיים.
+    """
+    with storage.DATA_LOCK, _lock:
+        return _save(_aggregate(read()))
+
+
+def _aggregate(df: pd.DataFrame) -> dict:
+    stats = _empty()
+    stats["rows"] = len(df)
+    for col in df.columns:
+        if not _is_site_col(col):
+            continue
+        ranks = pd.to_numeric(df[col], errors="coerce").dropna().astype(int)
+        stats["sites"][col[len(RANK_PREFIX):]] = {
+            "hist": {str(k): int(v) for k, v in ranks.value_counts().sort_index().items()},
+            "rank_sum": int(ranks.sum()),
+            "rank_n": int(ranks.size),
+        }
+    if DOMAINS_COL in df.columns:
+        parts = df[DOMAINS_COL].dropna().astype(str).str.split(";").explode().str.strip()
+        stats["domains"] = {k: int(v) for k, v in parts[parts != ""].value_counts().items()}
+    for col, bucket in ((TOP_DOMAIN_COL, "top_domains"), (YEAR_COL, "years")):
+        if col in df.columns:
+            values = df[col].dropna().astype(str).str.strip()
+            stats[bucket] = {k: int(v) for k, v in values[values != ""].value_counts().items()}
+    return stats
+
+
+# =========================
+# תצוגה
+# =========================
+def site_demand(stats: dict, top_k: int = 3) -> pd.DataFrame:
+    """טבלת ביקוש לכל מוסד: כמה דירגו ראשון, כמה ב-top_k, ומדרגה ממוצעת."""
+    rows = []
+    for site, s in stats["sites"].items():
+        hist = {int(k): v for k, v in s["hist"].items()}
+        rows.append({
+            "מוסד": site,
+            "עדיפות ראשונה": hist.get(1, 0),
+            f"ב-{top_k} הראשונים": sum(v for k, v in hist.items() if k <= top_k),
+            "מדרגה ממוצעת": round(s["rank_sum"] / s["rank_n"], 2) if s["rank_n"] else None,
+        })
+    df = pd.DataFrame(rows, columns=["מוסד", "עדיפות ראשונה", f"ב-{top_k} הראשונים", "מדרגה ממוצעת"])
+    return df.sort_values(["עדיפות ראשונה", "מדרגה ממוצעת"], ascending=[False, True], ignore_index=True)
+
+
+def counts_table(stats: dict, bucket: str, n: int | None = None) -> pd.DataFrame:
+    return pd.DataFrame(Counter(stats[bucket]).most_common(n), columns=["ערך", "רשומות"])
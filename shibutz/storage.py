@@ -0,0 +1,532 @@
+# -*- coding: utf-8 -*-
+"""
+אחסון קבצי השאלון.
+
+מסלול השליחה הוא Append-Only: כל שליחה מוסיפה שורה אחת ליומן (O(1)),
+והקובץ הראשי (מאסטר) נבנה ממנו בדחיסה (compaction) תקופתית או לפי דרישה.
+הדחיסה מעתיקה למאסטר רק את הבתים שנוספו ליומן מאז הדחיסה הקודמת,
+כך שגם היא אינה תלויה בגודל המחזור.
+"""
+import codecs
+import csv
+import json
+import os
+import re
+import threading
+import time
+import uuid
+import warnings
+from io import BufferedReader, BytesIO, RawIOBase
+from pathlib import Path
+from typing import Iterator
+
+import pandas as pd
+
+from shibutz import metrics
+
+# =========================
+# נתיבים
+# =========================
+DATA_DIR   = Path("data")
+BACKUP_DIR = DATA_DIR / "backups"
+
+CSV_FILE      = DATA_DIR / "שאלון_שיבוץ.csv"         # קובץ ראשי (מצטבר, לעולם לא מתאפס)
+CSV_LOG_FILE  = DATA_DIR / "שאלון_שיבוץ_log.csv"     # יומן הוספות (Append-Only)
+COMPACTION_STATE_FILE = DATA_DIR / "שאלון_שיבוץ_compaction.json"  # עד איזה בית ביומן המאסטר מעודכן
+
+# דחיסה אוטומטית אחרי שליחה כשהיומן "מקדים" את המאסטר ביותר מסף זה
+COMPACT_THRESHOLD_BYTES = 256 * 1024
+
+CSV_WRITE_KW = dict(
+    index=False,
+    quoting=csv.QUOTE_MINIMAL,
+    escapechar="\\",
+    lineterminator="\n",
+)
+
+# כל הכתיבות לקבצי הנתונים בתהליך עוברות דרך נעילה אחת
+# (כותב השליחות ב-shibutz/writer.py, דחיסה לפי דרישה ממסך המנהל, גיבויים).
+DATA_LOCK = threading.RLock()
+
+
+def ensure_dirs() -> None:
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    BACKUP_DIR.mkdir(parents=True, exist_ok=True)
+
+
+# =========================
+# קריאה: תוכנית פרסור + הסגר לשורות פגומות
+# =========================
+SNIFF_BYTES = 64 * 1024
+_BAD_LINE_RE = re.compile(r"Skipping line (\d+)")
+_plans: dict[Path, dict] = {}
+
+
+def plan_path(path: Path) -> Path:
+    """קובץ תוכנית הפרסור שנשמר ליד קובץ הנתונים."""
+    return path.with_name(path.name + ".plan.json")
+
+
+def quarantine_path(path: Path) -> Path:
+    """קובץ ההסגר — השורות הפגומות של path, עם מספרי השורות שלהן."""
+    return path.with_name(path.stem + ".bad.csv")
+
+
+def sniff_parse_plan(path: Path) -> dict:
+    """זיהוי קידוד ומפריד פעם אחת, ממדגם קטן מתחילת הקובץ."""
+    with path.open("rb") as f:
+        return sniff_sample(f.read(SNIFF_BYTES))
+
+
+def sniff_sample(sample: bytes) -> dict:
+    """קידוד ומפריד לפי SNIFF_BYTES הבתים הראשונים של קובץ CSV."""
+    if sample.startswith(codecs.BOM_UTF8):
+        encoding = "utf-8-sig"
+    else:
+        complete = sample[: sample.rfind(b"\n") + 1] or sample   # בלי תו מרובה-בתים חתוך בסוף
+        for encoding in ("utf-8", "cp1255", "latin-1"):
+            try:
+                complete.decode(encoding)
+                break
+            except UnicodeDecodeError:
+                continue
+    head = "\n".join(sample.decode(encoding, errors="replace").splitlines()[:20])
+    try:
+        sep = csv.Sniffer().sniff(head, delimiters=",;\t|").delimiter
+    except csv.Error:
+        sep = ","
+    return {"encoding": encoding, "sep": sep}
+
+
+def get_plan(path: Path, refresh: bool = False) -> dict:
+    if not refresh:
+        if path in _plans:
+            return _plans[path]
+        try:
+            plan = json.loads(plan_path(path).read_text(encoding="utf-8"))
+            _plans[path] = plan
+            return plan
+        except (FileNotFoundError, ValueError):
+            pass
+    plan = sniff_parse_plan(path)
+    _plans[path] = plan
+    try:
+        plan_path(path).write_text(json.dumps(plan), encoding="utf-8")
+    except OSError:
+        pass
+    return plan
+
+
+def _quarantine(path: Path, plan: dict, text: str, bad: list[int], first_line: int, append: bool) -> None:
+    """שומרת את הרשומות הפגומות (לפי מספרי הרשומה שדווחו) בקובץ ההסגר."""
+    wanted = set(bad)
+    rows = []
+    for rec_no, fields in enumerate(csv.reader(text.splitlines(keepends=True), delimiter=plan["sep"]), start=1):
+        if rec_no in wanted:
+            rows.append({"שורה": first_line + rec_no - 1, "תוכן": plan["sep"].join(fields)})
+    qpath = quarantine_path(path)
+    bad_df = pd.DataFrame(rows, columns=["שורה", "תוכן"])
+    if append and qpath.exists():
+        bad_df.to_csv(qpath, mode="a", header=False, encoding="utf-8", **CSV_WRITE_KW)
+    else:
+        bad_df.to_csv(qpath, encoding="utf-8-sig", **CSV_WRITE_KW)
+
+
+@metrics.timed("storage.parse_csv")
+def parse_csv(path: Path, data: bytes | None = None, names: list[str] | None = None,
+              first_line: int = 1, dtype: dict | None = None) -> pd.DataFrame:
+    """
+    פרסור במנוע C לפי תוכנית הפרסור של path.
+    data — לפרסר בתים אלה במקום את כל הקובץ (למשל זנב של יומן; אז names = הכותרת,
+    ו-first_line = מספר השורה בקובץ של הבית הראשון).
+    שורות פגומות לא מפילות את הקריאה: הן מדולגות ונרשמות בקובץ ההסגר,
+    ומספרן נשמר ב-df.attrs["bad_lines"].
+    dtype — טיפוסים לעמודות מסוימות במקום הסקה (למשל ת״ז כמחרוזת, dtypes.READ_DTYPE).
+    """
+    plan = get_plan(path)
+    raw = path.read_bytes() if data is None else data
+    kw = dict(header=None, names=names) if names is not None else {}
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always", pd.errors.ParserWarning)
+        df = pd.read_csv(BytesIO(raw), engine="c", encoding=plan["encoding"], sep=plan["sep"],
+                         on_bad_lines="warn", dtype=dtype, **kw)
+    bad = [int(n) for w in caught if issubclass(w.category, pd.errors.ParserWarning)
+           for n in _BAD_LINE_RE.findall(str(w.message))]
+    if names is None:
+        df.columns = [str(c).replace("\ufeff", "").strip() for c in df.columns]
+    if bad:
+        _quarantine(path, plan, raw.decode(plan["encoding"], errors="replace"), bad, first_line,
+                    append=names is not None)
+    elif names is None:
+        quarantine_path(path).unlink(missing_ok=True)   # קריאה מלאה ונקייה — אין מה להסגיר
+    df.attrs["bad_lines"] = len(bad)
+    return df
+
+
+class _Head(RawIOBase):
+    """קורא רק את limit הבתים הראשונים של קובץ פתוח."""
+
+    def __init__(self, f, limit: int):
+        self.f, self.left = f, limit
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buf) -> int:
+        n = self.f.readinto(memoryview(buf)[: max(0, min(len(buf), self.left))])
+        self.left -= n
+        return n
+
+
+def read_csv_chunks(path: Path, chunk_rows: int = 20_000, end: int | None = None) -> Iterator[pd.DataFrame]:
+    """
+    הקובץ במקטעים של chunk_rows רשומות — זיכרון חסום גם לקובץ גדול.
+    כל הערכים כמחרוזות, כמו שנכתבו (ריק לחסר, בלי הסקת טיפוסים), כך שכתיבה חוזרת לא משנה אותם.
+    end — לקרוא רק עד בית זה (למשל היסט הדחיסה של היומן).
+    מספרי השורות הפגומות שדולגו במקטע — ב-chunk.attrs["bad_lines"].
+    """
+    if not path.exists() or path.stat().st_size == 0:
+        return
+    plan = get_plan(path)
+    with path.open("rb") as f:
+        src = BufferedReader(_Head(f, path.stat().st_size if end is None else end))
+        try:
+            reader = pd.read_csv(src, dtype=str, keep_default_na=False, encoding=plan["encoding"], sep=plan["sep"],
+                                 escapechar=CSV_WRITE_KW["escapechar"], on_bad_lines="warn", chunksize=chunk_rows)
+        except pd.errors.EmptyDataError:
+            return
+        with reader:
+            while True:
+                with warnings.catch_warnings(record=True) as caught:
+                    warnings.simplefilter("always", pd.errors.ParserWarning)
+                    chunk = next(reader, None)
+                if chunk is None:
+                    return
+                chunk.columns = [str(c).replace("\ufeff", "").strip() for c in chunk.columns]
+                chunk.attrs["bad_lines"] = [int(n) for w in caught if issubclass(w.category, pd.errors.ParserWarning)
+                                            for n in _BAD_LINE_RE.findall(str(w.message))]
+                yield chunk
+
+
+def read_text_frame(path: Path) -> pd.DataFrame:
+    """הקובץ כולו כמחרוזות (read_csv_chunks) — לכתיבה מחדש של קובץ נתונים בלי לשנות ערכים."""
+    chunks = list(read_csv_chunks(path))
+    return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+
+
+def _load_csv_fallback(path: Path, dtype: dict | None = None) -> pd.DataFrame:
+    """הניסיונות הישנים (מספר קידודים, מנוע Python) — רק כשתוכנית הפרסור נכשלה לגמרי."""
+    attempts = [
+        dict(encoding="utf-8-sig"),
+        dict(encoding="utf-8"),
+        dict(encoding="utf-8-sig", engine="python", on_bad_lines="skip"),
+        dict(encoding="utf-8", engine="python", on_bad_lines="skip"),
+        dict(encoding="latin-1", engine="python", on_bad_lines="skip"),
+    ]
+    for kw in attempts:
+        try:
+            df = pd.read_csv(path, dtype=dtype, **kw)
+            df.columns = [c.replace("\ufeff", "").strip() for c in df.columns]
+            return df
+        except Exception:
+            continue
+    return pd.DataFrame()
+
+
+def load_csv_safely(path: Path, dtype: dict | None = None) -> pd.DataFrame:
+    """
+    קריאה חסינה של CSV: קידוד ומפריד מזוהים פעם אחת ונשמרים ליד הקובץ,
+    הקריאה במנוע C, ושורות פגומות עוברות להסגר (quarantine_path) במקום לדלג עליהן בשקט.
+    """
+    if not path.exists():
+        return pd.DataFrame()
+    for refresh in (False, True):
+        try:
+            if refresh:
+                # התוכנית השמורה לא מתאימה (למשל הקובץ הוחלף) — זיהוי מחדש
+                get_plan(path, refresh=True)
+            return parse_csv(path, dtype=dtype)
+        except pd.errors.EmptyDataError:
+            return pd.DataFrame()
+        except Exception:
+            continue
+    return _load_csv_fallback(path, dtype)
+
+
+def quarantined_rows(path: Path) -> pd.DataFrame:
+    """השורות הפגומות שהוסגרו מקובץ path (ריק אם אין)."""
+    qpath = quarantine_path(path)
+    if not qpath.exists():
+        return pd.DataFrame(columns=["שורה", "תוכן"])
+    return pd.read_csv(qpath, encoding="utf-8-sig")
+
+
+def _write_csv(df: pd.DataFrame, path: Path, mode: str = "w", header: bool = True) -> None:
+    """כתיבת CSV (UTF-8 עם BOM בתחילת קובץ בלבד) עד לדיסק — flush + fsync."""
+    with open(path, mode, encoding="utf-8-sig", newline="") as f:
+        df.to_csv(f, header=header, **CSV_WRITE_KW)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _tmp_path(path: Path) -> Path:
+    # שם זמני ייחודי — שתי כתיבות במקביל לא ידרסו אותו קובץ ‎.tmp
+    return path.with_name(f"{path.stem}.{uuid.uuid4().hex[:8]}.tmp.csv")
+
+
+@metrics.timed("storage.write_atomic")
+def _write_atomic(df: pd.DataFrame, path: Path) -> None:
+    tmp = _tmp_path(path)
+    _write_csv(df, tmp)
+    tmp.replace(path)
+
+
+def _write_bytes_atomic(data: bytes, path: Path) -> None:
+    """כמו _write_atomic, לבתים מוכנים: קובץ זמני, fsync, ואז החלפה."""
+    tmp = _tmp_path(path)
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    tmp.replace(path)
+
+
+def save_master_dataframe(df: pd.DataFrame) -> None:
+    """
+    שמירה אטומית של הקובץ הראשי.
+    לעולם לא מוחקים נתונים קיימים – תמיד מצרפים.
+    (הגיבויים מנוהלים בנפרד — shibutz/backups.py.)
+    """
+    with DATA_LOCK:
+        _write_atomic(df, CSV_FILE)
+
+
+def read_header(path: Path) -> list[str] | None:
+    """שורת הכותרת של קובץ CSV בלבד (בלי לקרוא את שאר הקובץ)."""
+    if not path.exists() or path.stat().st_size == 0:
+        return None
+    with path.open("r", encoding="utf-8-sig", newline="") as f:
+        header = next(csv.reader(f), None)
+    if header is None:
+        return None
+    return [c.replace("\ufeff", "").strip() for c in header]
+
+
+def header_end(path: Path) -> int:
+    """אורך שורת הכותרת בבתים (כולל BOM וסוף שורה)."""
+    with path.open("rb") as f:
+        return len(f.readline())
+
+
+def complete_records(data: bytes) -> bytes:
+    """
+    data עד סוף הרשומה השלמה האחרונה (data מתחיל בתחילת רשומה).
+    ירידת שורה בתוך שדה במרכאות (טקסט חופשי מרובה שורות) אינה סוף רשומה —
+    רשומה נגמרת בירידת שורה שלפניה מספר זוגי של מרכאות.
+    """
+    end = len(data)
+    while (end := data.rfind(b"\n", 0, end)) >= 0:
+        if data.count(b'"', 0, end) % 2 == 0:
+            return data[: end + 1]
+    return b""
+
+
+# =========================
+# מצב הדחיסה
+# =========================
+def _read_compaction_state() -> dict:
+    try:
+        return json.loads(COMPACTION_STATE_FILE.read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def read_compaction_offset() -> int:
+    try:
+        return int(_read_compaction_state()["log_offset"])
+    except (KeyError, ValueError):
+        pass
+    # אין מצב שמור (התקנה קיימת לפני המעבר ל-Append-Only):
+    # אם יש מאסטר — הוא נכתב יחד עם היומן ולכן מעודכן עד סופו.
+    if not CSV_LOG_FILE.exists():
+        return 0
+    if CSV_FILE.exists():
+        return CSV_LOG_FILE.stat().st_size
+    return header_end(CSV_LOG_FILE)
+
+
+def write_compaction_offset(offset: int) -> None:
+    """
+    שומר את ההיסט יחד עם המאסטר שמעודכן עד אליו (inode וגודל, או None כשאין מאסטר) —
+    כדי לזהות דחיסה שנקטעה אחרי הכתיבה למאסטר ולפני שמירת ההיסט (_undo_interrupted_merge).
+    נקרא רק אחרי שהמאסטר כבר בדיסק (fsync).
+    """
+    st = CSV_FILE.stat() if CSV_FILE.exists() else None
+    state = {"log_offset": offset, "master": [st.st_ino, st.st_size] if st else None}
+    tmp = COMPACTION_STATE_FILE.with_suffix(".tmp.json")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    tmp.replace(COMPACTION_STATE_FILE)
+
+
+def _undo_interrupted_merge() -> None:
+    """
+    מחזיר את המאסטר למצב שנשמר עם ההיסט, כשדחיסה נקטעה בין הכתיבה למאסטר לשמירת ההיסט
+    (אחרת הזנב ימוזג שוב ושורות יוכפלו):
+      • הוספה שנקטעה — אותו קובץ (inode) וגדול יותר: חותכים חזרה לגודל השמור;
+      • מאסטר שנוצר בדחיסה ראשונה (כשנשמר ההיסט לא היה מאסטר): מועבר הצידה ונבנה שוב מהזנב.
+    מאסטר שנכתב מחדש באטומיות (inode אחר) לא נוגעים בו.
+    """
+    state = _read_compaction_state()
+    if "master" not in state or not CSV_FILE.exists():
+        return      # מצב ישן (בלי פרטי המאסטר) או שאין מאסטר
+    st = CSV_FILE.stat()
+    if state["master"] is None:
+        CSV_FILE.replace(CSV_FILE.with_name(f"{CSV_FILE.stem}.interrupted.{uuid.uuid4().hex[:8]}.csv"))
+    elif st.st_ino == state["master"][0] and st.st_size > state["master"][1]:
+        with CSV_FILE.open("r+b") as f:
+            f.truncate(state["master"][1])
+            os.fsync(f.fileno())
+
+
+def pending_log_bytes() -> int:
+    """כמה בתים ביומן טרם מוזגו למאסטר."""
+    if not CSV_LOG_FILE.exists():
+        return 0
+    return max(0, CSV_LOG_FILE.stat().st_size - read_compaction_offset())
+
+
+# =========================
+# יומן + דחיסה
+# =========================
+@metrics.timed("storage.append_to_log")
+def append_to_log(row_df: pd.DataFrame, dedupe: bool = False) -> None:
+    """
+    יומן Append-Only — מוסיפים שורות בלבד (כתיבה אחת + fsync לכל קבוצת שורות).
+    אינדקס הת״ז (shibutz/id_index.py) מתעדכן יחד עם היומן, תחת אותה נעילה.
+    """
+    from shibutz import id_index
+
+    ids = row_df[id_index.ID_COL].tolist() if id_index.ID_COL in row_df.columns else [""] * len(row_df)
+    with DATA_LOCK:
+        header = read_header(CSV_LOG_FILE)
+        if header is None:
+            id_index.reset()
+            _write_csv(row_df, CSV_LOG_FILE)
+            write_compaction_offset(header_end(CSV_LOG_FILE))
+            id_index.add(ids)
+            return
+        if not COMPACTION_STATE_FILE.exists():
+            # מקבעים את נקודת ההתחלה לפני ההוספה הראשונה, אחרת השורה תיחשב "ממוזגת"
+            write_compaction_offset(read_compaction_offset())
+
+        if not set(row_df.columns) <= set(header):
+            # עמודות חדשות (למשל שינוי ברשימת המוסדות): ממזגים קודם את כל היומן
+            # למאסטר, ואז מרחיבים את כותרת היומן פעם אחת — ההיסט נשמר עקבי.
+            compact_master(dedupe)
+            header = header + [c for c in row_df.columns if c not in header]
+            _write_atomic(read_text_frame(CSV_LOG_FILE).reindex(columns=header, fill_value=""), CSV_LOG_FILE)
+            write_compaction_offset(CSV_LOG_FILE.stat().st_size)
+
+        _write_csv(row_df.reindex(columns=header), CSV_LOG_FILE, mode="a", header=False)
+        id_index.add(ids)
+
+
+@metrics.timed("storage.compact")
+def compact_master(dedupe: bool = False) -> int:
+    """
+    ממזג למאסטר את שורות היומן שנוספו מאז הדחיסה הקודמת.
+    כשהכותרות זהות — העתקת בתים ישירה, בלי לפרסר CSV.
+    dedupe — מדיניות replace: שליחה חוזרת מוחקת מהמאסטר את השורה הקודמת של אותה ת״ז
+    (המאסטר נכתב מחדש רק כשבזנב יש ת״ז שכבר הופיעה — לפי אינדקס הת״ז).
+    מחזיר את מספר הבתים שמוזגו.
+    """
+    with DATA_LOCK:
+        return _compact_locked(dedupe)
+
+
+def _superseding(tail: bytes, log_header: list[str]) -> pd.DataFrame | None:
+    """שורות הזנב, אם יש ביניהן ת״ז שכבר נשלחה קודם (אחרת None)."""
+    from shibutz import id_index
+
+    if id_index.ID_COL not in log_header:
+        return None
+    new_rows = pd.read_csv(BytesIO(tail), header=None, names=log_header,
+                           dtype=str, keep_default_na=False, encoding="utf-8", escapechar=CSV_WRITE_KW["escapechar"])
+    if any(v and id_index.occurrences(v) > 1 for v in new_rows[id_index.ID_COL]):
+        return new_rows
+    return None
+
+
+def _compact_locked(dedupe: bool = False) -> int:
+    if not CSV_LOG_FILE.exists():
+        return 0
+    offset = max(read_compaction_offset(), header_end(CSV_LOG_FILE))
+    with CSV_LOG_FILE.open("rb") as f:
+        f.seek(offset)
+        tail = f.read()
+    tail = complete_records(tail)
+    if not tail:
+        return 0
+
+    _undo_interrupted_merge()
+    log_header = read_header(CSV_LOG_FILE)
+    master_header = read_header(CSV_FILE)
+    replacing = _superseding(tail, log_header) if dedupe else None
+    if replacing is not None:
+        from shibutz import id_index
+
+        if master_header is None:
+            # דחיסה ראשונה (או מאסטר שנמחק) — גם כאן רק האחרונה לכל ת״ז מתוך הזנב
+            merged, columns = replacing, log_header
+        else:
+            merged = pd.concat([read_text_frame(CSV_FILE), replacing], ignore_index=True)
+            columns = master_header + [c for c in log_header if c not in master_header]
+        _write_atomic(id_index.latest_only(merged).reindex(columns=columns), CSV_FILE)
+    elif master_header is None:
+        with CSV_LOG_FILE.open("rb") as f:
+            head = f.readline()
+        _write_bytes_atomic(head + tail, CSV_FILE)
+    elif master_header == log_header:
+        # הוספה במקום (O(זנב)); נקטעה? _undo_interrupted_merge חותך אותה בדחיסה הבאה
+        with CSV_FILE.open("ab") as out:
+            out.write(tail)
+            out.flush()
+            os.fsync(out.fileno())
+    else:
+        new_rows = pd.read_csv(
+            BytesIO(tail), header=None, names=log_header,
+            dtype=str, keep_default_na=False, encoding="utf-8", escapechar=CSV_WRITE_KW["escapechar"],
+        )
+        if set(log_header) <= set(master_header):
+            _write_csv(new_rows.reindex(columns=master_header), CSV_FILE, mode="a", header=False)
+        else:
+            _write_atomic(pd.concat([read_text_frame(CSV_FILE), new_rows], ignore_index=True), CSV_FILE)
+
+    write_compaction_offset(offset + len(tail))
+    return len(tail)
+
+
+def append_rows(rows: list[dict], dedupe: bool = False) -> None:
+    """
+    מסלול השליחה: הוספת קבוצת שורות ליומן בכתיבה אחת (זמן קבוע לשורה,
+    ללא תלות בגודל המחזור), ודחיסה למאסטר רק כשהצטבר מספיק.
+    """
+    t0 = time.perf_counter()
+    with DATA_LOCK:
+        metrics.record("storage.lock_wait", time.perf_counter() - t0)
+        append_to_log(pd.DataFrame(rows), dedupe)
+        if pending_log_bytes() >= COMPACT_THRESHOLD_BYTES:
+            compact_master(dedupe)
+
+
+def append_submission(row: dict) -> None:
+    append_rows([row])
+
+
+def load_master(dedupe: bool = False) -> pd.DataFrame:
+    """תצוגת המאסטר העדכנית — דחיסה לפי דרישה (dedupe — מדיניות replace) ואז קריאה."""
+    compact_master(dedupe)
+    return load_csv_safely(CSV_FILE)
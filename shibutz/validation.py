@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""
+כללי התקינות של שורת שאלון — מוגדרים פעם אחת, כרשימת כללים על עמודות השורה השמורה.
+
+    schema = form_schema(rank_count)
+    validate_row(row, schema)      -> רשימת הודעות שגיאה (לטופס)
+    validate_frame(df, schema)     -> דוח שגיאות לכל שורה (למאסטר / לייבוא), במעבר וקטורי אחד
+
+הביטויים הרגולריים מהודרים פעם אחת בטעינת המודול. בדיקות שתלויות בווידג'טים ולא בשורה
+השמורה (פירוט "אחר...", אישור ההצהרה, כפילות ת״ז) נשארות בטופס.
+"""
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+ID_RE = re.compile(r"\d{8,9}")
+ID_WIDTH = 9                                    # ת״ז של 9 ספרות שנקראה כמספר מאבדת את האפס המוביל
+PHONE_RE = re.compile(r"0\d{1,2}-?\d{6,7}")     # 050-1234567 / 04-8123456
+EMAIL_RE = re.compile(r"[^@]+@[^@]+\.[^@]+")
+
+OTHER = "אחר..."
+LIST_SEP = "; "
+RANK_COL = "דירוג_מדרגה_{}_מוסד"
+ERRORS_COL = "שגיאות"
+TEXT_DTYPE = "string[pyarrow]"     # pyarrow מגיע עם streamlit
+
+
+def _text(value, numeric_prefix: str = "", numeric_width: int = 0) -> str:
+    """
+    ערך כמחרוזת, באותה המרה כמו _text_col (ריק לחסר;
+    מספר שלם — בלי ".0", עם האפס המוביל כשחסרה בדיוק ספרה אחת עד numeric_width, ועם הקידומת).
+    """
+    if value is None or value is pd.NA:
+        return ""
+    if isinstance(value, (int, float, np.number)) and not isinstance(value, (bool, np.bool_)):
+        if np.isnan(value):
+            return ""
+        if float(value).is_integer():
+            digits = str(int(value))
+            if len(digits) == numeric_width - 1:
+                digits = "0" + digits
+            return numeric_prefix + digits
+    return str(value).strip()
+
+
+def _text_col(df: pd.DataFrame, column: str, numeric_prefix: str = "", numeric_width: int = 0) -> pd.Series:
+    """
+    העמודה כמחרוזות arrow (פעולות ‎.str רצות ב-C; ריק לחסר).
+    עמודה שנקראה כמספר — בלי ".0", ועם מה שהסקת הטיפוסים מחקה: האפס המוביל של ת״ז
+    (רק כשחסרה בדיוק ספרה אחת עד numeric_width — ת״ז קצרה יותר נשארת קצרה ונפסלת)
+    או הקידומת (האפס של הטלפון).
+    """
+    if column not in df.columns:
+        return pd.Series("", index=df.index, dtype=TEXT_DTYPE)
+    s = df[column]
+    if pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s):
+        s = s.astype("Float64").astype(TEXT_DTYPE).str.replace(r"\.0$", "", regex=True)
+        if numeric_width:
+            s = s.mask(s.str.len() == numeric_width - 1, "0" + s)
+        if numeric_prefix:
+            s = numeric_prefix + s
+    return s.astype(TEXT_DTYPE).str.strip().fillna("")
+
+
+class _Columns:
+    """עמודות הטקסט של פריים אחד, מומרות פעם אחת לכל הכללים."""
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self._memo: dict[tuple[str, str, int], pd.Series] = {}
+
+    def __call__(self, column: str, numeric_prefix: str = "", numeric_width: int = 0) -> pd.Series:
+        key = (column, numeric_prefix, numeric_width)
+        if key not in self._memo:
+            self._memo[key] = _text_col(self.df, column, numeric_prefix, numeric_width)
+        return self._memo[key]
+
+
+# =========================
+# כללים
+# =========================
+class Rule:
+    """כלל על עמודה אחת. when=(עמודה, ערכים) — הכלל חל רק כשהעמודה מקבלת אחד מהערכים."""
+    __slots__ = ("column", "message", "when")
+
+    def __init__(self, column: str, message: str, when: tuple[str, frozenset] | None = None):
+        self.column = column
+        self.message = message
+        self.when = when
+
+    def ok(self, value: str, row: dict) -> bool:
+        raise NotImplementedError
+
+    def ok_frame(self, s: pd.Series, cols: _Columns) -> pd.Series:
+        raise NotImplementedError
+
+    def row_errors(self, row: dict) -> list[str]:
+        if self.when and _text(row.get(self.when[0])) not in self.when[1]:
+            return []
+        return [] if self.ok(_text(row.get(self.column)), row) else [self.message]
+
+    def frame_errors(self, cols: _Columns) -> list[tuple[str, pd.Series]]:
+        bad = ~self.ok_frame(cols(self.column), cols).fillna(False).astype(bool)
+        if self.when:
+            bad &= cols(self.when[0]).isin(self.when[1])
+        return [(self.message, bad)]
+
+
+class Required(Rule):
+    __slots__ = ()
+
+    def ok(self, value, row):
+        return bool(value)
+
+    def ok_frame(self, s, cols):
+        return s != ""
+
+
+class Pattern(Rule):
+    __slots__ = ("regex", "numeric_prefix", "numeric_width")
+
+    def __init__(self, column: str, regex: re.Pattern, message: str, numeric_prefix: str = "",
+                 numeric_width: int = 0, **kw):
+        super().__init__(column, message, **kw)
+        self.regex = regex
+        self.numeric_prefix = numeric_prefix
+        self.numeric_width = numeric_width
+
+    def ok(self, value, row):
+        value = _text(row.get(self.column), self.numeric_prefix, self.numeric_width)
+        return self.regex.fullmatch(value) is not None
+
+    def ok_frame(self, s, cols):
+        return cols(self.column, self.numeric_prefix, self.numeric_width).str.fullmatch(self.regex.pattern)
+
+
+class Positive(Rule):
+    __slots__ = ()
+
+    def ok(self, value, row):
+        try:
+            return float(value) > 0
+        except ValueError:
+            return False
+
+    def ok_frame(self, s, cols):
+        return pd.to_numeric(s, errors="coerce") > 0
+
+
+class OneOf(Rule):
+    """הערך הוא אחד הפריטים ברשימה שבעמודה אחרת ("א; ב; ג"), או "אחר..." — כשהרשימה לא ריקה."""
+    __slots__ = ("list_column",)
+
+    def __init__(self, column: str, list_column: str, message: str, **kw):
+        super().__init__(column, message, **kw)
+        self.list_column = list_column
+
+    def ok(self, value, row):
+        items = _text(row.get(self.list_column))
+        return not items or value == OTHER or value in items.split(LIST_SEP)
+
+    def ok_frame(self, s, cols):
+        items = cols(self.list_column)
+        # חיפוש הפריט כשהוא מוקף מפרידים: "; א; ב; " מכיל "; א; "
+        wrapped = (LIST_SEP + items + LIST_SEP).to_numpy(dtype=object)
+        member = np.char.find(wrapped.astype(str), (LIST_SEP + s + LIST_SEP).to_numpy(dtype=object).astype(str)) >= 0
+        return (items == "") | (s == OTHER) | pd.Series(member, index=s.index)
+
+
+class Ranks:
+    """כל המדרגות 1..count מלאות, ואף מוסד לא מופיע פעמיים (ואם known — רק מוסדות מהקטלוג)."""
+    __slots__ = ("count", "missing_message", "duplicate_message", "known", "unknown_message")
+
+    def __init__(self, count: int, missing_message: str, duplicate_message: str,
+                 known: frozenset | None = None, unknown_message: str = ""):
+        self.count = count
+        self.missing_message = missing_message
+        self.duplicate_message = duplicate_message
+        self.known = known
+        self.unknown_message = unknown_message
+
+    @property
+    def columns(self) -> list[str]:
+        return [RANK_COL.format(i) for i in range(1, self.count + 1)]
+
+    def row_errors(self, row: dict) -> list[str]:
+        sites = [_text(row.get(c)) for c in self.columns]
+        errors = []
+        missing = [str(i) for i, s in enumerate(sites, start=1) if not s]
+        if missing:
+            errors.append(f"{self.missing_message} חסר/ים: {', '.join(missing)}.")
+        chosen = [s for s in sites if s]
+        if len(set(chosen)) != len(chosen):
+            errors.append(self.duplicate_message)
+        if self.known and not set(chosen) <= self.known:
+            errors.append(self.unknown_message)
+        return errors
+
+    def frame_errors(self, cols: _Columns) -> list[tuple[str, pd.Series]]:
+        # שמות המוסדות -> קודים שלמים (factorize פעם אחת לכל הטבלה), חסר = -1
+        df = cols.df
+        values = df.reindex(columns=self.columns).to_numpy(dtype=object)
+        codes, uniques = pd.factorize(values.ravel())
+        clean_codes, labels = pd.factorize(pd.Index([_text(u) for u in uniques], dtype=object))
+        blank = labels == ""
+        recode = np.append(np.where(blank[clean_codes], -1, clean_codes), -1)
+        codes = recode[codes].reshape(values.shape)       # -1 של factorize (NaN) נופל על האיבר האחרון
+        ordered = np.sort(codes, axis=1)
+        duplicate = ((ordered[:, 1:] == ordered[:, :-1]) & (ordered[:, 1:] >= 0)).any(axis=1)
+        errors = [(self.missing_message, pd.Series((codes < 0).any(axis=1), index=df.index)),
+                  (self.duplicate_message, pd.Series(duplicate, index=df.index))]
+        if self.known:
+            unknown = ~labels.isin(self.known) & ~blank
+            errors.append((self.unknown_message,
+                           pd.Series(((codes >= 0) & unknown[codes.clip(0)]).any(axis=1), index=df.index)))
+        return errors
+
+
+# =========================
+# הסכמה של הטופס
+# =========================
+@lru_cache(maxsize=8)
+def form_schema(rank_count: int, sites: tuple[str, ...] = ()) -> tuple:
+    """הכללים של שורת הטופס. sites — רשימת המוסדות המותרים בדירוג (ריק: לא נבדק)."""
+    prev = ("הכשרה_קודמת", frozenset({"כן", OTHER}))
+    return (
+        Required("שם_פרטי", "סעיף 1: יש למלא שם פרטי."),
+        Required("שם_משפחה", "סעיף 1: יש למלא שם משפחה."),
+        Pattern("תעודת_זהות", ID_RE, "סעיף 1: ת״ז חייבת להיות 8–9 ספרות.", numeric_width=ID_WIDTH),
+        Required("שפות_נוספות", "סעיף 1: יש לבחור שפות נוספות (ואם 'אחר' – לפרט)."),
+        Pattern("טלפון", PHONE_RE, "סעיף 1: מספר טלפון אינו תקין.", numeric_prefix="0"),
+        Required("כתובת", "סעיף 1: יש למלא כתובת מלאה."),
+        Pattern("אימייל", EMAIL_RE, "סעיף 1: כתובת דוא״ל אינה תקינה."),
+        Required("מסלול_לימודים", "סעיף 1: יש למלא מסלול לימודים/תואר."),
+        Ranks(rank_count, "סעיף 2: יש לבחור מוסד לכל מדרגה.",
+              "סעיף 2: קיימת כפילות בבחירת מוסדות. כל מוסד יכול להופיע פעם אחת בלבד.",
+              frozenset(sites), "סעיף 2: מוסד שאינו ברשימת המוסדות."),
+        Required("הכשרה_קודמת_מקום_ותחום", "סעיף 2: יש למלא מקום/תחום אם הייתה הכשרה קודמת.", when=prev),
+        Required("הכשרה_קודמת_מדריך_ומיקום", "סעיף 2: יש למלא שם מדריך ומיקום.", when=prev),
+        Required("הכשרה_קודמת_בן_זוג", "סעיף 2: יש למלא בן/בת זוג להתמחות.", when=prev),
+        Required("תחומים_מועדפים", "סעיף 2: יש לבחור עד 3 תחומים (לפחות אחד)."),
+        OneOf("תחום_מוביל", "תחומים_מועדפים", "סעיף 2: יש לבחור תחום מוביל מתוך השלושה."),
+        Required("בקשה_מיוחדת", "סעיף 2: יש לציין בקשה מיוחדת (אפשר 'אין')."),
+        Positive("ממוצע", "סעיף 3: יש להזין ממוצע ציונים גדול מ-0."),
+        Required("התאמות", "סעיף 4: יש לבחור לפחות סוג התאמה אחד (או לציין 'אין')."),
+        Required("התאמות_פרטים", "סעיף 4: יש לפרט התייחסות להתאמות (אפשר 'אין')."),
+        Required("מוטיבציה_1", "סעיף 5: יש לענות על שלוש שאלות המוטיבציה."),
+        Required("מוטיבציה_2", "סעיף 5: יש לענות על שלוש שאלות המוטיבציה."),
+        Required("מוטיבציה_3", "סעיף 5: יש לענות על שלוש שאלות המוטיבציה."),
+    )
+
+
+# =========================
+# הרצה
+# =========================
+def validate_row(row: dict, schema: tuple) -> list[str]:
+    """הודעות השגיאה של שורה אחת, לפי סדר הכללים (בלי כפילויות)."""
+    errors = []
+    for rule in schema:
+        for message in rule.row_errors(row):
+            if message not in errors:
+                errors.append(message)
+    return errors
+
+
+def validate_frame(df: pd.DataFrame, schema: tuple, key_column: str = "תעודת_זהות") -> pd.DataFrame:
+    """
+    דוח שגיאות לכל הפריים: שורה אחת לכל רשומה פסולה —
+    מספר השורה (1 = הרשומה הראשונה), key_column, מספר השגיאות ורשימתן.
+    """
+    cols = _Columns(df)
+    masks: dict[str, np.ndarray] = {}       # הודעה משותפת לכמה כללים — פעם אחת לשורה
+    for rule in schema:
+        for message, bad in rule.frame_errors(cols):
+            masks[message] = masks.get(message, False) | bad.to_numpy(dtype=bool)
+    if not masks:
+        masks[""] = np.zeros(len(df), dtype=bool)
+    matrix = np.column_stack(list(masks.values()))
+    hit = matrix.any(axis=1)
+    rows = matrix[hit]
+    # קומבינציות השגיאות חוזרות על עצמן: כל אחת מקודדת כמספר (ביט לכל הודעה) ומצורפת פעם אחת
+    messages = list(masks)
+    combo = rows.astype(np.int64) @ (np.int64(1) << np.arange(len(messages), dtype=np.int64))
+    unique, inverse = np.unique(combo, return_inverse=True)
+    texts = np.array(["\n".join(m for b, m in enumerate(messages) if c >> b & 1) for c in unique], dtype=object)
+    return pd.DataFrame({
+        "שורה": np.flatnonzero(hit) + 1,
+        key_column: cols(key_column, numeric_width=ID_WIDTH if key_column == "תעודת_זהות" else 0)
+                    .to_numpy(dtype=object)[hit],
+        "מספר שגיאות": rows.sum(axis=1),
+        ERRORS_COL: texts[inverse],
+    })
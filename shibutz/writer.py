@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+כותב יחיד לכל התהליך (single writer) עם Group Commit.
+
+כל סשן של Streamlit רץ ב-thread משלו. במקום שכל אחד יכתוב לקבצים בעצמו,
+השליחות נכנסות לתור, ו-thread רקע אחד — הבעלים היחיד של קבצי הנתונים —
+אוסף את כל מה שהגיע יחד לכתיבה אחת עם fsync, ומודיע לכל סשן (דרך Future)
+מתי השורה שלו נשמרה בדיסק.
+"""
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+
+from shibutz import id_index, metrics, stats, storage
+from shibutz.backends import SubmissionStore, get_store
+
+# כמה שליחות לכל היותר בכתיבה אחת, וכמה זמן לחכות לשליחות נוספות אחרי הראשונה
+MAX_BATCH = 256
+GROUP_WAIT_SEC = 0.005
+
+_STOP = object()
+
+log = logging.getLogger(__name__)
+
+
+class SubmissionWriter:
+    def __init__(self, store: SubmissionStore | None = None,
+                 max_batch: int = MAX_BATCH, group_wait: float = GROUP_WAIT_SEC):
+        self.store = store or get_store()
+        self.max_batch = max_batch
+        self.group_wait = group_wait
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="shibutz-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, row: dict) -> Future:
+        """מכניס שורה לתור. ה-Future מסתיים כשהשורה נכתבה ל-fsync (או עם החריגה)."""
+        fut: Future = Future()
+        self._queue.put((row, fut))
+        return fut
+
+    def close(self, timeout: float | None = None) -> None:
+        """מרוקן את התור ועוצר את ה-thread."""
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def _collect(self) -> tuple[list, bool]:
+        first = self._queue.get()
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        stop = False
+        while len(batch) < self.max_batch:
+            try:
+                item = self._queue.get(timeout=self.group_wait)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                stop = True
+                break
+            batch.append(item)
+        return batch, stop
+
+    def _screen(self, batch: list) -> tuple[list, list[dict]]:
+        """
+        בדיקת כפילויות לפי אינדקס הת״ז, לפני הכתיבה. הכותב הוא היחיד שמוסיף שורות,
+        ולכן הבדיקה כאן סופית גם כששני סשנים שולחים את אותה ת״ז בו-זמנית.
+        מחזיר (השליחות שיישמרו, השורות שהן מחליפות — לעדכון הסטטיסטיקה).
+        """
+        accepted, replaced, seen = [], [], {}
+        for row, fut in batch:
+            nat_id = id_index.key(row.get(id_index.ID_COL, ""))
+            earlier = seen.get(nat_id) if nat_id else None
+            if nat_id and earlier is None and self.store.has_id(nat_id):
+                earlier = self.store.latest_row(nat_id)
+            if earlier is not None and self.store.duplicate_policy == "reject":
+                fut.set_exception(id_index.DuplicateSubmission(f"כבר קיימת שליחה עם ת״ז {nat_id}"))
+                continue
+            if earlier is not None:
+                replaced.append(earlier)
+            if nat_id:
+                seen[nat_id] = row
+            accepted.append((row, fut))
+        return accepted, replaced
+
+    def _run(self) -> None:
+        while True:
+            batch, stop = self._collect()
+            replaced = []
+            try:
+                with metrics.timed("writer.screen"):
+                    batch, replaced = self._screen(batch)
+            except Exception as e:
+                # בלי בדיקת כפילויות אין כתיבה — אחרת אינדקס פגום היה עוקף את מדיניות reject
+                log.exception("duplicate check failed")
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                batch = []
+            if batch:
+                rows = [row for row, _ in batch]
+                # הכתיבה ועדכון הסטטיסטיקה תחת DATA_LOCK אחת — stats.rebuild (שמחזיקה אותה) לא תראה
+                # שורה שכבר נכתבה אבל עוד לא נספרה
+                with storage.DATA_LOCK:
+                    try:
+                        with metrics.timed("writer.append", rows=len(rows)):
+                            self.store.append(rows)
+                    except Exception as e:
+                        for _, fut in batch:
+                            fut.set_exception(e)
+                        batch = []
+                    else:
+                        for _, fut in batch:
+                            fut.set_result(None)
+                        # הסשנים כבר קיבלו אישור — הסטטיסטיקה לא מאטה אותם
+                        try:
+                            with metrics.timed("writer.stats"):
+                                stats.record(rows, replaced)
+                        except Exception:
+                            log.exception("preference stats update failed")
+                if batch:
+                    # גיבוי מצטבר — מחוץ לנעילה
+                    try:
+                        with metrics.timed("writer.after_commit"):
+                            self.store.after_commit()
+                    except Exception:
+                        log.exception("after-commit hook failed (%s)", self.store.name)
+            if stop:
+                return
+
+
+_writers: dict[str, SubmissionWriter] = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer(store: SubmissionStore | None = None) -> SubmissionWriter:
+    """הכותב המשותף לתהליך עבור store (נוצר בפעם הראשונה שמבקשים אותו)."""
+    store = store or get_store()
+    with _writers_lock:
+        if store.name not in _writers:
+            _writers[store.name] = SubmissionWriter(store)
+        return _writers[store.name]
+
+
+def submit_row(row: dict, store: SubmissionStore | None = None, timeout: float = 30.0) -> None:
+    """שליחה סינכרונית מבחינת הסשן: חוזר רק אחרי שהשורה נשמרה לדיסק."""
+    with metrics.timed("submit.wait"):
+        get_writer(store).submit(row).result(timeout=timeout)
+
+
+def submit_many(rows: list[dict], store: SubmissionStore | None = None,
+                timeout: float = 300.0) -> list[Exception | None]:
+    """
+    הרבה שורות בבת אחת (ייבוא): כולן נכנסות לתור יחד, כך שהכותב מקבץ אותן לכתיבות של
+    עד MAX_BATCH שורות. מחזיר לכל שורה None (נשמרה) או את החריגה שלה (למשל DuplicateSubmission).
+    """
+    writer = get_writer(store)
+    futures = [writer.submit(row) for row in rows]
+    return [fut.exception(timeout=timeout) for fut in futures]
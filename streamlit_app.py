@@ -1,145 +1,131 @@
 # streamlit_app.py
 # -*- coding: utf-8 -*-
-import csv
-import re
-from io import BytesIO
-from pathlib import Path
+import threading
 from datetime import datetime
+from pathlib import Path
 
 import streamlit as st
-import pandas as pd
+
+# הטופס נטען בלי pandas ובלי מודולי האחסון/הניהול: הם מיובאים רק במסלולים שצריכים אותם
+# (מסך המנהל, שליחה, הכנת התהליך ברקע) — כך העמוד הראשון בתהליך חדש מוצג מהר.
+from shibutz import metrics
+from shibutz import sites as site_catalogue
+
+ASSETS_DIR = Path(__file__).resolve().parent / "assets"
 
 # =========================
 # הגדרות כלליות
 # =========================
 st.set_page_config(page_title="שאלון לסטודנטים – תשפ״ו", layout="centered")
 
-# ====== עיצוב — לפי ה-CSS שביקשת ======
-st.markdown("""
-<style>
-:root{
-  --ink:#0f172a; 
-  --muted:#475569; 
-  --ring:rgba(99,102,241,.25); 
-  --card:rgba(255,255,255,.85);
-}
-html, body, [class*="css"] { font-family: system-ui, "Segoe UI", Arial; }
-.stApp, .main, [data-testid="stSidebar"]{ direction:rtl; text-align:right; }
-[data-testid="stAppViewContainer"]{
-  background:
-    radial-gradient(1200px 600px at 8% 8%, #e0f7fa 0%, transparent 65%),
-    radial-gradient(1000px 500px at 92% 12%, #ede7f6 0%, transparent 60%),
-    radial-gradient(900px 500px at 20% 90%, #fff3e0 0%, transparent 55%);
-}
-.block-container{ padding-top:1.1rem; }
-[data-testid="stForm"]{
-  background:var(--card);
-  border:1px solid #e2e8f0;
-  border-radius:16px;
-  padding:18px 20px;
-  box-shadow:0 8px 24px rgba(2,6,23,.06);
-}
-[data-testid="stWidgetLabel"] p{ text-align:right; margin-bottom:.25rem; color:var(--muted); }
-[data-testid="stWidgetLabel"] p::after{ content: " :"; }
-input, textarea, select{ direction:rtl; text-align:right; }
-</style>
-""", unsafe_allow_html=True)
+# ====== עיצוב — assets/style.css, נקרא פעם אחת לתהליך ======
+@st.cache_resource(show_spinner=False)
+def page_style() -> str:
+    return f"<style>\n{(ASSETS_DIR / 'style.css').read_text(encoding='utf-8')}</style>"
+
+st.markdown(page_style(), unsafe_allow_html=True)
 
 # =========================
 # נתיבים/סודות + התמדה ארוכת טווח
 # =========================
-DATA_DIR   = Path("data")
-BACKUP_DIR = DATA_DIR / "backups"
-DATA_DIR.mkdir(parents=True, exist_ok=True)
-BACKUP_DIR.mkdir(parents=True, exist_ok=True)
-
-CSV_FILE      = DATA_DIR / "שאלון_שיבוץ.csv"         # קובץ ראשי (מצטבר, לעולם לא מתאפס)
-CSV_LOG_FILE  = DATA_DIR / "שאלון_שיבוץ_log.csv"     # יומן הוספות (Append-Only)
 ADMIN_PASSWORD = st.secrets.get("ADMIN_PASSWORD", "rawan_0304")  # מומלץ לשים ב-secrets
 
+@st.cache_resource(show_spinner=False)
+def process_setup(backend: str, policy: str | None) -> dict:
+    """
+    הכנה חד-פעמית לתהליך (ולא בכל ריצה של הסקריפט): תיקיות, store, הכותב המשותף וסנכרון Sheets.
+    רצה ב-thread רקע — העמוד הראשון מוצג בלי לחכות לטעינת pandas ומודולי האחסון.
+    """
+    sheets = dict(st.secrets["sheets"]) if st.secrets.get("sheets") and st.secrets.get("gcp_service_account") else None
+    credentials = dict(st.secrets["gcp_service_account"]) if sheets else None
+    state = {}
+
+    def run():
+        try:
+            from shibutz.backends import get_store
+            from shibutz.storage import ensure_dirs
+            from shibutz.writer import get_writer
+
+            ensure_dirs()
+            store = get_store(backend, policy)
+            get_writer(store)
+            # שיקוף היומן ל-Google Sheets ב-thread רקע — רק אם הוגדר [sheets] + [gcp_service_account]
+            if store.name == "csv" and sheets:
+                from shibutz import sheets_sync
+
+                sheets_sync.start(sheets_sync.GspreadClient(
+                    sheets["key"], sheets.get("worksheet", "Sheet1"), credentials=credentials))
+            state["store"] = store
+        except Exception as e:
+            state["error"] = e
+
+    state["thread"] = threading.Thread(target=run, name="shibutz-setup", daemon=True)
+    state["thread"].start()
+    return state
+
+SETUP = process_setup(st.secrets.get("STORAGE_BACKEND", "csv"),   # "csv" (ברירת מחדל) או "sqlite"
+                      st.secrets.get("DUPLICATE_POLICY"))          # reject / replace / keep_latest (ברירת מחדל)
+
+def get_app_store():
+    """ה-store של התהליך — מחכה לסיום ההכנה אם היא עוד רצה."""
+    SETUP["thread"].join()
+    if "error" in SETUP:
+        process_setup.clear()   # הריצה הבאה תנסה שוב
+        raise SETUP["error"]
+    return SETUP["store"]
+
 # תמיכה בפרמטר admin=1 ב-URL
 is_admin_mode = st.query_params.get("admin", ["0"])[0] == "1"
 # =========================
-# פונקציות עזר (קבצים/ולידציה/ייצוא)
+# פונקציות עזר (ולידציה) — אחסון/ייצוא ב-shibutz/
 # =========================
-def load_csv_safely(path: Path) -> pd.DataFrame:
-    """קריאה חסינה של CSV במספר קידודים, עם דילוג על שורות פגומות במקרה הצורך."""
-    if not path.exists():
-        return pd.DataFrame()
-    attempts = [
-        dict(encoding="utf-8-sig"),
-        dict(encoding="utf-8"),
-        dict(encoding="utf-8-sig", engine="python", on_bad_lines="skip"),
-        dict(encoding="utf-8", engine="python", on_bad_lines="skip"),
-        dict(encoding="latin-1", engine="python", on_bad_lines="skip"),
-    ]
-    for kw in attempts:
-        try:
-            df = pd.read_csv(path, **kw)
-            df.columns = [c.replace("\ufeff", "").strip() for c in df.columns]
-            return df
-        except Exception:
-            continue
-    return pd.DataFrame()
-
-def save_master_dataframe(df: pd.DataFrame) -> None:
+def excel_download(store, which: str, label: str, file_name: str):
     """
-    שמירה אטומית של הקובץ הראשי + גיבוי מתוארך.
-    לעולם לא מוחקים נתונים קיימים – תמיד מצרפים.
+    כפתור הורדה ל-Excel שנבנה רק לפי בקשה: אם כבר יש קובץ מוכן לנתונים הנוכחיים —
+    הורדה ישירה; אחרת כפתור "הכנה" שבונה אותו (פעם אחת לכל דור נתונים).
     """
-    tmp = CSV_FILE.with_suffix(".tmp.csv")
-    df.to_csv(
-        tmp,
-        index=False,
-        encoding="utf-8-sig",
-        quoting=csv.QUOTE_MINIMAL,
-        escapechar="\\",
-        lineterminator="\n",
-    )
-    tmp.replace(CSV_FILE)
-
-    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-    backup_path = BACKUP_DIR / f"שאלון_שיבוץ_{ts}.csv"
-    df.to_csv(
-        backup_path,
-        index=False,
-        encoding="utf-8-sig",
-        quoting=csv.QUOTE_MINIMAL,
-        escapechar="\\",
-        lineterminator="\n",
+    path = exports.cached_export(store, which)
+    if path is None:
+        if not st.button("⚙️ הכנת קובץ Excel", key=f"prep_{which}_xlsx"):
+            return
+        with st.spinner("מכין קובץ Excel..."):
+            path = exports.build_export(store, which)
+    st.download_button(
+        label,
+        data=path.read_bytes(),
+        file_name=file_name,
+        mime=exports.XLSX_MIME,
+        key=f"dl_{which}_xlsx",
     )
 
-def append_to_log(row_df: pd.DataFrame) -> None:
-    """יומן Append-Only — מוסיפים שורות בלבד."""
-    file_exists = CSV_LOG_FILE.exists()
-    row_df.to_csv(
-        CSV_LOG_FILE,
-        mode="a",
-        header=not file_exists,
-        index=False,
-        encoding="utf-8-sig",
-        quoting=csv.QUOTE_MINIMAL,
-        escapechar="\\",
-        lineterminator="\n",
+def admin_grid(df: "pd.DataFrame", key: str, options: dict[str, list[str]] | None = None,
+               default_columns: list[str] | None = None):
+    """טבלה מדופדפת ומסוננת בצד השרת — לדפדפן נשלח עמוד אחד בלבד."""
+    c1, c2 = st.columns([3, 1])
+    search = c1.text_input("חיפוש (שם / ת״ז / טלפון / דוא״ל)", key=f"{key}_search")
+    page_size = c2.selectbox("שורות בעמוד", [25, 50, 100, 200], index=1, key=f"{key}_page_size")
+
+    filters = {}
+    if options is not None:
+        boxes = st.columns(len(query.FILTER_COLS))
+        for box, (label, col) in zip(boxes, query.FILTER_COLS.items()):
+            # אפשרויות הסינון מגיעות מהסטטיסטיקה המצטברת — בלי לסרוק את הטבלה
+            filters[col] = box.multiselect(label, options.get(col, []), key=f"{key}_f_{col}")
+
+    all_cols = list(df.columns)
+    columns = st.multiselect(
+        "עמודות להצגה", all_cols,
+        default=default_columns or [c for c in query.DEFAULT_COLUMNS if c in all_cols] or all_cols[:12],
+        key=f"{key}_cols",
     )
 
-def df_to_excel_bytes(df: pd.DataFrame, sheet: str = "Sheet1") -> bytes:
-    """המרת DataFrame ל-Excel בזיכרון עם התאמת רוחב עמודות."""
-    bio = BytesIO()
-    with pd.ExcelWriter(bio, engine="xlsxwriter") as w:
-        df.to_excel(w, sheet_name=sheet, index=False)
-        ws = w.sheets[sheet]
-        for i, col in enumerate(df.columns):
-            width = 12
-            if not df.empty:
-                width = min(60, max(12, int(df[col].astype(str).map(len).max()) + 4))
-            ws.set_column(i, i, width)
-    bio.seek(0)
-    return bio.read()
-
-def valid_email(v: str) -> bool:  return bool(re.match(r"^[^@]+@[^@]+\.[^@]+$", v.strip()))
-def valid_phone(v: str) -> bool:  return bool(re.match(r"^0\d{1,2}-?\d{6,7}$", v.strip()))   # 050-1234567 / 04-8123456
-def valid_id(v: str) -> bool:     return bool(re.match(r"^\d{8,9}$", v.strip()))
+    filtered = query.filter_frame(df, search, filters)
+    pages = query.page_count(len(filtered), page_size)
+    if st.session_state.get(f"{key}_page", 1) > pages:
+        st.session_state[f"{key}_page"] = 1
+    page_no = st.number_input(f"עמוד (מתוך {pages})", min_value=1, max_value=pages, step=1, key=f"{key}_page")
+    st.caption(f"{len(filtered)} רשומות תואמות")
+    st.dataframe(query.page(filtered, int(page_no), page_size, columns), use_container_width=True)
 
 def show_errors(errors: list[str]):
     if not errors: return
@@ -156,76 +142,210 @@ if is_admin_mode:
     if pwd == ADMIN_PASSWORD:
         st.success("התחברת בהצלחה ✅")
 
-        df_master = load_csv_safely(CSV_FILE)
-        df_log    = load_csv_safely(CSV_LOG_FILE)
+        import pandas as pd
+        from shibutz import backups, exports, importer, integrity, placement, query, sheets_sync, stats, validation
+        from shibutz.storage import BACKUP_DIR, DATA_DIR
+
+        store = get_app_store()
+        with metrics.timed("admin.load_master"):
+            df_master = store.load_master()   # ב-CSV: כולל דחיסת היומן למאסטר
+        with metrics.timed("admin.load_log"):
+            df_log = store.load_log()
+
+        # שורות פגומות שדולגו בקריאה — לא נעלמות בשקט
+        for file_name, bad in store.quarantined().items():
+            st.warning(f"⚠ {len(bad)} שורות פגומות ב-`{file_name}` לא נטענו והועברו לקובץ הסגר.")
+            with st.expander(f"שורות פגומות – {file_name}"):
+                st.dataframe(bad, use_container_width=True)
 
         col1, col2 = st.columns(2)
         with col1:
             st.subheader("📦 קובץ ראשי (מצטבר, לעולם לא נמחק)")
             st.write(f"סה\"כ רשומות: **{len(df_master)}**")
+            st.caption(f"שליחה חוזרת עם אותה ת״ז: {store.duplicate_policy}")
         with col2:
             st.subheader("🧾 קובץ יומן (Append-Only)")
             st.write(f"סה\"כ רשומות ביומן: **{len(df_log)}**")
 
         st.markdown("### הקובץ הראשי")
         if not df_master.empty:
-            st.dataframe(df_master, use_container_width=True)
-            st.download_button(
-                "📊 הורד Excel – קובץ ראשי",
-                data=df_to_excel_bytes(df_master, sheet="Master"),
-                file_name="שאלון_שיבוץ_master.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                key="dl_master_xlsx"
-            )
+            pref = stats.load()
+            cards = st.columns(3)
+            with cards[0]:
+                st.markdown("**שנת לימודים**")
+                st.table(stats.counts_table(pref, "years", 5))
+            with cards[1]:
+                st.markdown("**תחום מוביל**")
+                st.table(stats.counts_table(pref, "top_domains", 5))
+            with cards[2]:
+                st.markdown("**מוסד בעדיפות ראשונה**")
+                st.table(stats.site_demand(pref)[["מוסד", "עדיפות ראשונה"]].head(5))
+            admin_grid(df_master, "grid_master", query.filter_options(pref))
+            excel_download(store, "master", "📊 הורד Excel – קובץ ראשי", "שאלון_שיבוץ_master.xlsx")
         else:
             st.info("⚠ עדיין אין נתונים בקובץ הראשי.")
 
         st.markdown("---")
         st.markdown("### קובץ היומן (Append-Only)")
         if not df_log.empty:
-            st.dataframe(df_log, use_container_width=True)
-            st.download_button(
-                "📊 הורד Excel – יומן הוספות",
-                data=df_to_excel_bytes(df_log, sheet="Log"),
-                file_name="שאלון_שיבוץ_log.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                key="dl_log_xlsx"
-            )
+            admin_grid(df_log, "grid_log")
+            excel_download(store, "log", "📊 הורד Excel – יומן הוספות", "שאלון_שיבוץ_log.xlsx")
         else:
             st.info("⚠ עדיין אין נתונים ביומן.")
 
+        with st.expander("📊 ביקוש למוסדות ולתחומים"):
+            pref = stats.load()
+            st.dataframe(stats.site_demand(pref), hide_index=True, use_container_width=True)
+            st.markdown("**תחומים מועדפים (כל הבחירות)**")
+            st.dataframe(stats.counts_table(pref, "domains"), hide_index=True, use_container_width=True)
+            if pref["rows"] != len(df_master):
+                st.caption(f"הסטטיסטיקה כוללת {pref['rows']} שליחות, בקובץ הראשי יש {len(df_master)} — מומלץ לבנות מחדש.")
+            if st.button("🔄 בנייה מחדש מהקובץ הראשי", key="rebuild_stats"):
+                stats.rebuild(store.load_master)
+                st.rerun()
+
+        with st.expander("✅ בדיקת תקינות לפי כללי הטופס"):
+            st.caption("כל רשומות הקובץ הראשי נבדקות מול אותה סכמת תקינות של הטופס (במעבר אחד על כל הטבלה).")
+            if st.button("▶️ הרץ בדיקה", key="run_validation"):
+                with metrics.timed("admin.validate"):
+                    report = validation.validate_frame(df_master, validation.form_schema(site_catalogue.load().rank_count))
+                st.session_state["validation_report"] = (len(df_master), report)
+            if "validation_report" in st.session_state:
+                checked, report = st.session_state["validation_report"]
+                st.write(f"נמצאו **{len(report)}** רשומות עם שגיאות מתוך **{checked}**.")
+                if not report.empty:
+                    by_message = report[validation.ERRORS_COL].str.split("\n").explode().value_counts()
+                    st.dataframe(by_message.rename_axis("שגיאה").rename("רשומות"), use_container_width=True)
+                    admin_grid(report, "grid_validation", default_columns=list(report.columns))
+
+        with st.expander("📥 ייבוא שליחות מקובץ (CSV / Excel)"):
+            st.caption("טפסי נייר ושליחות מאוחרות: שורה לכל סטודנט, כותרות כמו בקובץ הראשי "
+                       "(או \"מדרגה 1\"…, או עמודה לכל מוסד עם המדרגה). שורות פסולות לא נשמרות ומופיעות בדוח.")
+            upload = st.file_uploader("קובץ לייבוא", type=["csv", "xlsx"], key="import_file")
+            if upload is not None and st.button("📥 ייבוא", key="run_import"):
+                bar = st.progress(0.0, text="מייבא…")
+
+                def import_progress(rows_done: int):
+                    # החלק שנקרא מהקובץ (ב-Excel הקריאה לא רציפה — הערכה בלבד)
+                    bar.progress(min(1.0, upload.tell() / max(upload.size, 1)), text=f"עובדו {rows_done:,} שורות…")
+
+                try:
+                    result = importer.import_file(upload, upload.name, store, progress=import_progress)
+                except importer.ImportTimeout as e:
+                    st.error(f"⏱ הכותב לא אישר את השמירה בזמן: נשמרו {e.result.imported:,} שורות "
+                             f"(מתוך {e.result.total:,} שעובדו), ועוד {e.pending:,} ממתינות בתור ועשויות להישמר. "
+                             "בדקו את הקובץ הראשי לפני ייבוא חוזר.")
+                except (ValueError, ImportError) as e:
+                    st.error(f"❌ הייבוא נכשל: {e}")
+                else:
+                    st.session_state["import_result"] = (upload.name, result.imported, result.total,
+                                                         result.rejected_rows(), result.unmapped)
+                    st.rerun()
+            if "import_result" in st.session_state:
+                name, imported, total, rejected, unmapped = st.session_state["import_result"]
+                st.success(f"`{name}`: יובאו {imported:,} מתוך {total:,} שורות.")
+                if unmapped:
+                    st.warning(f"עמודות שלא זוהו ולא יובאו: {', '.join(unmapped)}")
+                if not rejected.empty:
+                    st.write(f"**{len(rejected):,}** שורות נדחו (מספר השורה — בקובץ, אחרי הכותרת):")
+                    admin_grid(rejected, "grid_import", default_columns=list(rejected.columns))
+                    st.download_button("⬇️ הורד את השורות שנדחו (CSV)",
+                                       data=rejected.to_csv(index=False).encode("utf-8-sig"),
+                                       file_name="ייבוא_נדחו.csv", mime="text/csv", key="dl_import_rejected")
+
+        with st.expander("🧭 שיבוץ אוטומטי לפי הדירוגים"):
+            if df_master.empty:
+                st.caption("אין עדיין נתונים לשיבוץ.")
+            else:
+                st.caption("שיבוץ יציב (Deferred Acceptance) לפי דירוגי הסטודנטים. "
+                           "ערכו את הקיבולת ואת סימוני המוסדות בטבלה ולחצו על הרצה.")
+                capacity = st.data_editor(
+                    placement.default_capacity_table(placement.sites_in(df_master),
+                                                     catalogue=site_catalogue.load().table),
+                    key="placement_capacity", hide_index=True, use_container_width=True,
+                )
+                by_avg = st.checkbox("עדיפות לפי ממוצע (בשוויון — לפי סדר השליחה)", value=True, key="placement_by_avg")
+                if st.button("▶️ הרץ שיבוץ", key="run_placement"):
+                    st.session_state["placement_result"] = placement.run_placement(df_master, capacity, by_avg)
+                if "placement_result" in st.session_state:
+                    result, site_summary = st.session_state["placement_result"]
+                    placed = int((result[placement.ASSIGNED_COL] != "").sum())
+                    st.write(f"שובצו **{placed}** מתוך **{len(result)}** סטודנטים.")
+                    st.dataframe(site_summary, hide_index=True, use_container_width=True)
+                    admin_grid(result, "grid_placement", default_columns=list(result.columns))
+                    st.download_button(
+                        "📊 הורד Excel – שיבוץ",
+                        data=exports.df_to_excel_bytes(result, sheet="Placement"),
+                        file_name="שיבוץ.xlsx",
+                        mime=exports.XLSX_MIME,
+                        key="dl_placement_xlsx",
+                    )
+
         with st.expander("🗂️ גיבויים (קריאה בלבד)"):
-            backups = sorted(BACKUP_DIR.glob("שאלון_שיבוץ_*.csv"))
-            if backups:
-                st.write(f"נמצאו {len(backups)} גיבויים בתיקייה: `{BACKUP_DIR}`")
-                st.write("\n".join(b.name for b in backups[-12:]))
+            points = backups.restore_points()   # מקובץ האינדקס — בלי לסרוק את התיקייה
+            if points:
+                st.write(f"נמצאו {len(points)} נקודות שחזור בתיקייה: `{BACKUP_DIR}`")
+                st.write("\n".join(f"{p['created']} · {'מלא' if p['kind'] == 'full' else 'דלתא'} · {p['file']}" for p in points[:12]))
+                st.caption("שחזור לנקודת זמן: `python -m shibutz.backups restore --at \"YYYY-MM-DD HH:MM\" --out restored.csv`")
             else:
                 st.caption("אין עדיין גיבויים.")
+
+        if store.name == "csv":
+            with st.expander("🩺 שלמות הנתונים – קובץ ראשי מול יומן"):
+                st.caption("השוואת גיבוב לכל שורה בין הקובץ הראשי ליומן, במעבר אחד במקטעים. "
+                           "תיקון: שורות שקיימות רק בקובץ הראשי נוספות ליומן, והקובץ הראשי נבנה מחדש מהיומן "
+                           "(עם גיבוי מלא לפני ואחרי).")
+                dedupe = store.duplicate_policy == "replace"
+                col_check, col_repair = st.columns(2)
+                if col_check.button("🔍 בדיקה", key="run_integrity"):
+                    st.session_state["integrity_report"] = integrity.check(dedupe).lines()
+                if col_repair.button("🛠️ תיקון ובנייה מחדש", key="run_repair"):
+                    report, appended, rows = integrity.repair(dedupe)
+                    st.session_state["integrity_report"] = report.lines() + (
+                        [] if report.ok and report.same_order
+                        else [f"נוספו ליומן {appended:,} שורות; הקובץ הראשי נבנה מחדש: {rows:,} שורות"])
+                    st.rerun()
+                if "integrity_report" in st.session_state:
+                    st.write("  \n".join(st.session_state["integrity_report"]))
+                st.caption("גם משורת הפקודה: `python -m shibutz.integrity check|repair`")
+
+        sync = sheets_sync.worker()
+        if sync is not None:
+            with st.expander("🔄 סנכרון Google Sheets"):
+                last = datetime.fromtimestamp(sync.last_sync).strftime("%Y-%m-%d %H:%M:%S") if sync.last_sync else "עדיין לא"
+                st.write(f"סנכרון אחרון: {last} · ממתינים לשליחה: {sync.pending_bytes():,} בתים")
+                if sync.last_error:
+                    st.warning(f"הניסיון האחרון נכשל (ינסה שוב): {sync.last_error}")
+
+        with st.expander("⏱️ ביצועים"):
+            st.caption(f"זמני השלבים האחרונים בתהליך הזה (עד {metrics.RING_SIZE} דגימות). "
+                       f"ההיסטוריה נשמרת גם ב-`{metrics.METRICS_FILE}`.")
+            st.dataframe(metrics.summary(), hide_index=True, use_container_width=True)
+            st.write(f"שורות: קובץ ראשי **{len(df_master):,}** · יומן **{len(df_log):,}**")
+            st.dataframe(metrics.file_sizes(DATA_DIR), hide_index=True, use_container_width=True)
     else:
         if pwd:
             st.error("סיסמה שגויה")
     st.stop()
 
 # =========================
-# רשימת שירותים לדירוג — 10 פריטים
+# רשימת שירותים לדירוג — מקטלוג המוסדות (sites.json), נטען פעם אחת לתהליך
 # =========================
-SITES = [
-    "כפר הילדים חורפיש",
-    "אנוש כרמיאל",
-    "הפוך על הפוך צפת",
-    "שירות מבחן לנוער עכו",
-    "כלא חרמון",
-    "בית חולים זיו",
-    "שירותי רווחה קריית שמונה",
-    "מרכז יום לגיל השלישי",
-    "מועדונית נוער בצפת",
-    "מרפאת בריאות הנפש צפת",
-]
-RANK_COUNT = len(SITES)  # 10
+catalogue = site_catalogue.load()
+SITES = catalogue.sites
+RANK_COUNT = catalogue.rank_count
 
 # =========================
 # טופס — טאבים
 # =========================
+# כל טאב הוא fragment: שינוי בווידג'ט מריץ מחדש רק את הטאב שלו (ורשת הדירוג — רק את עצמה),
+# ולא את כל הקובץ. הערכים נקראים מ-session_state לפי מפתחות הווידג'טים.
+PLACEHOLDER = "— בחר/י —"
+
+def field(key: str, default=""):
+    """ערך ווידג'ט של הטופס (ברירת מחדל — לשדה מותנה שלא הוצג)."""
+    return st.session_state.get(key, default)
+
 st.title("📋 שאלון שיבוץ סטודנטים – שנת הכשרה תשפ״ו")
 st.caption("מלאו/מלאי את כל הסעיפים. השדות המסומנים ב-* הינם חובה.")
 
@@ -236,302 +356,320 @@ tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
 ])
 
 # --- סעיף 1 ---
-with tab1:
+@st.fragment
+def section_personal():
     st.subheader("פרטים אישיים של הסטודנט/ית")
-    first_name = st.text_input("שם פרטי *")
-    last_name  = st.text_input("שם משפחה *")
-    nat_id     = st.text_input("מספר תעודת זהות *")
-    gender = st.radio("מין *", ["זכר","נקבה"], horizontal=True)
-    social_affil = st.selectbox("שיוך חברתי *", ["יהודי/ה","מוסלמי/ת","נוצרי/ה","דרוזי/ת"])
-    mother_tongue = st.selectbox("שפת אם *", ["עברית","ערבית","רוסית","אחר..."])
-    other_mt = st.text_input("ציין/ני שפת אם אחרת *") if mother_tongue == "אחר..." else ""
+    st.text_input("שם פרטי *", key="first_name")
+    st.text_input("שם משפחה *", key="last_name")
+    st.text_input("מספר תעודת זהות *", key="nat_id")
+    st.radio("מין *", ["זכר","נקבה"], horizontal=True, key="gender")
+    st.selectbox("שיוך חברתי *", ["יהודי/ה","מוסלמי/ת","נוצרי/ה","דרוזי/ת"], key="social_affil")
+    mother_tongue = st.selectbox("שפת אם *", ["עברית","ערבית","רוסית","אחר..."], key="mother_tongue")
+    if mother_tongue == "אחר...":
+        st.text_input("ציין/ני שפת אם אחרת *", key="other_mt")
     extra_langs = st.multiselect(
         "ציין/י שפות נוספות (ברמת שיחה) *",
         ["עברית","ערבית","רוסית","אמהרית","אנגלית","ספרדית","אחר..."],
-        placeholder="בחר/י שפות נוספות"
+        placeholder="בחר/י שפות נוספות", key="extra_langs"
     )
-    extra_langs_other = st.text_input("ציין/י שפה נוספת (אחר) *") if "אחר..." in extra_langs else ""
-    phone   = st.text_input("מספר טלפון נייד * (למשל 050-1234567)")
-    address = st.text_input("כתובת מלאה (כולל יישוב) *")
-    email   = st.text_input("כתובת דוא״ל *")
+    if "אחר..." in extra_langs:
+        st.text_input("ציין/י שפה נוספת (אחר) *", key="extra_langs_other")
+    st.text_input("מספר טלפון נייד * (למשל 050-1234567)", key="phone")
+    st.text_input("כתובת מלאה (כולל יישוב) *", key="address")
+    st.text_input("כתובת דוא״ל *", key="email")
     study_year = st.selectbox("שנת הלימודים *", [
         "תואר ראשון - שנה א'", "תואר ראשון - שנה ב'", "תואר ראשון - שנה ג'",
         "הסבה א'", "הסבה ב'", "אחר..."
-    ])
-    study_year_other = st.text_input("ציין/י שנה/מסלול אחר *") if study_year == "אחר..." else ""
-    track = st.text_input("מסלול לימודים / תואר *")
+    ], key="study_year")
+    if study_year == "אחר...":
+        st.text_input("ציין/י שנה/מסלול אחר *", key="study_year_other")
+    st.text_input("מסלול לימודים / תואר *", key="track")
     mobility = st.selectbox("אופן ההגעה להתמחות (ניידות) *", [
         "אוכל להיעזר ברכב / ברשותי רכב",
         "אוכל להגיע בתחבורה ציבורית",
         "אחר..."
-    ])
-    mobility_other = st.text_input("פרט/י אחר לגבי ניידות *") if mobility == "אחר..." else ""
+    ], key="mobility")
+    if mobility == "אחר...":
+        st.text_input("פרט/י אחר לגבי ניידות *", key="mobility_other")
+
+with tab1:
+    section_personal()
 
 # --- סעיף 2 ---
-with tab2:
+def on_rank_change(rank_i: int):
+    """
+    הבחירה במדרגה i היא ערך הווידג'ט rank_i עצמו (מקור אמת יחיד, בלי עותק נוסף ב-session_state).
+    אם המוסד כבר נבחר במדרגה מאוחרת יותר — הבחירה המאוחרת מתאפסת (לכל היותר אחת, כי אין
+    כפילויות), וכך הכלל "קדימה בלבד" נשמר בלי מעבר נורמליזציה על כל המדרגות.
+    """
+    site = st.session_state[f"rank_{rank_i}"]
+    if site == PLACEHOLDER:
+        return
+    for j in range(rank_i + 1, RANK_COUNT + 1):
+        if st.session_state.get(f"rank_{j}") == site:
+            st.session_state[f"rank_{j}"] = PLACEHOLDER
+            break
+
+@st.fragment
+def ranking_grid():
+    # רנדרינג של המדרגות עם סינון קדימה: למדרגה i — מוסדות שלא נבחרו ב-1..i-1
+    # (ועוד הבחירה הנוכחית). הקבוצה "נבחרו לפני" נבנית תוך כדי המעבר — O(מוסדות) למדרגה.
+    cols = st.columns(2)
+    chosen_before = set()
+    for i in range(1, RANK_COUNT + 1):
+        current = st.session_state.setdefault(f"rank_{i}", PLACEHOLDER)
+        opts = [PLACEHOLDER] + [s for s in SITES if s not in chosen_before or s == current]
+        with cols[(i - 1) % 2]:
+            # הערך מגיע מ-session_state (rank_i) — בלי index, כדי שלא יהיו שני מקורות לבחירה
+            st.selectbox(
+                f"מדרגה {i} (בחר/י מוסד)*",
+                options=opts,
+                key=f"rank_{i}",
+                on_change=on_rank_change, args=(i,),
+            )
+        if current != PLACEHOLDER:
+            chosen_before.add(current)
+
+@st.fragment
+def section_preferences():
     st.subheader("העדפת שיבוץ")
 
-    prev_training = st.selectbox("האם עברת הכשרה מעשית בשנה קודמת? *", ["כן","לא","אחר..."])
-    prev_place = prev_mentor = prev_partner = ""
+    prev_training = st.selectbox("האם עברת הכשרה מעשית בשנה קודמת? *", ["כן","לא","אחר..."], key="prev_training")
     if prev_training in ["כן","אחר..."]:
-        prev_place  = st.text_input("אם כן, נא ציין שם מקום ותחום ההתמחות *")
-        prev_mentor = st.text_input("שם המדריך והמיקום הגיאוגרפי של ההכשרה *")
-        prev_partner= st.text_input("מי היה/תה בן/בת הזוג להתמחות בשנה הקודמת? *")
+        st.text_input("אם כן, נא ציין שם מקום ותחום ההתמחות *", key="prev_place")
+        st.text_input("שם המדריך והמיקום הגיאוגרפי של ההכשרה *", key="prev_mentor")
+        st.text_input("מי היה/תה בן/בת הזוג להתמחות בשנה הקודמת? *", key="prev_partner")
 
     all_domains = ["קהילה","מוגבלות","זקנה","ילדים ונוער","בריאות הנפש","שיקום","משפחה","נשים","בריאות","תָקוֹן","אחר..."]
-    chosen_domains = st.multiselect("בחרו עד 3 תחומים *", all_domains, max_selections=3, placeholder="בחר/י עד שלושה תחומים")
-    domains_other = st.text_input("פרט/י תחום אחר *") if "אחר..." in chosen_domains else ""
-    top_domain = st.selectbox(
+    chosen_domains = st.multiselect("בחרו עד 3 תחומים *", all_domains, max_selections=3,
+                                    placeholder="בחר/י עד שלושה תחומים", key="chosen_domains")
+    if "אחר..." in chosen_domains:
+        st.text_input("פרט/י תחום אחר *", key="domains_other")
+    st.selectbox(
         "מה התחום הכי מועדף עליך, מבין שלושתם? *",
-        ["— בחר/י —"] + chosen_domains if chosen_domains else ["— בחר/י —"]
+        [PLACEHOLDER] + chosen_domains if chosen_domains else [PLACEHOLDER],
+        key="top_domain"
     )
 
-    st.markdown("**בחר/י מוסד לכל מדרגה דירוג (1 = הכי רוצים, 10 = הכי פחות). הבחירה כובלת קדימה — מוסדות שנבחרו ייעלמו מהמדרגות הבאות.**")
+    st.markdown(f"**בחר/י מוסד לכל מדרגה דירוג (1 = הכי רוצים, {RANK_COUNT} = הכי פחות). הבחירה כובלת קדימה — מוסדות שנבחרו ייעלמו מהמדרגות הבאות.**")
+    ranking_grid()
 
-    # אתחול מצב הבחירות
-    for i in range(1, RANK_COUNT + 1):
-        st.session_state.setdefault(f"rank_{i}", "— בחר/י —")
-
-    def options_for_rank(rank_i: int) -> list:
-        """
-        מחזיר רשימת אפשרויות למדרגה i:
-        רק מוסדות שטרם נבחרו במדרגות 1..i-1, ועוד הבחירה הנוכחית (אם קיימת),
-        כך שהכפילות נמנעת כיוונית (קדימה) בלבד.
-        """
-        current = st.session_state.get(f"rank_{rank_i}", "— בחר/י —")
-        chosen_before = {
-            st.session_state.get(f"rank_{j}")
-            for j in range(1, rank_i)  # רק מדרגות קודמות
-        }
-        # בונים רשימה: "— בחר/י —" + כל מוסד שלא נבחר לפני, או שהוא הבחירה הנוכחית
-        base = ["— בחר/י —"] + [s for s in SITES if (s not in chosen_before or s == current)]
-        # שומרים על סדר SITES:
-        ordered = ["— בחר/י —"] + [s for s in SITES if s in base]
-        return ordered
-
-    # רנדרינג של המדרגות עם סינון קדימה
-    cols = st.columns(2)
-    for i in range(1, RANK_COUNT + 1):
-        with cols[(i - 1) % 2]:
-            opts = options_for_rank(i)
-            current = st.session_state.get(f"rank_{i}", "— בחר/י —")
-            st.session_state[f"rank_{i}"] = st.selectbox(
-                f"מדרגה {i} (בחר/י מוסד)*",
-                options=opts,
-                index=opts.index(current) if current in opts else 0,
-                key=f"rank_{i}_select"
-            )
-            # מאחדים תחת מפתח קבוע
-            st.session_state[f"rank_{i}"] = st.session_state[f"rank_{i}_select"]
-
-    # נורמליזציה: אם שינית מדרגה מוקדמת והתנגשת עם בחירה מאוחרת — ננקה את המאוחרת
-    used = set()
-    for i in range(1, RANK_COUNT + 1):
-        sel = st.session_state.get(f"rank_{i}", "— בחר/י —")
-        if sel != "— בחר/י —":
-            if sel in used:
-                # בחירה כפולה שהתגלתה בגלל שינוי מוקדם -> איפוס המאוחרת
-                st.session_state[f"rank_{i}"] = "— בחר/י —"
-                st.session_state[f"rank_{i}_select"] = "— בחר/י —"
-            else:
-                used.add(sel)
+    st.text_area("האם קיימת בקשה מיוחדת הקשורה למיקום או תחום ההתמחות? *", height=100, key="special_request")
 
-    special_request = st.text_area("האם קיימת בקשה מיוחדת הקשורה למיקום או תחום ההתמחות? *", height=100)
+with tab2:
+    section_preferences()
 
 # --- סעיף 3 ---
-with tab3:
+@st.fragment
+def section_academic():
     st.subheader("נתונים אקדמיים")
-    avg_grade = st.number_input("ממוצע ציונים *", min_value=0.0, max_value=100.0, step=0.1)
+    st.number_input("ממוצע ציונים *", min_value=0.0, max_value=100.0, step=0.1, key="avg_grade")
+
+with tab3:
+    section_academic()
 
 # --- סעיף 4 ---
-with tab4:
+@st.fragment
+def section_adjustments():
     st.subheader("התאמות רפואיות, אישיות וחברתיות")
     adjustments = st.multiselect(
         "סוגי התאמות (ניתן לבחור כמה) *",
         ["הריון","מגבלה רפואית (למשל: מחלה כרונית, אוטואימונית)","רגישות למרחב רפואי (למשל: לא לשיבוץ בבית חולים)",
          "אלרגיה חמורה","נכות","רקע משפחתי רגיש (למשל: בן משפחה עם פגיעה נפשית)","אחר..."],
-        placeholder="בחר/י אפשרויות התאמה"
+        placeholder="בחר/י אפשרויות התאמה", key="adjustments"
     )
-    adjustments_other = st.text_input("פרט/י התאמה אחרת *") if "אחר..." in adjustments else ""
-    adjustments_details = st.text_area("פרט: *", height=100)
+    if "אחר..." in adjustments:
+        st.text_input("פרט/י התאמה אחרת *", key="adjustments_other")
+    st.text_area("פרט: *", height=100, key="adjustments_details")
+
+with tab4:
+    section_adjustments()
 
 # --- סעיף 5 ---
-with tab5:
+LIKERT = ["בכלל לא מסכים/ה","1","2","3","4","מסכים/ה מאוד"]
+
+@st.fragment
+def section_motivation():
     st.subheader("מוטיבציה")
-    likert = ["בכלל לא מסכים/ה","1","2","3","4","מסכים/ה מאוד"]
-    m1 = st.radio("1) מוכן/ה להשקיע מאמץ נוסף להגיע למקום המועדף *", likert, horizontal=True)
-    m2 = st.radio("2) ההכשרה המעשית חשובה לי כהזדמנות משמעותית להתפתחות *", likert, horizontal=True)
-    m3 = st.radio("3) אהיה מחויב/ת להגיע בזמן ולהתמיד גם בתנאים מאתגרים *", likert, horizontal=True)
+    st.radio("1) מוכן/ה להשקיע מאמץ נוסף להגיע למקום המועדף *", LIKERT, horizontal=True, key="m1")
+    st.radio("2) ההכשרה המעשית חשובה לי כהזדמנות משמעותית להתפתחות *", LIKERT, horizontal=True, key="m2")
+    st.radio("3) אהיה מחויב/ת להגיע בזמן ולהתמיד גם בתנאים מאתגרים *", LIKERT, horizontal=True, key="m3")
+
+with tab5:
+    section_motivation()
 
 # --- סעיף 6 (סיכום ושליחה) ---
-with tab6:
-    st.subheader("סיכום ושליחה")
-    st.markdown("בדקו את התקציר. אם יש טעות – חזרו לטאב המתאים, תקנו וחזרו לכאן. לאחר אישור ולחיצה על **שליחה** המידע יישמר.")
+def joined(items: list, other_key: str) -> str:
+    """בחירות מרובות + פירוט "אחר..." למחרוזת אחת."""
+    return "; ".join([x for x in items if x != "אחר..."] + ([field(other_key).strip()] if "אחר..." in items else []))
 
-    # מיפוי מדרגה->מוסד + מוסד->מדרגה
-    rank_to_site = {i: st.session_state.get(f"rank_{i}", "— בחר/י —") for i in range(1, RANK_COUNT + 1)}
-    site_to_rank = {s: None for s in SITES}
-    for i, s in rank_to_site.items():
-        if s and s != "— בחר/י —":
-            site_to_rank[s] = i
+def chosen(value_key: str, other_key: str) -> str:
+    """בחירה יחידה, או הפירוט שלה כשנבחר "אחר..."."""
+    value = field(value_key)
+    return field(other_key).strip() if value == "אחר..." else value
+
+def show_summary():
+    """טבלאות התקציר — נבנות רק כשמבקשים להציג אותן."""
+    import pandas as pd
+
+    # מיפוי מדרגה->מוסד
+    rank_to_site = {i: field(f"rank_{i}", PLACEHOLDER) for i in range(1, RANK_COUNT + 1)}
 
     st.markdown("### 📍 העדפות שיבוץ (1=הכי רוצים)")
-    summary_pairs = [f"{rank_to_site[i]} – {i}" if rank_to_site[i] != "— בחר/י —" else f"(לא נבחר) – {i}"
+    summary_pairs = [f"{rank_to_site[i]} – {i}" if rank_to_site[i] != PLACEHOLDER else f"(לא נבחר) – {i}"
                      for i in range(1, RANK_COUNT + 1)]
     st.table(pd.DataFrame({"דירוג": summary_pairs}))
 
     st.markdown("### 🧑‍💻 פרטים אישיים")
     st.table(pd.DataFrame([{
-        "שם פרטי": first_name, "שם משפחה": last_name, "ת״ז": nat_id, "מין": gender,
-        "שיוך חברתי": social_affil,
-        "שפת אם": (other_mt if mother_tongue == "אחר..." else mother_tongue),
-        "שפות נוספות": "; ".join([x for x in extra_langs if x != "אחר..."] + ([extra_langs_other] if "אחר..." in extra_langs else [])),
-        "טלפון": phone, "כתובת": address, "אימייל": email,
-        "שנת לימודים": (study_year_other if study_year == "אחר..." else study_year),
-        "מסלול לימודים": track,
-        "ניידות": (mobility_other if mobility == "אחר..." else mobility),
+        "שם פרטי": field("first_name"), "שם משפחה": field("last_name"), "ת״ז": field("nat_id"),
+        "מין": field("gender"),
+        "שיוך חברתי": field("social_affil"),
+        "שפת אם": chosen("mother_tongue", "other_mt"),
+        "שפות נוספות": joined(field("extra_langs", []), "extra_langs_other"),
+        "טלפון": field("phone"), "כתובת": field("address"), "אימייל": field("email"),
+        "שנת לימודים": chosen("study_year", "study_year_other"),
+        "מסלול לימודים": field("track"),
+        "ניידות": chosen("mobility", "mobility_other"),
     }]).T.rename(columns={0: "ערך"}))
 
     st.markdown("### 🎓 נתונים אקדמיים")
-    st.table(pd.DataFrame([{"ממוצע ציונים": avg_grade}]).T.rename(columns={0: "ערך"}))
+    st.table(pd.DataFrame([{"ממוצע ציונים": field("avg_grade", 0.0)}]).T.rename(columns={0: "ערך"}))
 
     st.markdown("### 🧪 התאמות")
     st.table(pd.DataFrame([{
-        "התאמות": "; ".join([a for a in adjustments if a != "אחר..."] + ([adjustments_other] if "אחר..." in adjustments else [])),
-        "פירוט התאמות": adjustments_details,
+        "התאמות": joined(field("adjustments", []), "adjustments_other"),
+        "פירוט התאמות": field("adjustments_details"),
     }]).T.rename(columns={0: "ערך"}))
 
     st.markdown("### 🔥 מוטיבציה")
-    st.table(pd.DataFrame([{"מוכנות להשקיע מאמץ": m1, "חשיבות ההכשרה": m2, "מחויבות והתמדה": m3}]).T.rename(columns={0: "ערך"}))
-
-    st.markdown("---")
-    confirm = st.checkbox("אני מאשר/ת כי המידע שמסרתי נכון ומדויק, וידוע לי שאין התחייבות להתאמה מלאה לבחירותיי. *")
-    submitted = st.button("שליחה ✉️")
+    st.table(pd.DataFrame([{"מוכנות להשקיע מאמץ": field("m1"), "חשיבות ההכשרה": field("m2"),
+                            "מחויבות והתמדה": field("m3")}]).T.rename(columns={0: "ערך"}))
 
 # =========================
 # ולידציה + שמירה
 # =========================
-if submitted:
+@metrics.timed("submit.handler")
+def validate_and_save():
+    from shibutz import validation
+    from shibutz.id_index import DuplicateSubmission
+    from shibutz.writer import submit_row
+
+    store = get_app_store()
+    first_name, last_name, nat_id = field("first_name"), field("last_name"), field("nat_id")
+    mother_tongue, other_mt = field("mother_tongue"), field("other_mt")
+    extra_langs, extra_langs_other = field("extra_langs", []), field("extra_langs_other")
+    phone, address, email = field("phone"), field("address"), field("email")
+    study_year, study_year_other = field("study_year"), field("study_year_other")
+    track, mobility, mobility_other = field("track"), field("mobility"), field("mobility_other")
+    prev_training = field("prev_training")
+    prev_place, prev_mentor, prev_partner = field("prev_place"), field("prev_mentor"), field("prev_partner")
+    chosen_domains, domains_other = field("chosen_domains", []), field("domains_other")
+    top_domain, special_request = field("top_domain"), field("special_request")
+    avg_grade = field("avg_grade", 0.0)
+    adjustments, adjustments_other = field("adjustments", []), field("adjustments_other")
+    adjustments_details = field("adjustments_details")
+    m1, m2, m3 = field("m1"), field("m2"), field("m3")
+    confirm = field("confirm", False)
+
+    # בדיקות על מצב הווידג'טים (לא נשמרות בשורה) — השאר לפי סכמת התקינות
     errors = []
-
-    # סעיף 1 — בסיסי
-    if not first_name.strip(): errors.append("סעיף 1: יש למלא שם פרטי.")
-    if not last_name.strip():  errors.append("סעיף 1: יש למלא שם משפחה.")
-    if not valid_id(nat_id):   errors.append("סעיף 1: ת״ז חייבת להיות 8–9 ספרות.")
     if mother_tongue == "אחר..." and not other_mt.strip():
         errors.append("סעיף 1: יש לציין שפת אם (אחר).")
-    if not extra_langs or ("אחר..." in extra_langs and not extra_langs_other.strip()):
+    if "אחר..." in extra_langs and not extra_langs_other.strip():
         errors.append("סעיף 1: יש לבחור שפות נוספות (ואם 'אחר' – לפרט).")
-    if not valid_phone(phone): errors.append("סעיף 1: מספר טלפון אינו תקין.")
-    if not address.strip():    errors.append("סעיף 1: יש למלא כתובת מלאה.")
-    if not valid_email(email): errors.append("סעיף 1: כתובת דוא״ל אינה תקינה.")
     if study_year == "אחר..." and not study_year_other.strip():
         errors.append("סעיף 1: יש לפרט שנת לימודים (אחר).")
-    if not track.strip(): errors.append("סעיף 1: יש למלא מסלול לימודים/תואר.")
     if mobility == "אחר..." and not mobility_other.strip():
         errors.append("סעיף 1: יש לפרט ניידות (אחר).")
-
-    # סעיף 2 — דירוג חובה 1..10 ללא כפילויות
-    rank_to_site = {i: st.session_state.get(f"rank_{i}", "— בחר/י —") for i in range(1, RANK_COUNT + 1)}
-    missing = [i for i, s in rank_to_site.items() if s == "— בחר/י —"]
-    if missing:
-        errors.append(f"סעיף 2: יש לבחור מוסד לכל מדרגה. חסר/ים: {', '.join(map(str, missing))}.")
-    chosen_sites = [s for s in rank_to_site.values() if s != "— בחר/י —"]
-    if len(set(chosen_sites)) != len(chosen_sites):
-        errors.append("סעיף 2: קיימת כפילות בבחירת מוסדות. כל מוסד יכול להופיע פעם אחת בלבד.")
-
-    if prev_training in ["כן","אחר..."]:
-        if not prev_place.strip():  errors.append("סעיף 2: יש למלא מקום/תחום אם הייתה הכשרה קודמת.")
-        if not prev_mentor.strip(): errors.append("סעיף 2: יש למלא שם מדריך ומיקום.")
-        if not prev_partner.strip():errors.append("ಸעיף 2: יש למלא בן/בת זוג להתמחות.")
-
-    if not chosen_domains:
-        errors.append("סעיף 2: יש לבחור עד 3 תחומים (לפחות אחד).")
     if "אחר..." in chosen_domains and not domains_other.strip():
         errors.append("סעיף 2: נבחר 'אחר' – יש לפרט תחום.")
-    if chosen_domains and (top_domain not in chosen_domains):
-        errors.append("סעיף 2: יש לבחור תחום מוביל מתוך השלושה.")
-
-    if not special_request.strip():
-        errors.append("סעיף 2: יש לציין בקשה מיוחדת (אפשר 'אין').")
-
-    # סעיף 3
-    if avg_grade is None or avg_grade <= 0:
-        errors.append("סעיף 3: יש להזין ממוצע ציונים גדול מ-0.")
-
-    # סעיף 4
-    if not adjustments:
-        errors.append("סעיף 4: יש לבחור לפחות סוג התאמה אחד (או לציין 'אין').")
     if "אחר..." in adjustments and not adjustments_other.strip():
         errors.append("סעיף 4: נבחר 'אחר' – יש לפרט התאמה.")
-    if not adjustments_details.strip():
-        errors.append("סעיף 4: יש לפרט התייחסות להתאמות (אפשר 'אין').")
-
-    # סעיף 5
-    if not (m1 and m2 and m3):
-        errors.append("סעיף 5: יש לענות על שלוש שאלות המוטיבציה.")
-
-    # סעיף 6
     if not confirm:
         errors.append("סעיף 6: יש לאשר את ההצהרה.")
 
-    if errors:
-        show_errors(errors)
-    else:
-        # מפות דירוג לשמירה
-        site_to_rank = {s: None for s in SITES}
-        for i in range(1, RANK_COUNT + 1):
-            site = st.session_state.get(f"rank_{i}")
+    # מפות דירוג לשמירה
+    rank_to_site = {i: field(f"rank_{i}", PLACEHOLDER) for i in range(1, RANK_COUNT + 1)}
+    rank_to_site = {i: ("" if s == PLACEHOLDER else s) for i, s in rank_to_site.items()}
+    site_to_rank = {s: None for s in SITES}
+    for i, site in rank_to_site.items():
+        if site in site_to_rank:
             site_to_rank[site] = i
 
-        # בניית שורה לשמירה (שימי לב: אין שבירת מחרוזות בעברית)
-        row = {
-            "תאריך_שליחה": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "שם_פרטי": first_name.strip(),
-            "שם_משפחה": last_name.strip(),
-            "תעודת_זהות": nat_id.strip(),
-            "מין": gender,
-            "שיוך_חברתי": social_affil,
-            "שפת_אם": (other_mt.strip() if mother_tongue == "אחר..." else mother_tongue),
-            "שפות_נוספות": "; ".join([x for x in extra_langs if x != "אחר..."] + ([extra_langs_other.strip()] if "אחר..." in extra_langs else [])),
-            "טלפון": phone.strip(),
-            "כתובת": address.strip(),
-            "אימייל": email.strip(),
-            "שנת_לימודים": (study_year_other.strip() if study_year == "אחר..." else study_year),
-            "מסלול_לימודים": track.strip(),
-            "ניידות": (mobility_other.strip() if mobility == "אחר..." else mobility),
-            "הכשרה_קודמת": prev_training,
-            "הכשרה_קודמת_מקום_ותחום": prev_place.strip(),
-            "הכשרה_קודמת_מדריך_ומיקום": prev_mentor.strip(),
-            "הכשרה_קודמת_בן_זוג": prev_partner.strip(),
-            "תחומים_מועדפים": "; ".join([d for d in chosen_domains if d != "אחר..."] + ([domains_other.strip()] if "אחר..." in chosen_domains else [])),
-            "תחום_מוביל": (top_domain if top_domain and top_domain != "— בחר/י —" else ""),
-            "בקשה_מיוחדת": special_request.strip(),
-            "ממוצע": avg_grade,
-            "התאמות": "; ".join([a for a in adjustments if a != "אחר..."] + ([adjustments_other.strip()] if "אחר..." in adjustments else [])),
-            "התאמות_פרטים": adjustments_details.strip(),
-            "מוטיבציה_1": m1,
-            "מוטיבציה_2": m2,
-            "מוטיבציה_3": m3,
-        }
-
-        # הוספת שדות דירוג:
-        # 1) Rank_i -> Site (מוסד שנבחר לכל מדרגה)
-        for i in range(1, RANK_COUNT + 1):
-            row[f"דירוג_מדרגה_{i}_מוסד"] = st.session_state.get(f"rank_{i}")
-        # 2) Site -> Rank (לשימוש נוח ב-Excel)
-        for s in SITES:
-            row[f"דירוג_{s}"] = site_to_rank[s]
+    # בניית שורה לשמירה (שימי לב: אין שבירת מחרוזות בעברית)
+    row = {
+        "תאריך_שליחה": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "שם_פרטי": first_name.strip(),
+        "שם_משפחה": last_name.strip(),
+        "תעודת_זהות": nat_id.strip(),
+        "מין": field("gender"),
+        "שיוך_חברתי": field("social_affil"),
+        "שפת_אם": chosen("mother_tongue", "other_mt"),
+        "שפות_נוספות": joined(extra_langs, "extra_langs_other"),
+        "טלפון": phone.strip(),
+        "כתובת": address.strip(),
+        "אימייל": email.strip(),
+        "שנת_לימודים": chosen("study_year", "study_year_other"),
+        "מסלול_לימודים": track.strip(),
+        "ניידות": chosen("mobility", "mobility_other"),
+        "הכשרה_קודמת": prev_training,
+        "הכשרה_קודמת_מקום_ותחום": prev_place.strip(),
+        "הכשרה_קודמת_מדריך_ומיקום": prev_mentor.strip(),
+        "הכשרה_קודמת_בן_זוג": prev_partner.strip(),
+        "תחומים_מועדפים": joined(chosen_domains, "domains_other"),
+        "תחום_מוביל": (top_domain if top_domain and top_domain != PLACEHOLDER else ""),
+        "בקשה_מיוחדת": special_request.strip(),
+        "ממוצע": avg_grade,
+        "התאמות": joined(adjustments, "adjustments_other"),
+        "התאמות_פרטים": adjustments_details.strip(),
+        "מוטיבציה_1": m1,
+        "מוטיבציה_2": m2,
+        "מוטיבציה_3": m3,
+    }
+
+    # הוספת שדות דירוג:
+    # 1) Rank_i -> Site (מוסד שנבחר לכל מדרגה)
+    for i in range(1, RANK_COUNT + 1):
+        row[f"דירוג_מדרגה_{i}_מוסד"] = rank_to_site[i]
+    # 2) Site -> Rank (לשימוש נוח ב-Excel)
+    for s in SITES:
+        row[f"דירוג_{s}"] = site_to_rank[s]
+
+    # הודעה שגם הסכמה וגם בדיקת הווידג'טים מעלות (למשל שפות נוספות) — פעם אחת
+    errors = list(dict.fromkeys(validation.validate_row(row, validation.form_schema(RANK_COUNT)) + errors))
+    if (store.duplicate_policy == "reject" and validation.ID_RE.fullmatch(row["תעודת_זהות"])
+            and store.has_id(nat_id)):
+        errors.append("סעיף 1: כבר התקבלה שליחה עם ת״ז זו.")
+    if errors:
+        show_errors(sorted(errors, key=lambda e: e.split(":")[0]))   # לפי סעיף, בסדר הכללים
+        return
+
+    try:
+        # הוספה ליומן Append-Only דרך הכותב המשותף (תור + Group Commit);
+        # חוזר רק אחרי שהשורה נשמרה לדיסק. המאסטר נבנה מהיומן בדחיסה.
+        submit_row(row, store)
+
+        st.success("✅ הטופס נשלח ונשמר בהצלחה! תודה רבה.")
+    except DuplicateSubmission:
+        st.error("❌ כבר התקבלה שליחה עם ת״ז זו.")
+    except Exception as e:
+        st.error(f"❌ שמירה נכשלה: {e}")
+
+@st.fragment
+def section_submit():
+    st.subheader("סיכום ושליחה")
+    st.markdown("בדקו את התקציר. אם יש טעות – חזרו לטאב המתאים, תקנו וחזרו לכאן. לאחר אישור ולחיצה על **שליחה** המידע יישמר.")
 
-        try:
-            # 1) מאסטר מצטבר (Load+Concat) – לא מתאפס לעולם
-            df_master = load_csv_safely(CSV_FILE)
-            df_master = pd.concat([df_master, pd.DataFrame([row])], ignore_index=True)
-            save_master_dataframe(df_master)
+    # התקציר נבנה רק לפי בקשה (ומתעדכן בכל הצגה) — לא בכל אינטראקציה בטופס
+    if st.toggle("📄 הצגת תקציר התשובות", key="show_summary"):
+        show_summary()
 
-            # 2) יומן Append-Only
-            append_to_log(pd.DataFrame([row]))
+    st.markdown("---")
+    st.checkbox("אני מאשר/ת כי המידע שמסרתי נכון ומדויק, וידוע לי שאין התחייבות להתאמה מלאה לבחירותיי. *",
+                key="confirm")
+    if st.button("שליחה ✉️"):
+        validate_and_save()
 
-            st.success("✅ הטופס נשלח ונשמר בהצלחה! תודה רבה.")
-        except Exception as e:
-            st.error(f"❌ שמירה נכשלה: {e}")
+with tab6:
+    section_submit()